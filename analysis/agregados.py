@@ -0,0 +1,316 @@
+# agregados.py
+# Estado persistente de las medias anuales de la Fase 2
+#
+# Todos los análisis de transform.py parten de medias por año (y por comunidad,
+# indicador...). En lugar de recalcularlas sobre toda la historia en cada
+# ejecución, guardamos por grupo la suma y el número de valores y, en cada
+# ejecución, solo sumamos las filas cargadas desde la anterior.
+# Las tablas de hechos solo crecen (almacenar.py nunca actualiza ni borra),
+# así que el rowid sirve de marca de agua: las filas nuevas son las de
+# rowid mayor que la marca guardada.
+# El grafo de transform.py reutiliza sus resultados por la huella de estas
+# medias, que depende del orden de las filas y de cada bit de los valores:
+# group_by no garantiza ni el orden de los grupos ni el orden en que suma en
+# paralelo, así que se ordenan los grupos por sus claves y los valores de cada
+# grupo antes de sumarlos.
+# Las filas se leen del almacén Parquet, que guarda el rowid de cada hecho
+# en la columna '_fila', igual que el resto de la Fase 2. Solo si el almacén
+# no existe se leen directamente de SQLite.
+
+import contextlib
+import hashlib
+import os
+
+import polars as pl
+
+from src.db import DatabaseConnection
+from src.almacen_parquet import ALMACEN_DIR, BLOQUES, consulta_bloque, escanear_bloque, existe_almacen
+
+AGREGADOS_DIR = os.path.join(ALMACEN_DIR, "agregados")
+
+PERCENTILES = [
+    "Salario_Anual_Media",
+    "Salario_Anual_Mediana",
+    "Salario_Anual_Percentil 10",
+    "Salario_Anual_Cuartil inferior",
+]
+
+
+class Agregado:
+    """Media de 'valor' por 'claves' sobre las filas de un bloque que cumplen 'filtro'"""
+
+    def __init__(self, bloque, filtro, claves, valor, alias):
+        self.bloque = bloque
+        self.filtro = filtro
+        self.claves = claves
+        self.valor = valor
+        self.alias = alias
+
+    @property
+    def firma(self):
+        """Cambia si cambia la definición: el estado guardado deja de valer"""
+        definicion = f"{self.bloque}|{self.filtro}|{self.claves}|{self.valor}"
+        return hashlib.sha1(definicion.encode("utf-8")).hexdigest()
+
+    def calcular(self, fuente):
+        """Recalcula la media desde cero sobre un LazyFrame del bloque"""
+        return (
+            fuente.filter(self.filtro)
+            .group_by(self.claves)
+            .agg(pl.col(self.valor).alias(self.alias))
+            .with_columns(pl.col(self.alias).list.sort().list.mean())
+            .sort(self.claves)
+        )
+
+    def parcial(self, filas):
+        """Suma y número de valores por grupo de un lote de filas"""
+        return (
+            filas.filter(self.filtro)
+            .group_by(self.claves)
+            .agg(pl.col(self.valor).alias("suma"), pl.col(self.valor).count().cast(pl.Int64).alias("n"))
+            .with_columns(pl.col("suma").list.sort().list.sum())
+            .sort(self.claves)
+        )
+
+    def media(self, estado):
+        """Media a partir del estado (suma, n)"""
+        return estado.select(
+            *self.claves, (pl.col("suma") / pl.col("n")).alias(self.alias)
+        )
+
+
+# Medias de las que parten los análisis de transform.py
+AGREGADOS = {
+    # Análisis 1, 2, 3 y 5
+    "salario_medio_ccaa": Agregado(
+        "salarios",
+        (pl.col("indicador") == "Salario_Anual_Media") & (pl.col("salario").is_not_null()),
+        ["comunidad", "anio"],
+        "salario",
+        "salario_medio",
+    ),
+    # Análisis 2 y 6: IPC general nacional (media de los 12 meses)
+    "ipc_anual": Agregado(
+        "precios",
+        (pl.col("indicador") == "IPC_Indice")
+        & (pl.col("comunidad") == "Total Nacional")
+        & (pl.col("categoria_gasto") == "IPC General")
+        & (pl.col("precio").is_not_null()),
+        ["anio"],
+        "precio",
+        "ipc_valor",
+    ),
+    # Análisis 3: IPV nacional (media de los trimestres)
+    "ipv_anual": Agregado(
+        "precios",
+        (pl.col("indicador") == "IPV_Indice")
+        & (pl.col("comunidad") == "Total Nacional")
+        & (pl.col("precio").is_not_null()),
+        ["anio"],
+        "precio",
+        "ipv",
+    ),
+    # Análisis 4: salario por ocupación y sexo
+    "salario_ocupacion_sexo": Agregado(
+        "salarios",
+        (pl.col("indicador") == "Salario_Anual_Ocupacion")
+        & (pl.col("sexo").is_in(["Hombres", "Mujeres"]))
+        & (~pl.col("ocupacion").is_in(["Total", "N/A"]))
+        & (pl.col("salario").is_not_null()),
+        ["anio", "ocupacion", "sexo"],
+        "salario",
+        "salario",
+    ),
+    # Análisis 5: tasa de paro anual por comunidad
+    "paro_anual_ccaa": Agregado(
+        "empleo",
+        (pl.col("indicador") == "Tasa_Paro")
+        & (pl.col("comunidad") != "Total Nacional")
+        & (pl.col("sexo") == "Ambos sexos")
+        & (pl.col("grupo_edad") == "Todas las edades")
+        & (pl.col("valor_empleo").is_not_null()),
+        ["comunidad", "anio"],
+        "valor_empleo",
+        "tasa_paro_media",
+    ),
+    # Análisis 6: coste salarial nominal nacional
+    "salario_nominal_anual": Agregado(
+        "salarios",
+        (pl.col("indicador") == "Salario_Coste_Trimestral")
+        & (pl.col("comunidad") == "Total Nacional")
+        & (pl.col("salario").is_not_null()),
+        ["anio"],
+        "salario",
+        "salario_nominal",
+    ),
+    # Análisis 7: asalariados totales y temporales
+    "asalariados_anual": Agregado(
+        "empleo",
+        (pl.col("indicador").is_in(["Asalariados_Total", "Asalariados_Temporal"]))
+        & (pl.col("comunidad") == "Total Nacional")
+        & (pl.col("valor_empleo").is_not_null()),
+        ["anio", "indicador"],
+        "valor_empleo",
+        "valor_empleo",
+    ),
+    # Análisis 8: estadísticos salariales nacionales
+    "percentiles_anual": Agregado(
+        "salarios",
+        (pl.col("indicador").is_in(PERCENTILES))
+        & (pl.col("comunidad") == "Total Nacional")
+        & (pl.col("sexo") == "Total")
+        & (pl.col("salario").is_not_null()),
+        ["anio", "indicador"],
+        "salario",
+        "salario",
+    ),
+}
+
+
+def calcular_agregados(salarios, precios, empleo):
+    """Todas las medias recalculadas desde cero sobre los bloques maestros"""
+    fuentes = {"salarios": salarios, "precios": precios, "empleo": empleo}
+    return {
+        nombre: agregado.calcular(fuentes[agregado.bloque])
+        for nombre, agregado in AGREGADOS.items()
+    }
+
+
+def _ruta(nombre, directorio):
+    return os.path.join(directorio, f"{nombre}.parquet")
+
+
+def _leer_estado(nombre, agregado, directorio):
+    """
+    Devuelve (estado, marca, filas) guardados, o (None, 0, 0) si no hay
+    estado o es de otra definición del agregado.
+    La marca y la firma van en los metadatos del propio Parquet, así que
+    estado y marca se reemplazan juntos en una sola operación.
+    """
+    ruta = _ruta(nombre, directorio)
+    if not os.path.exists(ruta):
+        return None, 0, 0
+    metadatos = pl.read_parquet_metadata(ruta)
+    if metadatos.get("firma") != agregado.firma:
+        return None, 0, 0
+    return pl.read_parquet(ruta), int(metadatos["marca"]), int(metadatos["filas"])
+
+
+def _guardar_estado(nombre, agregado, estado, marca, filas, directorio):
+    ruta = _ruta(nombre, directorio)
+    temporal = f"{ruta}.tmp"
+    estado.write_parquet(
+        temporal,
+        metadata={"firma": agregado.firma, "marca": str(marca), "filas": str(filas)},
+    )
+    os.replace(temporal, ruta)
+
+
+class _FuenteAlmacen:
+    """Filas de un bloque leídas del almacén Parquet (por su columna '_fila')"""
+
+    def __init__(self, bloque, directorio):
+        self.lf = escanear_bloque(bloque, directorio=directorio, con_fila=True)
+
+    def tope(self):
+        """(rowid máximo, número de filas)"""
+        return self.lf.select(pl.col("_fila").max().fill_null(0), pl.len()).collect().row(0)
+
+    def contar(self, marca):
+        return self.lf.filter(pl.col("_fila") <= marca).select(pl.len()).collect().item()
+
+    def filas(self, desde, tope):
+        # Perezoso: el filtro de cada agregado poda las particiones por indicador
+        return self.lf.filter((pl.col("_fila") > desde) & (pl.col("_fila") <= tope))
+
+
+class _FuenteSQLite:
+    """Filas de un bloque leídas de su tabla de hechos (por su rowid)"""
+
+    def __init__(self, bloque, conn):
+        self.bloque = bloque
+        self.tabla, _, self.esquema = BLOQUES[bloque]
+        self.conn = conn
+
+    def tope(self):
+        return self.conn.execute(
+            f"SELECT COALESCE(MAX(rowid), 0), COUNT(*) FROM {self.tabla}"
+        ).fetchone()
+
+    def contar(self, marca):
+        cursor = self.conn.execute(f"SELECT COUNT(*) FROM {self.tabla} WHERE rowid <= ?", (marca,))
+        return cursor.fetchone()[0]
+
+    def filas(self, desde, tope):
+        # Una sola lectura por bloque: desde la marca más atrasada hasta el tope
+        return pl.read_database(
+            consulta_bloque(self.bloque, "f.rowid > ? AND f.rowid <= ?", con_fila=True),
+            connection=self.conn,
+            execute_options={"parameters": [desde, tope]},
+            schema_overrides=self.esquema,
+        ).with_columns(pl.col(columna).cast(tipo) for columna, tipo in self.esquema.items()).lazy()
+
+
+def actualizar_agregados(directorio=AGREGADOS_DIR, almacen=ALMACEN_DIR):
+    """
+    Suma al estado guardado las filas cargadas desde la última ejecución
+    y devuelve {nombre: LazyFrame con las medias}.
+    Las filas se leen del almacén Parquet 'almacen' (o de SQLite si no existe).
+    Si la fuente ya no contiene las filas que se contaron (BD recreada) o
+    cambió la definición del agregado, se recalcula desde cero.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    filas_nuevas = 0
+    usar_almacen = existe_almacen(almacen)
+
+    lectura = contextlib.nullcontext() if usar_almacen else DatabaseConnection().lectura()
+    with lectura as conn:
+        for bloque in BLOQUES:
+            fuente = _FuenteAlmacen(bloque, almacen) if usar_almacen else _FuenteSQLite(bloque, conn)
+            nombres = [nombre for nombre, agregado in AGREGADOS.items() if agregado.bloque == bloque]
+            tope, filas_tope = fuente.tope()
+
+            estados = {}
+            for nombre in nombres:
+                estado, marca, filas = _leer_estado(nombre, AGREGADOS[nombre], directorio)
+                # Las filas contadas hasta la marca tienen que seguir ahí
+                if marca and fuente.contar(marca) != filas:
+                    estado, marca = None, 0
+                estados[nombre] = (estado, marca)
+
+            desde = min(marca for _, marca in estados.values())
+            if desde >= tope and all(estado is not None for estado, _ in estados.values()):
+                continue
+
+            nuevas = fuente.filas(desde, tope)
+            parciales = pl.collect_all(
+                [nuevas.select(pl.len())]
+                + [
+                    AGREGADOS[nombre].parcial(nuevas.filter(pl.col("_fila") > estados[nombre][1]))
+                    for nombre in nombres
+                ]
+            )
+            filas_nuevas += parciales[0].item()
+
+            for nombre, parcial in zip(nombres, parciales[1:]):
+                agregado = AGREGADOS[nombre]
+                estado, _ = estados[nombre]
+                if estado is not None:
+                    parcial = (
+                        pl.concat([estado, parcial])
+                        .group_by(agregado.claves)
+                        .agg(pl.col("suma").sum(), pl.col("n").sum())
+                    )
+                _guardar_estado(nombre, agregado, parcial.sort(agregado.claves), tope, filas_tope, directorio)
+
+    origen = "del almacén Parquet" if usar_almacen else "de SQLite"
+    print(f"Agregados incrementales actualizados con {filas_nuevas} filas nuevas (leídas {origen}).")
+    return leer_agregados(directorio)
+
+
+def leer_agregados(directorio=AGREGADOS_DIR):
+    """{nombre: LazyFrame con las medias} a partir del estado guardado"""
+    return {
+        nombre: agregado.media(pl.scan_parquet(_ruta(nombre, directorio)))
+        for nombre, agregado in AGREGADOS.items()
+    }
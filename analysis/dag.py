@@ -0,0 +1,201 @@
+# dag.py
+# Grafo declarativo de análisis de la Fase 2
+#
+# Cada dataset es un nodo que declara de qué otros nodos (o entradas
+# externas) depende. El planificador ejecuta en paralelo los nodos
+# independientes y guarda el resultado de cada uno bajo una huella de sus
+# entradas y de su propio código: si nada de eso ha cambiado, el resultado
+# se reutiliza (en memoria o desde disco) sin recalcularlo.
+
+import hashlib
+import inspect
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import polars as pl
+
+from src import metricas
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+CACHE_ANALISIS_DIR = os.path.join(project_root, "almacen_parquet", "cache_analisis")
+MAX_WORKERS = 4
+ETAPA = "fase2.analisis"  # Prefijo de los nodos en el informe de la ejecución
+
+
+def huella_datos(df):
+    """Huella del contenido de un DataFrame (esquema + filas)"""
+    h = hashlib.sha1(str(df.schema).encode("utf-8"))
+    h.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class Nodo:
+    def __init__(self, nombre, funcion, entradas):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.entradas = entradas
+        # Si cambia el código del nodo, cambia su huella
+        self.version = hashlib.sha1(inspect.getsource(funcion).encode("utf-8")).hexdigest()
+
+
+class GrafoAnalisis:
+    """Registro de nodos y planificador que los ejecuta"""
+
+    def __init__(self, cache_dir=CACHE_ANALISIS_DIR):
+        self.nodos = {}
+        self.cache_dir = cache_dir
+        # nombre -> (huella, DataFrame) de la última versión de cada nodo,
+        # para ejecuciones en el mismo proceso (como la caché en disco)
+        self._memoria = {}
+
+    def nodo(self, nombre, entradas):
+        """Decorador: registra la función como nodo 'nombre' con sus 'entradas'"""
+        def registrar(funcion):
+            self.nodos[nombre] = Nodo(nombre, funcion, entradas)
+            return funcion
+        return registrar
+
+    def dependencias(self, objetivos):
+        """Nodos de los que dependen los objetivos (incluidos), en orden topológico"""
+        orden, visitados = [], set()
+
+        def visitar(nombre):
+            if nombre in visitados or nombre not in self.nodos:
+                return
+            visitados.add(nombre)
+            for entrada in self.nodos[nombre].entradas:
+                visitar(entrada)
+            orden.append(nombre)
+
+        for objetivo in objetivos:
+            if objetivo not in self.nodos:
+                raise KeyError(f"El análisis '{objetivo}' no existe")
+            visitar(objetivo)
+        return orden
+
+    def _ruta_cache(self, nombre, huella):
+        return os.path.join(self.cache_dir, f"{nombre}-{huella}.parquet")
+
+    def _leer_cache(self, nombre, huella):
+        huella_memoria, df = self._memoria.get(nombre, (None, None))
+        if huella_memoria == huella:
+            return df
+        ruta = self._ruta_cache(nombre, huella)
+        if os.path.exists(ruta):
+            df = pl.read_parquet(ruta)
+            self._memoria[nombre] = (huella, df)
+            return df
+        return None
+
+    def _guardar_cache(self, nombre, huella, df):
+        self._memoria[nombre] = (huella, df)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Solo se conserva la última versión de cada nodo
+        for fichero in os.listdir(self.cache_dir):
+            if fichero.startswith(f"{nombre}-") and fichero.endswith(".parquet"):
+                os.remove(os.path.join(self.cache_dir, fichero))
+        temporal = f"{self._ruta_cache(nombre, huella)}.tmp"
+        df.write_parquet(temporal)
+        os.replace(temporal, self._ruta_cache(nombre, huella))
+
+    def ejecutar(self, objetivos=None, externos=None, max_workers=MAX_WORKERS):
+        """
+        Calcula los nodos 'objetivos' (todos si es None) a partir de las
+        entradas 'externos' ({nombre: DataFrame o LazyFrame}).
+        Solo se ejecutan los nodos necesarios cuyo resultado no esté en caché;
+        un fallo deja sin calcular únicamente a los nodos que dependen de él.
+        Devuelve (resultados, informe): {nombre: DataFrame} de los objetivos
+        que se han podido obtener y {nombre: (estado, segundos)} de cada nodo.
+        """
+        objetivos = list(objetivos or self.nodos)
+        orden = self.dependencias(objetivos)
+
+        # Entradas externas que usan estos nodos, materializadas (las perezosas, todas a la vez)
+        usadas = {entrada for nombre in orden for entrada in self.nodos[nombre].entradas}
+        externos = {nombre: valor for nombre, valor in (externos or {}).items() if nombre in usadas}
+        perezosos = [nombre for nombre, valor in externos.items() if isinstance(valor, pl.LazyFrame)]
+        for nombre, df in zip(perezosos, pl.collect_all([externos[n] for n in perezosos])):
+            externos[nombre] = df
+
+        # 1. Huellas: las externas por contenido y las de cada nodo a partir
+        #    de su código y de las huellas de sus entradas
+        huellas = {nombre: huella_datos(df) for nombre, df in externos.items()}
+        for nombre in orden:
+            nodo = self.nodos[nombre]
+            faltan = [e for e in nodo.entradas if e not in huellas]
+            if faltan:
+                raise KeyError(f"Al nodo '{nombre}' le faltan las entradas {faltan}")
+            h = hashlib.sha1(f"{nombre}|{nodo.version}".encode("utf-8"))
+            for entrada in nodo.entradas:
+                h.update(huellas[entrada].encode("utf-8"))
+            huellas[nombre] = h.hexdigest()
+
+        # 2. Qué hay que calcular: un nodo en caché no necesita sus entradas
+        valores = dict(externos)
+        informe = {}
+        pendientes = []
+        necesarios = list(objetivos)
+        vistos = set()
+        while necesarios:
+            nombre = necesarios.pop()
+            if nombre in vistos or nombre in externos:
+                continue
+            vistos.add(nombre)
+            en_cache = self._leer_cache(nombre, huellas[nombre])
+            if en_cache is not None:
+                valores[nombre] = en_cache
+                informe[nombre] = ("caché", 0.0)
+                metricas.registrar(f"{ETAPA}.{nombre}", 0.0, estado="caché")
+            else:
+                pendientes.append(nombre)
+                necesarios.extend(self.nodos[nombre].entradas)
+        pendientes = [nombre for nombre in orden if nombre in pendientes]
+
+        # 3. Ejecución en paralelo de los nodos cuyas entradas ya están listas
+        fallidos = set()
+
+        def calcular(nombre):
+            nodo = self.nodos[nombre]
+            inicio = time.perf_counter()
+            with metricas.etapa(f"{ETAPA}.{nombre}"):
+                df = nodo.funcion(*(valores[entrada] for entrada in nodo.entradas))
+                if isinstance(df, pl.LazyFrame):
+                    df = df.collect()
+            metricas.sumar(f"{ETAPA}.{nombre}", filas_generadas=df.height)
+            return df, time.perf_counter() - inicio
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            en_curso = {}
+            while pendientes or en_curso:
+                for nombre in list(pendientes):
+                    entradas = self.nodos[nombre].entradas
+                    if any(e in fallidos for e in entradas):
+                        pendientes.remove(nombre)
+                        fallidos.add(nombre)
+                        informe[nombre] = ("omitido", 0.0)
+                        metricas.registrar(f"{ETAPA}.{nombre}", 0.0, estado="omitido")
+                    elif all(e in valores for e in entradas):
+                        pendientes.remove(nombre)
+                        en_curso[pool.submit(calcular, nombre)] = nombre
+
+                if not en_curso:
+                    break
+                terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    nombre = en_curso.pop(futuro)
+                    try:
+                        df, segundos = futuro.result()
+                    except Exception as e:
+                        print(f"Error en el análisis '{nombre}': {e}")
+                        fallidos.add(nombre)
+                        informe[nombre] = ("error", 0.0)
+                        continue
+                    valores[nombre] = df
+                    informe[nombre] = ("calculado", segundos)
+                    self._guardar_cache(nombre, huellas[nombre], df)
+
+        resultados = {nombre: valores[nombre] for nombre in objetivos if nombre in valores}
+        return resultados, informe
@@ -0,0 +1,218 @@
+# dashboard.py
+# Cuadro de mando de la Fase 3 en un solo paquete
+#
+# write_html mete una copia entera de plotly.js (varios MB) en cada gráfico.
+# Aquí se genera una página con una pestaña por gráfico y tres tipos de
+# fichero que el navegador puede guardar en caché por separado:
+#
+#   dashboard/index.html                  <- página (solo HTML, CSS y JS mínimos)
+#   dashboard/plotly-<versión>.min.js     <- plotly.js, una única copia compartida
+#   dashboard/plantillas.<huella>.js      <- plantillas de estilo, una por tipo
+#   dashboard/figuras/<id>.<huella>.js    <- especificación de cada gráfico
+#
+# Cada figura se descarga al abrir su pestaña por primera vez. Sus datos
+# numéricos van como arrays tipados en base64 ({"dtype", "bdata"}), que
+# plotly.js decodifica directamente, en lugar de listas de números en JSON.
+# Los ficheros llevan la versión o una huella de su contenido en el nombre,
+# así que pueden servirse con caché indefinida: si algo cambia, cambia el nombre.
+
+import hashlib
+import html
+import json
+import os
+import shutil
+
+import plotly
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+DASHBOARD_DIR = os.path.join(project_root, "data_output", "dashboard")
+
+
+def _huella(texto):
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:12]
+
+
+def _json(valor):
+    # Sin espacios y sin escapar los acentos: el fichero más pequeño posible
+    return json.dumps(valor, separators=(",", ":"), ensure_ascii=False)
+
+
+def especificacion(fig):
+    """
+    Separa una figura en (especificación, plantilla), ya lista para
+    serializar (y para devolverla desde otro proceso).
+    La plantilla es igual en casi todas las figuras, así que se guarda una
+    sola vez y la figura solo lleva su huella.
+    """
+    # to_json ya codifica los arrays de NumPy/Polars como arrays tipados
+    spec = json.loads(pio.to_json(fig, validate=False))
+    plantilla = spec.get("layout", {}).pop("template", None)
+    if plantilla is None:
+        return spec, None
+    texto = _json(plantilla)
+    spec["plantilla"] = _huella(texto)
+    return spec, (spec["plantilla"], texto)
+
+
+def _escribir(ruta, contenido):
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(contenido)
+    return len(contenido.encode("utf-8"))
+
+
+def construir_dashboard(figuras, directorio=DASHBOARD_DIR, titulo="Panel de Análisis Salarial"):
+    """
+    Escribe el cuadro de mando. 'figuras' es una lista de
+    (identificador, título de la pestaña, especificacion(fig)) en el orden
+    de las pestañas. Devuelve {fichero: bytes} de lo que se ha escrito.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    # Las figuras de la versión anterior ya no se referencian
+    dir_figuras = os.path.join(directorio, "figuras")
+    shutil.rmtree(dir_figuras, ignore_errors=True)
+    os.makedirs(dir_figuras)
+    tamanos = {}
+
+    # 1. plotly.js compartido (solo se reescribe si cambia la versión)
+    fichero_js = f"plotly-{plotly.__version__}.min.js"
+    ruta_js = os.path.join(directorio, fichero_js)
+    if not os.path.exists(ruta_js):
+        _escribir(ruta_js, get_plotlyjs())
+    for fichero in os.listdir(directorio):
+        if fichero.startswith("plotly-") and fichero != fichero_js:
+            os.remove(os.path.join(directorio, fichero))
+    tamanos[fichero_js] = os.path.getsize(ruta_js)
+
+    # 2. Una especificación por figura y las plantillas que usan
+    plantillas = {}
+    pestanas = []
+    for identificador, etiqueta, (spec, plantilla) in figuras:
+        if plantilla is not None:
+            plantillas.setdefault(*plantilla)
+        contenido = f"registrarFigura({_json(identificador)},{_json(spec)});\n"
+        fichero = f"figuras/{identificador}.{_huella(contenido)}.js"
+        tamanos[fichero] = _escribir(os.path.join(directorio, fichero), contenido)
+        pestanas.append({"id": identificador, "titulo": etiqueta, "fichero": fichero})
+
+    cuerpo = ",".join(f"{_json(clave)}:{texto}" for clave, texto in plantillas.items())
+    contenido = f"var PLANTILLAS={{{cuerpo}}};\n"
+    fichero_plantillas = f"plantillas.{_huella(contenido)}.js"
+    for fichero in os.listdir(directorio):
+        if fichero.startswith("plantillas.") and fichero != fichero_plantillas:
+            os.remove(os.path.join(directorio, fichero))
+    tamanos[fichero_plantillas] = _escribir(os.path.join(directorio, fichero_plantillas), contenido)
+
+    # 3. Página: se pinta al momento y va pidiendo cada figura cuando hace falta
+    pagina = PLANTILLA_HTML.format(
+        titulo=html.escape(titulo),
+        plotly_js=fichero_js,
+        plantillas_js=fichero_plantillas,
+        botones="\n".join(
+            f'        <button data-id="{html.escape(p["id"])}">{html.escape(p["titulo"])}</button>'
+            for p in pestanas
+        ),
+        pestanas=_json(pestanas),
+    )
+    tamanos["index.html"] = _escribir(os.path.join(directorio, "index.html"), pagina)
+    return tamanos
+
+
+PLANTILLA_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{titulo}</title>
+    <style>
+        body {{ font-family: 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; margin: 0;
+               background: #0f172a; color: #f8fafc; }}
+        h1 {{ font-size: 1.6rem; margin: 0; padding: 20px 24px 10px; }}
+        nav {{ display: flex; flex-wrap: wrap; gap: 8px; padding: 0 24px 16px; }}
+        nav button {{ background: rgba(255, 255, 255, 0.05); color: inherit; cursor: pointer;
+                     border: 1px solid rgba(255, 255, 255, 0.1); border-radius: 10px;
+                     padding: 10px 16px; font-size: 0.95rem; }}
+        nav button.activa {{ border-color: #6366f1; background: rgba(99, 102, 241, 0.25); }}
+        main {{ background: #fff; margin: 0 24px 24px; border-radius: 12px; min-height: 600px; }}
+        .grafico {{ display: none; height: 80vh; }}
+        .grafico.activa {{ display: block; }}
+        #estado {{ color: #0f172a; padding: 24px; }}
+    </style>
+    <script src="{plotly_js}" defer></script>
+    <script src="{plantillas_js}" defer></script>
+</head>
+<body>
+    <h1>{titulo}</h1>
+    <nav>
+{botones}
+    </nav>
+    <main><div id="estado">Cargando...</div></main>
+    <script>
+    var PESTANAS = {pestanas};
+    var figuras = {{}};      // id -> especificación ya descargada
+    var esperando = {{}};    // id -> funciones a llamar cuando llegue
+
+    // Cada fichero de figura llama a esta función al cargarse
+    function registrarFigura(id, spec) {{
+        figuras[id] = spec;
+        (esperando[id] || []).forEach(function (f) {{ f(spec); }});
+        delete esperando[id];
+    }}
+
+    // Se usa un <script> en lugar de fetch para que funcione también con file://
+    function cargarFigura(pestana, listo) {{
+        if (figuras[pestana.id]) return listo(figuras[pestana.id]);
+        if (!esperando[pestana.id]) {{
+            esperando[pestana.id] = [];
+            var s = document.createElement("script");
+            s.src = pestana.fichero;
+            s.onerror = function () {{
+                document.getElementById("estado").textContent = "No se pudo cargar " + pestana.fichero;
+            }};
+            document.head.appendChild(s);
+        }}
+        esperando[pestana.id].push(listo);
+    }}
+
+    var actual = null;
+
+    function mostrar(pestana) {{
+        actual = pestana.id;
+        document.querySelectorAll("nav button").forEach(function (b) {{
+            b.classList.toggle("activa", b.dataset.id === pestana.id);
+        }});
+        document.querySelectorAll(".grafico").forEach(function (d) {{ d.classList.remove("activa"); }});
+        var div = document.getElementById("g-" + pestana.id);
+        if (div) {{
+            div.classList.add("activa");
+            Plotly.Plots.resize(div);
+            return;
+        }}
+        document.getElementById("estado").style.display = "block";
+        cargarFigura(pestana, function (spec) {{
+            // Si entretanto se ha abierto otra pestaña, se pintará al volver a esta
+            if (actual !== pestana.id || document.getElementById("g-" + pestana.id)) return;
+            div = document.createElement("div");
+            div.id = "g-" + pestana.id;
+            div.className = "grafico activa";
+            document.querySelector("main").appendChild(div);
+            document.getElementById("estado").style.display = "none";
+            if (spec.plantilla) spec.layout.template = PLANTILLAS[spec.plantilla];
+            Plotly.newPlot(div, {{data: spec.data, layout: spec.layout, frames: spec.frames || [],
+                                 config: {{responsive: true}}}});
+        }});
+    }}
+
+    document.querySelectorAll("nav button").forEach(function (b, i) {{
+        b.addEventListener("click", function () {{ mostrar(PESTANAS[i]); }});
+    }});
+    // La primera pestaña se pide en paralelo con plotly.js y se pinta al cargar la página
+    if (PESTANAS.length) cargarFigura(PESTANAS[0], function () {{}});
+    window.addEventListener("load", function () {{ if (PESTANAS.length) mostrar(PESTANAS[0]); }});
+    </script>
+</body>
+</html>
+"""
@@ -0,0 +1,263 @@
+# tendencias.py
+# Líneas de tendencia de la Fase 3 calculadas con NumPy y guardadas en caché
+#
+# Plotly Express calcula trendline="lowess" con statsmodels, punto a punto y
+# en cada renderizado. Aquí se calculan todas las series a la vez (cada serie
+# es una fila de una matriz, rellenada hasta la más larga) y el resultado se
+# guarda bajo una huella de los datos de entrada y de los parámetros: si los
+# datos no cambian, volver a pintar el gráfico no recalcula nada. De cada
+# tendencia (mismas columnas, método y parámetros) solo se conserva la
+# versión de los últimos datos.
+#
+# Métodos:
+#   - "lowess":  el mismo algoritmo que statsmodels (vecinos más cercanos,
+#                pesos tricúbicos, regresión lineal local y 'iteraciones'
+#                pasadas robustas con pesos bicuadrados)
+#   - "medias":  media de y por tramos iguales de x (barato con muchos puntos)
+#   - "spline":  spline cúbico de regresión con 'nodos' nodos interiores
+
+import hashlib
+import os
+
+import numpy as np
+import polars as pl
+
+from analysis.dag import huella_datos
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+CACHE_TENDENCIAS_DIR = os.path.join(project_root, "almacen_parquet", "cache_tendencias")
+
+# Tamaño máximo (en elementos) de las matrices de vecinos del LOWESS: con
+# muchos puntos los ajustes se hacen por bloques para no agotar la memoria
+MAX_ELEMENTOS = 4_000_000
+# Regresiones locales por serie; por encima se interpola entre ellas
+MAX_PUNTOS = 500
+
+_memoria = {}  # tendencia -> (huella de los datos, DataFrame)
+
+
+def _matrices(x, y, grupos):
+    """
+    Series ordenadas por x como matrices (G, N) rellenas con NaN.
+    Devuelve (X, Y, n, claves) con n el número de puntos de cada serie.
+    """
+    claves, inversa = np.unique(grupos, return_inverse=True)
+    orden = np.lexsort((x, inversa))
+    x, y, inversa = x[orden], y[orden], inversa[orden]
+    n = np.bincount(inversa, minlength=len(claves))
+    inicio = np.concatenate(([0], np.cumsum(n)[:-1]))
+    columna = np.arange(len(x)) - inicio[inversa]
+    X = np.full((len(claves), n.max()), np.nan)
+    Y = np.full((len(claves), n.max()), np.nan)
+    X[inversa, columna] = x
+    Y[inversa, columna] = y
+    return X, Y, n, claves
+
+
+def lowess(X, Y, n, frac=2.0 / 3.0, iteraciones=3, max_puntos=MAX_PUNTOS):
+    """
+    LOWESS de todas las series (filas de X e Y, ordenadas por x) a la vez.
+    Devuelve la matriz de valores ajustados en cada x.
+    La regresión local se hace en cada x distinta (las repetidas copian el
+    ajuste, como en statsmodels) y, en series con más de 'max_puntos' x
+    distintas, solo en 'max_puntos' de ellas repartidas a lo largo de la
+    serie; el resto se interpola (el 'delta' de statsmodels).
+    """
+    G, N = X.shape
+    k = np.clip((frac * n + 1e-10).astype(int), 2, None)
+    k = np.minimum(k, n)
+    K = k.max()
+    validos = np.arange(N)[None, :] < n[:, None]
+
+    # Puntos en los que se ajusta cada serie y, para cada uno, su ventana de
+    # k vecinos [izq, izq + k). Como en statsmodels, la ventana se desplaza a
+    # la derecha mientras el punto quede más cerca del extremo derecho; los
+    # puntos medios crecen con izq, así que basta contar los menores
+    evaluar = []
+    for g in range(G):
+        x = X[g, : n[g]]
+        distintos = np.flatnonzero(np.r_[True, x[1:] != x[:-1]])
+        if len(distintos) > max_puntos:
+            elegidos = np.linspace(0, len(distintos) - 1, max_puntos).round().astype(int)
+            distintos = distintos[np.unique(elegidos)]
+        evaluar.append(distintos)
+    M = max(len(e) for e in evaluar)
+    posicion = np.zeros((G, M), dtype=int)
+    izq = np.zeros((G, M), dtype=int)
+    for g, distintos in enumerate(evaluar):
+        medios = (X[g, : n[g] - k[g]] + X[g, k[g] : n[g]]) / 2.0
+        posicion[g, : len(distintos)] = distintos
+        izq[g, : len(distintos)] = np.searchsorted(medios, X[g, distintos], side="left")
+
+    filas = np.arange(G)[:, None]
+    en_ventana = np.arange(K)[None, None, :] < k[:, None, None]
+    derecha = np.clip(izq + k[:, None] - 1, 0, N - 1)
+
+    pesos_residuo = validos.astype(float)
+    ajustados = np.zeros((G, M))
+    ajuste = np.full((G, N), np.nan)
+    bloque = max(1, MAX_ELEMENTOS // max(1, G * K))
+
+    for iteracion in range(iteraciones + 1):
+        for desde in range(0, M, bloque):
+            hasta = min(M, desde + bloque)
+            v = np.where(en_ventana, izq[:, desde:hasta, None] + np.arange(K), 0)
+            xv = X[filas[:, :, None], v]
+            yv = Y[filas[:, :, None], v]
+            rv = np.where(en_ventana, pesos_residuo[filas[:, :, None], v], 0.0)
+            punto = X[filas, posicion[:, desde:hasta]]
+
+            radio = np.maximum(
+                punto - X[filas, izq[:, desde:hasta]],
+                X[filas, derecha[:, desde:hasta]] - punto,
+            )
+            with np.errstate(divide="ignore", invalid="ignore"):
+                distancia = np.abs(xv - punto[..., None]) / radio[..., None]
+                pesos = (1.0 - distancia**3) ** 3 * rv
+            pesos = np.where(en_ventana & np.isfinite(pesos), pesos, 0.0)
+
+            # Con menos de dos pesos no nulos no hay regresión: se deja el punto
+            regresion = (pesos > 1e-12).sum(axis=2) >= 2
+            suma = pesos.sum(axis=2, keepdims=True)
+            pesos = pesos / np.where(suma > 0, suma, 1.0)
+            media_x = (pesos * xv).sum(axis=2, keepdims=True)
+            varianza = np.maximum((pesos * (xv - media_x) ** 2).sum(axis=2, keepdims=True), 1e-12)
+            p = pesos * (1.0 + (punto[..., None] - media_x) * (xv - media_x) / varianza)
+            estimado = (p * np.where(en_ventana, yv, 0.0)).sum(axis=2)
+            ajustados[:, desde:hasta] = np.where(
+                regresion, estimado, Y[filas, posicion[:, desde:hasta]]
+            )
+
+        # Ajuste en todos los puntos: exacto en los evaluados, interpolado en el resto
+        for g, distintos in enumerate(evaluar):
+            x = X[g, : n[g]]
+            ajuste[g, : n[g]] = np.interp(x, x[distintos], ajustados[g, : len(distintos)])
+
+        if iteracion < iteraciones:
+            # Pesos robustos: los puntos con residuo grande cuentan menos
+            residuo = np.abs(Y - ajuste)
+            mediana = np.nanmedian(np.where(validos, residuo, np.nan), axis=1, keepdims=True)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                escalado = np.where(mediana == 0, (residuo > 0).astype(float), residuo / (6.0 * mediana))
+            escalado = np.minimum(escalado, 1.0)
+            pesos_residuo = np.where(validos, (1.0 - escalado**2) ** 2, 0.0)
+
+    return ajuste
+
+
+def medias_por_tramos(X, Y, n, tramos=20):
+    """
+    Media de y en 'tramos' intervalos iguales de x de cada serie.
+    Devuelve (centros, medias) como matrices (G, tramos); NaN si el tramo está vacío.
+    """
+    G, _ = X.shape
+    minimo = np.nanmin(X, axis=1, keepdims=True)
+    ancho = (np.nanmax(X, axis=1, keepdims=True) - minimo) / tramos
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tramo = np.where(ancho > 0, (X - minimo) // ancho, 0)
+    tramo = np.clip(np.nan_to_num(tramo), 0, tramos - 1).astype(int)
+
+    # Un bincount para todas las series: el índice combina serie y tramo
+    validos = ~np.isnan(X)
+    indice = (np.arange(G)[:, None] * tramos + tramo)[validos]
+    suma = np.bincount(indice, weights=Y[validos], minlength=G * tramos).reshape(G, tramos)
+    cuenta = np.bincount(indice, minlength=G * tramos).reshape(G, tramos)
+    with np.errstate(invalid="ignore"):
+        medias = suma / cuenta
+    centros = minimo + ancho * (np.arange(tramos) + 0.5)
+    return centros, np.where(cuenta > 0, medias, np.nan)
+
+
+def spline(X, Y, n, nodos=4, puntos=100):
+    """
+    Spline cúbico de regresión (base de potencias truncadas) con 'nodos'
+    nodos interiores en los cuantiles de x. Todas las series se resuelven a
+    la vez con un único sistema de ecuaciones normales por serie.
+    Devuelve (xs, ys) como matrices (G, puntos).
+    """
+    G, _ = X.shape
+    minimo = np.nanmin(X, axis=1, keepdims=True)
+    rango = np.nanmax(X, axis=1, keepdims=True) - minimo
+    rango = np.where(rango > 0, rango, 1.0)
+    nudos = np.nanquantile((X - minimo) / rango, np.linspace(0, 1, nodos + 2)[1:-1], axis=1).T
+
+    def base(t):
+        # t normalizado a [0, 1]; columnas 1, t, t², t³, (t - nudo)³₊
+        potencias = t[..., None] ** np.arange(4)
+        truncadas = np.clip(t[..., None] - nudos[:, None, :], 0, None) ** 3
+        return np.concatenate([potencias, truncadas], axis=2)
+
+    validos = ~np.isnan(X)
+    B = base(np.where(validos, (X - minimo) / rango, 0.0)) * validos[..., None]
+    BtB = B.transpose(0, 2, 1) @ B
+    # Una pequeña regularización mantiene el sistema resoluble con pocos puntos
+    BtB += 1e-8 * np.eye(BtB.shape[1]) * np.trace(BtB, axis1=1, axis2=2)[:, None, None]
+    Bty = B.transpose(0, 2, 1) @ np.where(validos, Y, 0.0)[..., None]
+    coeficientes = np.linalg.solve(BtB, Bty)
+
+    t = np.broadcast_to(np.linspace(0, 1, puntos), (G, puntos))
+    return minimo + t * rango, (base(t) @ coeficientes)[..., 0]
+
+
+def calcular_tendencia(df, x, y, por=None, metodo="lowess", **opciones):
+    """
+    Tendencia de 'y' frente a 'x' para cada valor de 'por' (o una sola
+    tendencia para todo el DataFrame si 'por' es None).
+    Devuelve un DataFrame con las columnas [por], x, y ordenado por x
+    (vacío si no hay datos).
+    El resultado se guarda bajo una huella de los datos y de los parámetros.
+    """
+    columnas = ([por] if por else []) + [x, y]
+    datos = df.select(columnas).drop_nulls()
+    if datos.height == 0:
+        return datos.with_columns(pl.col(x, y).cast(pl.Float64))
+
+    definicion = f"{columnas}|{metodo}|{sorted(opciones.items())}"
+    tendencia = hashlib.sha1(definicion.encode("utf-8")).hexdigest()[:16]
+    huella = huella_datos(datos)
+
+    huella_memoria, resultado = _memoria.get(tendencia, (None, None))
+    if huella_memoria == huella:
+        return resultado
+    ruta = os.path.join(CACHE_TENDENCIAS_DIR, f"{tendencia}-{huella}.parquet")
+    if os.path.exists(ruta):
+        resultado = pl.read_parquet(ruta)
+        _memoria[tendencia] = (huella, resultado)
+        return resultado
+
+    grupos = datos[por].to_numpy() if por else np.zeros(datos.height, dtype=int)
+    X, Y, n, claves = _matrices(
+        datos[x].to_numpy().astype(float), datos[y].to_numpy().astype(float), grupos
+    )
+    if metodo == "lowess":
+        xs, ys = X, lowess(X, Y, n, **opciones)
+    elif metodo == "medias":
+        xs, ys = medias_por_tramos(X, Y, n, **opciones)
+    elif metodo == "spline":
+        xs, ys = spline(X, Y, n, **opciones)
+    else:
+        raise ValueError(f"Método de tendencia desconocido: '{metodo}'")
+
+    resultado = pl.DataFrame({
+        "_grupo": np.repeat(np.arange(len(claves)), xs.shape[1]),
+        x: xs.ravel(),
+        y: ys.ravel(),
+    }).filter(pl.col(x).is_not_nan() & pl.col(y).is_not_nan())
+    if por:
+        resultado = resultado.join(
+            pl.DataFrame({"_grupo": np.arange(len(claves)), por: claves}), on="_grupo"
+        )
+    resultado = resultado.drop("_grupo").select(columnas).sort(columnas[:-1])
+
+    os.makedirs(CACHE_TENDENCIAS_DIR, exist_ok=True)
+    # Solo se conserva la última versión de cada tendencia
+    for fichero in os.listdir(CACHE_TENDENCIAS_DIR):
+        if fichero.startswith(f"{tendencia}-") and fichero.endswith(".parquet"):
+            os.remove(os.path.join(CACHE_TENDENCIAS_DIR, fichero))
+    temporal = f"{ruta}.tmp"
+    resultado.write_parquet(temporal)
+    os.replace(temporal, ruta)
+    _memoria[tendencia] = (huella, resultado)
+    return resultado
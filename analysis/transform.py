@@ -12,367 +12,335 @@ project_root = os.path.dirname(current_dir)
 sys.path.append(project_root)
 
 # Importamos la conexión original
+from src import metricas
 from src.db import DatabaseConnection
-
-
-def process_data_polars():
-    """
-    Función principal de transformación de datos.
-    Extrae datos en bruto de SQLite, aplica lógica de negocio con Polars
-    y genera los datasets finales en CSV y Parquet.
-    """
-    print("\nIniciando transformación de datos con Polars.")
-
-    # Usamos el Singleton para obtener la conexión
-    db_conn = DatabaseConnection().get_connection()
-
-    # Si la conexión falló, salimos de la función
-    if db_conn is None:
-        print("Error: No se pudo establecer la conexión a la base de datos.")
-        return
-
-    try:
-        # =======================================================================
-        # FASE A: EXTRACCIÓN DE DATOS (SQL)
-        # En lugar de múltiples queries, extraemos 3 grandes bloques de datos
-        # para delegar todo el trabajo de filtrado a Polars.
-        # =======================================================================
-        print("Extrayendo datos maestros de la base de datos.")
-
-        # 1. Bloque de Salarios
-        query_all_salaries = """
-            SELECT s.valor as salario, g.nombre as comunidad, p.anio, 
-                   i.nombre as indicador, s.sexo, s.ocupacion_cno11 as ocupacion
-            FROM T_salarios s
-            JOIN tbl_geografia g ON s.id_geografia = g.id_geografia
-            JOIN tbl_periodo p ON s.id_periodo = p.id_periodo
-            JOIN tbl_indicador i ON s.id_indicador = i.id_indicador
-        """
-        df_master_salaries = pl.read_database(
-            query=query_all_salaries, connection=db_conn
+from src.almacen_parquet import existe_almacen, escanear_bloque
+from analysis.agregados import PERCENTILES, actualizar_agregados, calcular_agregados
+from analysis.dag import GrafoAnalisis
+
+# Indicadores que usan los análisis de cada bloque. Filtrarlos ya en SQL
+# evita leer filas que Polars descartaría (p. ej. las variaciones anuales)
+INDICADORES_SALARIOS = PERCENTILES + ["Salario_Anual_Ocupacion", "Salario_Coste_Trimestral"]
+INDICADORES_PRECIOS = ["IPC_Indice", "IPV_Indice"]
+INDICADORES_EMPLEO = ["Tasa_Paro", "Asalariados_Total", "Asalariados_Temporal"]
+
+
+def _lista_sql(valores):
+    return ", ".join(f"'{valor}'" for valor in valores)
+
+
+# Consultas maestras de la Fase 2 (también las usa src/indices.py para
+# revisar sus planes de ejecución)
+CONSULTA_SALARIOS = f"""
+    SELECT s.valor as salario, g.nombre as comunidad, p.anio, 
+           i.nombre as indicador, s.sexo, s.ocupacion_cno11 as ocupacion
+    FROM T_salarios s
+    JOIN tbl_geografia g ON s.id_geografia = g.id_geografia
+    JOIN tbl_periodo p ON s.id_periodo = p.id_periodo
+    JOIN tbl_indicador i ON s.id_indicador = i.id_indicador
+    WHERE i.nombre IN ({_lista_sql(INDICADORES_SALARIOS)})
+"""
+
+CONSULTA_PRECIOS = f"""
+    SELECT pr.valor as precio, g.nombre as comunidad, p.anio, 
+           i.nombre as indicador, pr.categoria_gasto
+    FROM T_precios pr
+    JOIN tbl_geografia g ON pr.id_geografia = g.id_geografia
+    JOIN tbl_periodo p ON pr.id_periodo = p.id_periodo
+    JOIN tbl_indicador i ON pr.id_indicador = i.id_indicador
+    WHERE i.nombre IN ({_lista_sql(INDICADORES_PRECIOS)})
+"""
+
+CONSULTA_EMPLEO = f"""
+    SELECT e.valor as valor_empleo, g.nombre as comunidad, p.anio, 
+           i.nombre as indicador, e.sexo, e.grupo_edad
+    FROM T_empleo e
+    JOIN tbl_geografia g ON e.id_geografia = g.id_geografia
+    JOIN tbl_periodo p ON e.id_periodo = p.id_periodo
+    JOIN tbl_indicador i ON e.id_indicador = i.id_indicador
+    WHERE i.nombre IN ({_lista_sql(INDICADORES_EMPLEO)})
+"""
+
+CONSULTAS_MAESTRAS = {
+    "salarios": CONSULTA_SALARIOS,
+    "precios": CONSULTA_PRECIOS,
+    "empleo": CONSULTA_EMPLEO,
+}
+
+
+# Grafo de análisis: cada dataset es un nodo que declara sus entradas
+# (otros datasets o las medias de analysis/agregados.py)
+grafo = GrafoAnalisis()
+
+
+# -------------------------------------------------------------------
+# ANÁLISIS 1: Evolución del salario por comunidades
+# -------------------------------------------------------------------
+@grafo.nodo("Evolucion_Salario_Comunidades", entradas=["salario_medio_ccaa"])
+def evolucion_salario_comunidades(salario_medio_ccaa):
+    # Salario medio anual por comunidad autónoma y año, ordenado por
+    # nombre de comunidad y año cronológico
+    return salario_medio_ccaa.sort(["comunidad", "anio"])
+
+
+# -------------------------------------------------------------------
+# ANÁLISIS 2: Ratio de Poder Adquisitivo (Salario / IPC)
+# -------------------------------------------------------------------
+@grafo.nodo("Relacion_Poder_Adquisitivo", entradas=["Evolucion_Salario_Comunidades", "ipc_anual"])
+def relacion_poder_adquisitivo(df_salaries_regions, df_annual_cpi):
+    # Unimos la tabla de salarios regionales con la del IPC anual nacional
+    # (media de los 12 meses) y calculamos el ratio (Salario dividido por el IPC)
+    return df_salaries_regions.join(df_annual_cpi, on="anio").with_columns(
+        (pl.col("salario_medio") / pl.col("ipc_valor")).alias("poder_adquisitivo")
+    )
+
+
+# -------------------------------------------------------------------
+# ANÁLISIS 3: Comparativa IPV y Salarios
+# -------------------------------------------------------------------
+@grafo.nodo("Comparativa_Vivienda_Salario", entradas=["Evolucion_Salario_Comunidades", "ipv_anual"])
+def comparativa_vivienda_salario(df_salaries_regions, df_annual_hpi):
+    return (
+        # Filtramos los salarios a nivel nacional para la comparativa
+        df_salaries_regions.filter(pl.col("comunidad") == "Total Nacional")
+        .select(["anio", "salario_medio"])
+        # Unimos con el valor promedio anual de la vivienda y ordenamos
+        .join(df_annual_hpi, on="anio")
+        .sort("anio")
+        # Índice del salario base 100 (2015) para comparar el ritmo de subida con la vivienda
+        .with_columns(
+            (
+                pl.col("salario_medio")
+                / pl.col("salario_medio").filter(pl.col("anio") == 2015).first()
+                * 100
+            ).alias("indice_salario")
         )
-
-        # 2. Bloque de Precios (IPC e IPV)
-        query_all_prices = """
-            SELECT pr.valor as precio, g.nombre as comunidad, p.anio, 
-                   i.nombre as indicador, pr.categoria_gasto
-            FROM T_precios pr
-            JOIN tbl_geografia g ON pr.id_geografia = g.id_geografia
-            JOIN tbl_periodo p ON pr.id_periodo = p.id_periodo
-            JOIN tbl_indicador i ON pr.id_indicador = i.id_indicador
-        """
-        df_master_prices = pl.read_database(query=query_all_prices, connection=db_conn)
-
-        # 3. Bloque de Empleo
-        query_all_employment = """
-            SELECT e.valor as valor_empleo, g.nombre as comunidad, p.anio, 
-                   i.nombre as indicador, e.sexo, e.grupo_edad
-            FROM T_empleo e
-            JOIN tbl_geografia g ON e.id_geografia = g.id_geografia
-            JOIN tbl_periodo p ON e.id_periodo = p.id_periodo
-            JOIN tbl_indicador i ON e.id_indicador = i.id_indicador
-        """
-        df_master_employment = pl.read_database(
-            query=query_all_employment, connection=db_conn
+    )
+
+
+# -------------------------------------------------------------------
+# ANÁLISIS 4: Brecha Salarial por Ocupación
+# -------------------------------------------------------------------
+@grafo.nodo("Brecha_Salarial_Ocupacion", entradas=["salario_ocupacion_sexo"])
+def brecha_salarial_ocupacion(salario_ocupacion_sexo):
+    return (
+        salario_ocupacion_sexo
+        # Pivot: 'Mujeres' y 'Hombres' pasan a ser columnas
+        .group_by(["anio", "ocupacion"])
+        .agg(
+            pl.col("salario").filter(pl.col("sexo") == sexo).first().alias(sexo)
+            for sexo in ["Mujeres", "Hombres"]
         )
-
-        # =======================================================================
-        # FASE B: TRANSFORMACIÓN Y ANÁLISIS EN MEMORIA (POLARS)
-        # =======================================================================
-
-        # -------------------------------------------------------------------
-        # ANÁLISIS 1: Evolución del salario por comunidades
-        # -------------------------------------------------------------------
-        print("1/8 Procesando evolución salarial por CCAA.")
-
-        df_salaries_regions = (
-            # Filtramos para quedarnos solo con el salario medio anual y eliminar filas sin valor
-            df_master_salaries.filter(
-                (pl.col("indicador") == "Salario_Anual_Media")
-                & (pl.col("salario").is_not_null())
+        # Eliminamos cualquier fila que no tenga datos para ambos sexos
+        .drop_nulls()
+        # Calculamos el porcentaje de brecha y limpiamos las anomalías del INE (valores negativos)
+        .with_columns(
+            (((pl.col("Hombres") - pl.col("Mujeres")) / pl.col("Hombres")) * 100).alias(
+                "brecha_porcentual"
             )
-            # Agrupamos los datos por comunidad autónoma y año
-            .group_by(["comunidad", "anio"])
-            # Calculamos el promedio del salario para cada grupo creado
-            .agg(pl.col("salario").mean().alias("salario_medio"))
-            # Ordenamos los resultados por nombre de comunidad y año cronológico
-            .sort(["comunidad", "anio"])
         )
-
-        # -------------------------------------------------------------------
-        # ANÁLISIS 2: Ratio de Poder Adquisitivo (Salario / IPC)
-        # -------------------------------------------------------------------
-        print("2/8 Calculando ratio de poder adquisitivo.")
-
-        df_annual_cpi = (
-            df_master_prices
-            # Filtramos el índice del IPC nacional y general
-            .filter(
-                (pl.col("indicador") == "IPC_Indice")
-                & (pl.col("comunidad") == "Total Nacional")
-                & (pl.col("categoria_gasto") == "IPC General")
-                & (pl.col("precio").is_not_null())
-            )
-            # Agrupamos por año para calcular la media de los 12 meses
-            .group_by("anio")
-            # Promediamos el valor del IPC para obtener un índice anual único
-            .agg(pl.col("precio").mean().alias("ipc_valor"))
+        .filter(
+            (pl.col("brecha_porcentual").is_between(-100, 100))
+            & (pl.col("Mujeres") > 0)
+            & (pl.col("Hombres") > 0)
         )
-
-        # Unimos (Join) la tabla de salarios regionales con la del IPC anual nacional
-        df_purchasing_power = df_salaries_regions.join(df_annual_cpi, on="anio")
-
-        # Creamos una columna nueva calculando el ratio (Salario dividido por el IPC)
-        df_purchasing_power = df_purchasing_power.with_columns(
-            (pl.col("salario_medio") / pl.col("ipc_valor")).alias("poder_adquisitivo")
+        # Orden explícito: el de llegada de las filas depende de la fuente (SQLite o Parquet)
+        .sort(["anio", "ocupacion"])
+    )
+
+
+# -------------------------------------------------------------------
+# ANÁLISIS 5: Curva Salarial (Paro y salarios) y Correlación
+# -------------------------------------------------------------------
+@grafo.nodo("Relacion_Paro_Salarios", entradas=["Evolucion_Salario_Comunidades", "paro_anual_ccaa"])
+def relacion_paro_salarios(df_salaries_regions, df_annual_unemployment):
+    # Unimos los salarios y la tasa de paro media anual por comunidad y año
+    return (
+        df_salaries_regions.filter(pl.col("comunidad") != "Total Nacional")
+        .join(df_annual_unemployment, on=["comunidad", "anio"])
+        .sort(["anio", "comunidad"])
+    )
+
+
+@grafo.nodo("Correlacion_Paro_Salarios", entradas=["Relacion_Paro_Salarios"])
+def correlacion_paro_salarios(df_unemployment_salaries):
+    # Calculamos el coeficiente de correlación de Pearson entre ambas variables por cada región
+    return (
+        df_unemployment_salaries.group_by("comunidad")
+        .agg(pl.corr("tasa_paro_media", "salario_medio").alias("correlacion_pearson"))
+        .sort(["correlacion_pearson", "comunidad"])
+    )
+
+
+# ----------------------------------------------------------------------------------
+# ANÁLISIS 6: Comparativa Salario Nominal VS Salario Real (impacto de la inflación)
+# ----------------------------------------------------------------------------------
+@grafo.nodo("Salario_Nominal_vs_Real", entradas=["salario_nominal_anual", "ipc_anual"])
+def salario_nominal_vs_real(df_annual_nominal_salary, df_annual_cpi):
+    # Unimos el salario medio nominal con el IPC anual y creamos la columna
+    # del Salario Real (Deflactado)
+    return (
+        df_annual_nominal_salary.join(df_annual_cpi, on="anio")
+        .sort("anio")
+        .with_columns(
+            ((pl.col("salario_nominal") / pl.col("ipc_valor")) * 100).alias("salario_real")
         )
-
-        # -------------------------------------------------------------------
-        # ANÁLISIS 3: Comparativa IPV y Salarios
-        # -------------------------------------------------------------------
-        print("3/8 Comparando el precio de la vivienda y los salarios.")
-        df_annual_hpi = (
-            df_master_prices
-            # Filtramos el indicador de precios de vivienda nacional
-            .filter(
-                (pl.col("indicador") == "IPV_Indice")
-                & (pl.col("comunidad") == "Total Nacional")
-                & (pl.col("precio").is_not_null())
-            )
-            # Agrupamos por año para promediar los datos trimestrales
-            .group_by("anio")
-            # Calculamos el valor promedio anual de la vivienda
-            .agg(pl.col("precio").mean().alias("ipv"))
+    )
+
+
+# ----------------------------------------------------------------------------------
+# ANÁLISIS 7: Calidad Empleo (Contrato Temporal vs Indefinido)
+# ----------------------------------------------------------------------------------
+@grafo.nodo("Calidad_Empleo", entradas=["asalariados_anual"])
+def calidad_empleo(asalariados_anual):
+    return (
+        asalariados_anual
+        # Medias anuales de cada indicador, ya como columnas (pivot)
+        .group_by("anio")
+        .agg(
+            pl.col("valor_empleo").filter(pl.col("indicador") == indicador).first().alias(indicador)
+            for indicador in ["Asalariados_Total", "Asalariados_Temporal"]
         )
+        .sort("anio")
+        # Calculamos los porcentajes de empleo temporal e indefinido
+        .with_columns(
+            (
+                (pl.col("Asalariados_Temporal") / pl.col("Asalariados_Total")) * 100
+            ).alias("Temporal (%)"),
+            (
+                (
+                    (pl.col("Asalariados_Total") - pl.col("Asalariados_Temporal"))
+                    / pl.col("Asalariados_Total")
+                )
+                * 100
+            ).alias("Indefinido (%)"),
+        )
+    )
 
-        # Filtramos los salarios a nivel nacional para la comparativa
-        df_total_salary = df_salaries_regions.filter(
-            pl.col("comunidad") == "Total Nacional"
-        ).select(["anio", "salario_medio"])
 
-        # Unimos ambas tablas por año y ordenamos
-        df_hpi_salary_comparison = df_total_salary.join(df_annual_hpi, on="anio").sort(
-            "anio"
-        )
+# ----------------------------------------------------------------------------------
+# ANÁLISIS 8: Desigualdad Salarial
+# ----------------------------------------------------------------------------------
+@grafo.nodo("Desigualdad_Salarial", entradas=["percentiles_anual"])
+def desigualdad_salarial(percentiles_anual):
+    # Valor anual de cada estadístico salarial nacional
+    return percentiles_anual.sort(["anio", "salario"])
 
-        # Extraemos el valor del salario de 2015 para usarlo como base de normalización
-        salary_2015 = (
-            df_hpi_salary_comparison.filter(pl.col("anio") == 2015)
-            .select("salario_medio")
-            .item()
-        )
-        # Creamos el índice del salario base 100 para comparar el ritmo de subida con la vivienda
-        df_hpi_salary_comparison = df_hpi_salary_comparison.with_columns(
-            [(pl.col("salario_medio") / salary_2015 * 100).alias("indice_salario")]
-        )
 
-        # -------------------------------------------------------------------
-        # ANÁLISIS 4: Brecha Salarial por Ocupación
-        # -------------------------------------------------------------------
-        print("4/8 Comparando el precio de la vivienda y los salarios.")
-
-        df_gap_pivot = (
-            df_master_salaries
-            # Filtramos salarios por ocupación, excluyendo totales y registros incompletos
-            .filter(
-                (pl.col("indicador") == "Salario_Anual_Ocupacion")
-                & (pl.col("sexo").is_in(["Hombres", "Mujeres"]))
-                & (~pl.col("ocupacion").is_in(["Total", "N/A"]))
-                & (pl.col("salario").is_not_null())
-            )
-            # Transformamos la tabla (pivot) para que 'Hombres' y 'Mujeres' sean columnas independientes
-            .pivot(
-                index=["anio", "ocupacion"],
-                on="sexo",
-                values="salario",
-                aggregate_function="mean",
-            )
-            # Eliminamos cualquier fila que no tenga datos para ambos sexos
-            .drop_nulls()
+def leer_bloques_maestros():
+    """
+    Los 3 grandes bloques de datos (salarios, precios, empleo) como LazyFrame,
+    solo con los indicadores que se analizan; el resto del filtrado se
+    delega a Polars.
+    """
+    if existe_almacen():
+        # Almacén Parquet particionado: lectura columnar y paralela, sin
+        # bloqueos de SQLite. Solo se abren las particiones de los
+        # indicadores filtrados y las columnas que usa el plan.
+        print("Leyendo datos maestros del almacén Parquet.")
+        lf_master_salaries = escanear_bloque("salarios", INDICADORES_SALARIOS).select(
+            "salario", "comunidad", "anio", "indicador", "sexo", "ocupacion"
         )
-
-        # Calculamos el porcentaje de brecha y limpiamos las anomalías del INE (valores negativos)
-        df_gap_pivot = df_gap_pivot.with_columns(
-            (((pl.col("Hombres") - pl.col("Mujeres")) / pl.col("Hombres")) * 100).alias(
-                "brecha_porcentual"
-            )
-        ).filter(
-            (pl.col("brecha_porcentual").is_between(-100, 100))
-            & (pl.col("Mujeres") > 0)
-            & (pl.col("Hombres") > 0)
+        lf_master_prices = escanear_bloque("precios", INDICADORES_PRECIOS).select(
+            "precio", "comunidad", "anio", "indicador", "categoria_gasto"
         )
-
-        # -------------------------------------------------------------------
-        # ANÁLISIS 5: Curva Salarial (Paro y salarios) y Correlación
-        # -------------------------------------------------------------------
-        print("5/8 Calculando correlaciones entre tasa de paro y salarios.")
-
-        df_annual_unemployment = (
-            df_master_employment
-            # Filtramos la tasa de paro por comunidad para la población general
-            .filter(
-                (pl.col("indicador") == "Tasa_Paro")
-                & (pl.col("comunidad") != "Total Nacional")
-                & (pl.col("sexo") == "Ambos sexos")
-                & (pl.col("grupo_edad") == "Todas las edades")
-                & (pl.col("valor_empleo").is_not_null())
-            )
-            # Agrupamos por comunidad y año para convertir datos trimestrales a anuales
-            .group_by(["comunidad", "anio"])
-            # Calculamos la tasa de paro media anual
-            .agg(pl.col("valor_empleo").mean().alias("tasa_paro_media"))
+        lf_master_employment = escanear_bloque("empleo", INDICADORES_EMPLEO).select(
+            "valor_empleo", "comunidad", "anio", "indicador", "sexo", "grupo_edad"
         )
+    else:
+        print("Extrayendo datos maestros de la base de datos.")
 
-        # Unimos los datos de salarios y paro por comunidad y año
-        df_unemployment_salaries = (
-            df_salaries_regions.filter(pl.col("comunidad") != "Total Nacional")
-            .join(df_annual_unemployment, on=["comunidad", "anio"])
-            .sort(["anio", "comunidad"])
-        )
+        # Conexión de solo lectura del pool: puede convivir con una carga en
+        # curso y vuelve al pool en cuanto terminan las tres lecturas
+        with DatabaseConnection().lectura() as db_conn:
+            # 1. Bloque de Salarios
+            # (Tipos inferidos sobre todas las filas: hay columnas que empiezan a NULL)
+            lf_master_salaries = pl.read_database(
+                query=CONSULTA_SALARIOS, connection=db_conn, infer_schema_length=None
+            ).lazy()
 
-        # Calculamos el coeficiente de correlación de Pearson entre ambas variables por cada región
-        df_correlation = (
-            df_unemployment_salaries.group_by("comunidad")
-            .agg(
-                pl.corr("tasa_paro_media", "salario_medio").alias("correlacion_pearson")
-            )
-            .sort("correlacion_pearson")
-        )
+            # 2. Bloque de Precios (IPC e IPV)
+            lf_master_prices = pl.read_database(
+                query=CONSULTA_PRECIOS, connection=db_conn, infer_schema_length=None
+            ).lazy()
 
-        # ----------------------------------------------------------------------------------
-        # ANÁLISIS 6: Comparativa Salario Nominal VS Salario Real (impacto de la inflación)
-        # ----------------------------------------------------------------------------------
-        print("6/8 Deflactando inflación (Nominal vs Real).")
-        df_annual_nominal_salary = (
-            df_master_salaries
-            # Seleccionamos el coste salarial trimestral nacional
-            .filter(
-                (pl.col("indicador") == "Salario_Coste_Trimestral")
-                & (pl.col("comunidad") == "Total Nacional")
-                & (pl.col("salario").is_not_null())
-            )
-            # Agrupamos por año para obtener la media nominal
-            .group_by("anio")
-            # Calculamos el salario medio nominal (sin ajustar por inflación)
-            .agg(pl.col("salario").mean().alias("salario_nominal"))
-        )
+            # 3. Bloque de Empleo
+            lf_master_employment = pl.read_database(
+                query=CONSULTA_EMPLEO, connection=db_conn, infer_schema_length=None
+            ).lazy()
 
-        # Unimos con el IPC anual y creamos la columna del Salario Real (Deflactado)
-        df_real_salary_comparison = (
-            df_annual_nominal_salary.join(df_annual_cpi, on="anio")
-            .sort("anio")
-            .with_columns(
-                ((pl.col("salario_nominal") / pl.col("ipc_valor")) * 100).alias(
-                    "salario_real"
-                )
-            )
-        )
+    return lf_master_salaries, lf_master_prices, lf_master_employment
 
-        # ----------------------------------------------------------------------------------
-        # ANÁLISIS 7: Calidad Empleo (Contrato Temporal vs Indefinido)
-        # ----------------------------------------------------------------------------------
 
-        print("7/8 Evaluando calidad del empleo (Temporalidad).")
-        df_job_quality = (
-            df_master_employment
-            # Filtramos los datos de asalariados totales y temporales
-            .filter(
-                (
-                    pl.col("indicador").is_in(
-                        ["Asalariados_Total", "Asalariados_Temporal"]
-                    )
-                )
-                & (pl.col("comunidad") == "Total Nacional")
-                & (pl.col("valor_empleo").is_not_null())
-            )
-            # Agrupamos por año e indicador para obtener medias anuales limpias
-            .group_by(["anio", "indicador"])
-            .agg(pl.col("valor_empleo").mean())
-            # Convertimos los indicadores a columnas para operar entre ellas
-            .pivot(values="valor_empleo", index="anio", on="indicador")
-            .sort("anio")
-            # Calculamos los porcentajes de empleo temporal e indefinido
-            .with_columns(
-                (
-                    (pl.col("Asalariados_Temporal") / pl.col("Asalariados_Total")) * 100
-                ).alias("Temporal (%)"),
-                (
-                    (
-                        (pl.col("Asalariados_Total") - pl.col("Asalariados_Temporal"))
-                        / pl.col("Asalariados_Total")
-                    )
-                    * 100
-                ).alias("Indefinido (%)"),
-            )
-        )
+@metricas.etapa("fase2")
+def process_data_polars(incremental=True, objetivos=None, exportar_csv=True):
+    """
+    Función principal de transformación de datos.
+    Parte de las medias anuales (actualizadas de forma incremental o, con
+    incremental=False, recalculadas desde cero). En los dos casos los datos
+    salen del almacén Parquet, o de SQLite solo si el almacén no existe.
+    Aplica lógica de negocio con Polars y genera los datasets finales en
+    Parquet (y CSV si 'exportar_csv'). 'objetivos' limita la ejecución a
+    esos datasets (y a los nodos de los que dependen).
+    Devuelve {nombre: DataFrame} para pasárselo en memoria a la Fase 3,
+    o None si falla.
+    """
+    print("\nIniciando transformación de datos con Polars.")
 
-        # ----------------------------------------------------------------------------------
-        # ANÁLISIS 8: Desigualdad Salarial
-        # ----------------------------------------------------------------------------------
-        print("8/8 Procesando tramos de ingresos y desigualdad salarial.")
-        percentiles = [
-            "Salario_Anual_Media",
-            "Salario_Anual_Mediana",
-            "Salario_Anual_Percentil 10",
-            "Salario_Anual_Cuartil inferior",
-        ]
-
-        df_annual_percentiles = (
-            df_master_salaries
-            # Filtramos todos los estadísticos de interés a nivel nacional
-            .filter(
-                (pl.col("indicador").is_in(percentiles))
-                & (pl.col("comunidad") == "Total Nacional")
-                & (pl.col("sexo") == "Total")
-                & (pl.col("salario").is_not_null())
-            )
-            # Agrupamos para obtener el valor anual por cada tipo de estadístico
-            .group_by(["anio", "indicador"])
-            .agg(pl.col("salario").mean())
-            .sort(["anio", "salario"])
-        )
+    try:
+        # =======================================================================
+        # FASE A: MEDIAS ANUALES DE LAS QUE PARTEN LOS ANÁLISIS
+        # =======================================================================
+        with metricas.etapa("fase2.agregados"):
+            if incremental:
+                # Solo se leen las filas cargadas desde la última ejecución
+                print("Actualizando las medias anuales con las filas nuevas.")
+                agregados = actualizar_agregados()
+            else:
+                # Recálculo completo sobre toda la historia
+                agregados = calcular_agregados(*leer_bloques_maestros())
+
+        # =======================================================================
+        # FASE B: GRAFO DE ANÁLISIS (NODOS INDEPENDIENTES EN PARALELO)
+        # =======================================================================
+        print("Ejecutando el grafo de análisis.")
+        datasets, informe = grafo.ejecutar(objetivos, externos=agregados)
+        for nombre, (estado, segundos) in informe.items():
+            print(f"  {nombre:<32} {estado:<10} {segundos:6.2f}s")
 
         # =======================================================================
-        # FASE C: EXPORTACIÓN A CSV Y PARQUET
+        # FASE C: EXPORTACIÓN A PARQUET (Y CSV OPCIONAL)
+        # El Parquet es el formato de intercambio con la Fase 3 cuando no se
+        # le pasan los datasets en memoria; el CSV es solo una salida más.
         # =======================================================================
-        print("\nExportando resultados a las carpetas CSV y Parquet.")
+        formatos = "Parquet y CSV" if exportar_csv else "Parquet"
+        print(f"\nExportando resultados a {formatos}.")
         # Definimos la ruta de salida hacia data_output
         output_dir = os.path.join(project_root, "data_output")
 
         # Verificamos que las carpetas existen
-        os.makedirs(output_dir, exist_ok=True)
-        os.makedirs(os.path.join(output_dir, "csv"), exist_ok=True)
         os.makedirs(os.path.join(output_dir, "parquet"), exist_ok=True)
-
-        # Diccionario con los nombres de los archivos y sus dataframes
-        datasets = {
-            "Evolucion_Salario_Comunidades": df_salaries_regions,
-            "Relacion_Poder_Adquisitivo": df_purchasing_power,
-            "Comparativa_Vivienda_Salario": df_hpi_salary_comparison,
-            "Brecha_Salarial_Ocupacion": df_gap_pivot,
-            "Relacion_Paro_Salarios": df_unemployment_salaries,
-            "Correlacion_Paro_Salarios": df_correlation,
-            "Salario_Nominal_vs_Real": df_real_salary_comparison,
-            "Calidad_Empleo": df_job_quality,
-            "Desigualdad_Salarial": df_annual_percentiles,
-        }
-
-        for file_name, df in datasets.items():
-            # Exportar como CSV
-            df.write_csv(os.path.join(output_dir, "csv", f"{file_name}.csv"))
-            # Exportar como Parquet
-            df.write_parquet(
-                os.path.join(output_dir, "parquet", f"{file_name}.parquet")
-            )
+        if exportar_csv:
+            os.makedirs(os.path.join(output_dir, "csv"), exist_ok=True)
+
+        with metricas.etapa("fase2.exportacion"):
+            for file_name, df in datasets.items():
+                # Exportar como Parquet
+                df.write_parquet(
+                    os.path.join(output_dir, "parquet", f"{file_name}.parquet")
+                )
+                # Exportar como CSV
+                if exportar_csv:
+                    df.write_csv(os.path.join(output_dir, "csv", f"{file_name}.csv"))
+            metricas.sumar("fase2.exportacion", filas_exportadas=sum(df.height for df in datasets.values()))
 
         print(
             f"\nFase ETL finalizada. {len(datasets)} datasets generados en '{output_dir}'"
         )
+        return datasets
 
     except Exception as e:
         print(f"Error en el procesamiento: {e}")
-    finally:
-        db_conn.close()
 
 
 if __name__ == "__main__":
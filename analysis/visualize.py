@@ -3,311 +3,483 @@ import polars as pl
 import plotly.express as px
 import plotly.graph_objects as go
 import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Configuración de rutas
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
-data_dir = os.path.join(project_root, "data_output")
-csv_dir = os.path.join(data_dir, "csv")
-os.makedirs(os.path.join(data_dir, "graphics"), exist_ok=True)
+sys.path.append(project_root)
 
+from src import metricas
+from analysis.dashboard import DASHBOARD_DIR, construir_dashboard, especificacion
+from analysis.tendencias import calcular_tendencia
 
+data_dir = os.path.join(project_root, "data_output")
+parquet_dir = os.path.join(data_dir, "parquet")
+graphics_dir = os.path.join(data_dir, "graphics")
 
-def generate_plotly_charts():
-    """
-    Función principal de visualización.
-    Lee los datasets de los CSVs y genera gráficos interactivos en HTML.
-    """
-    print("\nIniciando generación de gráficos con Plotly.")
+# Tendencia de la Curva Salarial (gráfico 4): la 'frac' por defecto de Plotly Express
+TENDENCIA_CURVA_SALARIAL = {"metodo": "lowess", "frac": 0.6666666}
 
-    try:
-        # -------------------------------------------------------------------
-        # GRÁFICO 1: Evolución del salario por comunidad autónoma
-        # -------------------------------------------------------------------
-        print("1/8 Generando gráfico de evolución salarial.")
-        df_salaries = pl.read_csv(
-            os.path.join(csv_dir, "Evolucion_Salario_Comunidades.csv")
-        )
-
-        # Este gráfico permite ver cómo han crecido los salarios en cada sitio
-        fig1 = px.line(
-            df_salaries,
-            x="anio",
-            y="salario_medio",
-            color="comunidad",
-            title="Evolución del Salario Medio Anual por CCAA",
-            markers=True,
-            labels={"salario_medio": "Euros (€)", "anio": "Año"},
-        )
-        fig1.write_html(os.path.join(data_dir, "graphics", "1_evolucion_salarios.html"))
-
-        # -------------------------------------------------------------------
-        # GRÁFICO 2: 'Carrera' de salarios y precio de la vivienda
-        # -------------------------------------------------------------------
-        print("2/8 Dibujando carrera Salarios vs Vivienda.")
-        df_comparison = pl.read_csv(
-            os.path.join(csv_dir, "Comparativa_Vivienda_Salario.csv")
-        )
 
-        fig2 = go.Figure()
 
-        # Línea de Salarios
-        fig2.add_trace(
-            go.Scatter(
-                x=df_comparison["anio"],
-                y=df_comparison["indice_salario"],
-                mode="lines+markers",
-                name="Salarios (Base 100)",
-            )
-        )
-
-        # Línea de Vivienda
-        fig2.add_trace(
-            go.Scatter(
-                x=df_comparison["anio"],
-                y=df_comparison["ipv"],
-                mode="lines+markers",
-                name="Precio Vivienda (Base 100)",
-                line=dict(dash="dot"),  # Línea punteada para diferenciar
-            )
-        )
-
-        fig2.update_layout(
-            title="Carrera de Precios: Salarios vs Vivienda (Base 100 = 2015)",
-            xaxis_title="Año",
-            yaxis_title="Índice de Crecimiento (Base 100)",
-            hovermode="x unified",
+def cargar_dataset(nombre, datasets=None):
+    """
+    Devuelve el dataset de la Fase 2: el DataFrame en memoria si viene en
+    'datasets' o, si no, su Parquet (ya tipado, sin inferir el esquema).
+    """
+    if datasets and nombre in datasets:
+        return datasets[nombre]
+    return pl.read_parquet(os.path.join(parquet_dir, f"{nombre}.parquet"))
+
+
+# -------------------------------------------------------------------
+# GRÁFICO 1: Evolución del salario por comunidad autónoma
+# -------------------------------------------------------------------
+def grafico_evolucion_salarios(datasets=None):
+    print("1/8 Generando gráfico de evolución salarial.")
+    df_salaries = cargar_dataset("Evolucion_Salario_Comunidades", datasets)
+
+    # Este gráfico permite ver cómo han crecido los salarios en cada sitio
+    fig1 = px.line(
+        df_salaries,
+        x="anio",
+        y="salario_medio",
+        color="comunidad",
+        title="Evolución del Salario Medio Anual por CCAA",
+        markers=True,
+        labels={"salario_medio": "Euros (€)", "anio": "Año"},
+    )
+    return fig1
+
+
+# -------------------------------------------------------------------
+# GRÁFICO 2: 'Carrera' de salarios y precio de la vivienda
+# -------------------------------------------------------------------
+def grafico_vivienda_vs_salarios(datasets=None):
+    print("2/8 Dibujando carrera Salarios vs Vivienda.")
+    df_comparison = cargar_dataset("Comparativa_Vivienda_Salario", datasets)
+
+    fig2 = go.Figure()
+
+    # Línea de Salarios
+    fig2.add_trace(
+        go.Scatter(
+            x=df_comparison["anio"],
+            y=df_comparison["indice_salario"],
+            mode="lines+markers",
+            name="Salarios (Base 100)",
         )
-
-        fig2.write_html(os.path.join(data_dir, "graphics", "2_vivienda_vs_salarios.html"))
-
-        # -------------------------------------------------------------------
-        # GRÁFICO 3: Brecha Salarial por Ocupación
-        # -------------------------------------------------------------------
-        print("3/8 Creando barras de Brecha Salarial de Género...")
-        df_gap = pl.read_csv(os.path.join(csv_dir, "Brecha_Salarial_Ocupacion.csv"))
-
-        # Nos quedamos con la foto del último año disponible
-        last_year = df_gap["anio"].max()
-        df_gap_latest = df_gap.filter(pl.col("anio") == last_year)
-
-        # Ordenamos de menor a mayor brecha para que el gráfico quede escalonado visualmente
-        df_gap_latest = df_gap_latest.sort("brecha_porcentual")
-
-        fig3 = px.bar(
-            df_gap_latest,
-            x="brecha_porcentual",
-            y="ocupacion",
-            orientation="h",  # Barras horizontales para poder leer bien los textos largos
-            title=f"Brecha Salarial de Género por Tipo de Ocupación ({last_year})",
-            labels={"brecha_porcentual": "Brecha Salarial (%)", "ocupacion": ""},
-            color="brecha_porcentual",
-            color_continuous_scale="Reds",  # Tonos rojos (más oscuro = más brecha)
-            text_auto=".1f",  # Muestra el valor en la barra (con 1 decimal)
+    )
+
+    # Línea de Vivienda
+    fig2.add_trace(
+        go.Scatter(
+            x=df_comparison["anio"],
+            y=df_comparison["ipv"],
+            mode="lines+markers",
+            name="Precio Vivienda (Base 100)",
+            line=dict(dash="dot"),  # Línea punteada para diferenciar
         )
-
-        # Añadimos una línea punteada en el 0% por referencia
-        fig3.add_vline(x=0, line_dash="dash", line_color="black")
-
-        fig3.update_layout(
-            yaxis=dict(tickmode="linear")
-        )  # Fuerza a que se lean todas las ocupaciones
-
-        fig3.write_html(os.path.join(data_dir, "graphics", "3_brecha_salarial.html"))
-
-        # -------------------------------------------------------------------
-        # GRÁFICO 4: Scatter Plot Animado (Curva Salarial)
-        # -------------------------------------------------------------------
-        print("4/8 Renderizando animación de la Curva Salarial.")
-        df_unemployment_salaries = pl.read_csv(os.path.join(csv_dir, "Relacion_Paro_Salarios.csv"))
-
-        fig4 = px.scatter(
-            df_unemployment_salaries,
-            x="tasa_paro_media",
-            y="salario_medio",
-            animation_frame="anio",  # Crea la barra de reproducción por año
-            animation_group="comunidad",
-            color="comunidad",
-            hover_name="comunidad",
-            title="Relación entre Tasa de Paro y Salarios por CCAA (Curva Salarial)",
-            labels={
-                "tasa_paro_media": "Tasa de Paro Media (%)",
-                "salario_medio": "Salario Medio Anual (€)",
-                "comunidad": "Comunidad Autónoma",
-            },
-            range_x=[0, 40],
-            range_y=[15000, 33000],
-            trendline="lowess",
-            trendline_scope="overall",  # Hace una línea general para toda España
-            trendline_color_override="black",  # Ponemos la línea en negro para que resalte sobre los puntos
+    )
+
+    fig2.update_layout(
+        title="Carrera de Precios: Salarios vs Vivienda (Base 100 = 2015)",
+        xaxis_title="Año",
+        yaxis_title="Índice de Crecimiento (Base 100)",
+        hovermode="x unified",
+    )
+
+    return fig2
+
+
+# -------------------------------------------------------------------
+# GRÁFICO 3: Brecha Salarial por Ocupación
+# -------------------------------------------------------------------
+def grafico_brecha_salarial(datasets=None):
+    print("3/8 Creando barras de Brecha Salarial de Género...")
+    df_gap = cargar_dataset("Brecha_Salarial_Ocupacion", datasets)
+
+    # Nos quedamos con la foto del último año disponible
+    last_year = df_gap["anio"].max()
+    df_gap_latest = df_gap.filter(pl.col("anio") == last_year)
+
+    # Ordenamos de menor a mayor brecha para que el gráfico quede escalonado visualmente
+    df_gap_latest = df_gap_latest.sort("brecha_porcentual")
+
+    fig3 = px.bar(
+        df_gap_latest,
+        x="brecha_porcentual",
+        y="ocupacion",
+        orientation="h",  # Barras horizontales para poder leer bien los textos largos
+        title=f"Brecha Salarial de Género por Tipo de Ocupación ({last_year})",
+        labels={"brecha_porcentual": "Brecha Salarial (%)", "ocupacion": ""},
+        color="brecha_porcentual",
+        color_continuous_scale="Reds",  # Tonos rojos (más oscuro = más brecha)
+        text_auto=".1f",  # Muestra el valor en la barra (con 1 decimal)
+    )
+
+    # Añadimos una línea punteada en el 0% por referencia
+    fig3.add_vline(x=0, line_dash="dash", line_color="black")
+
+    fig3.update_layout(
+        yaxis=dict(tickmode="linear")
+    )  # Fuerza a que se lean todas las ocupaciones
+
+    return fig3
+
+
+# -------------------------------------------------------------------
+# GRÁFICO 4: Scatter Plot Animado (Curva Salarial)
+# -------------------------------------------------------------------
+def grafico_paro_vs_salarios(datasets=None):
+    print("4/8 Renderizando animación de la Curva Salarial.")
+    df_unemployment_salaries = cargar_dataset("Relacion_Paro_Salarios", datasets)
+
+    fig4 = px.scatter(
+        df_unemployment_salaries,
+        x="tasa_paro_media",
+        y="salario_medio",
+        animation_frame="anio",  # Crea la barra de reproducción por año
+        animation_group="comunidad",
+        color="comunidad",
+        hover_name="comunidad",
+        title="Relación entre Tasa de Paro y Salarios por CCAA (Curva Salarial)",
+        labels={
+            "tasa_paro_media": "Tasa de Paro Media (%)",
+            "salario_medio": "Salario Medio Anual (€)",
+            "comunidad": "Comunidad Autónoma",
+        },
+        range_x=[0, 40],
+        range_y=[15000, 33000],
+    )
+
+    # Ponemos los puntos más grandes y bonitos
+    fig4.update_traces(
+        marker=dict(size=14, opacity=0.8, line=dict(width=1, color="DarkSlateGrey"))
+    )
+
+    # Línea de tendencia general para toda España, precalculada (y en caché)
+    # en lugar de trendline="lowess"; metodo="medias" o "spline" también valen
+    tendencia = calcular_tendencia(
+        df_unemployment_salaries, "tasa_paro_media", "salario_medio", **TENDENCIA_CURVA_SALARIAL
+    )
+    fig4.add_trace(
+        go.Scatter(
+            x=tendencia["tasa_paro_media"],
+            y=tendencia["salario_medio"],
+            mode="lines",
+            name="Overall Trendline",
+            line=dict(color="black"),  # En negro para que resalte sobre los puntos
+            hovertemplate="<b>Tendencia</b><br><br>Tasa de Paro Media (%)=%{x}<br>"
+            "Salario Medio Anual (€)=%{y} <b>(trend)</b><extra></extra>",
         )
-
-        # Ponemos los puntos más grandes y bonitos
-        fig4.update_traces(
-            marker=dict(size=14, opacity=0.8, line=dict(width=1, color="DarkSlateGrey"))
+    )
+
+    # Aumentamos el tiempo de la animación para que no vaya tan rápido
+    fig4.layout.updatemenus[0].buttons[0].args[1]["frame"]["duration"] = 1000
+
+    return fig4
+
+
+# -------------------------------------------------------------------
+# GRÁFICO 4.B: Correlación Paro-Salario por CCAA
+# -------------------------------------------------------------------
+def grafico_correlacion_paro_salarios(datasets=None):
+    print("5/8 Pintando matriz de correlaciones.")
+    df_correlation = cargar_dataset("Correlacion_Paro_Salarios", datasets)
+
+    fig_corr = px.bar(
+        df_correlation,
+        x="correlacion_pearson",
+        y="comunidad",
+        orientation="h",
+        title="Fuerza de la Curva Salarial: Correlación Paro vs Salario por CCAA",
+        labels={
+            "correlacion_pearson": "Coeficiente de Correlación de Pearson (r)",
+            "comunidad": "",
+        },
+        # Coloreamos según el valor: azul oscuro para correlaciones muy negativas (fuertes)
+        color="correlacion_pearson",
+        color_continuous_scale="RdBu",  # Rojo (positivo) a Azul (negativo)
+        range_color=[-1, 1],  # La correlación siempre va de -1 a 1
+        text_auto=".2f",  # Mostrar el numerito con 2 decimales
+    )
+
+    # Añadimos una línea en el 0 para marcar la frontera
+    fig_corr.add_vline(x=0, line_width=2, line_dash="solid", line_color="black")
+
+    # Forzamos que se vean todos los nombres de las CCAA
+    fig_corr.update_layout(yaxis=dict(tickmode="linear"))
+
+    return fig_corr
+
+
+# -------------------------------------------------------------------
+# GRÁFICO 5: Salario Nominal vs Salario Real (Deflactado)
+# -------------------------------------------------------------------
+def grafico_salario_nominal_vs_real(datasets=None):
+    print("6/8 Visualizando Ilusión Monetaria...")
+    df_real_salary = cargar_dataset("Salario_Nominal_vs_Real", datasets)
+
+    fig5 = go.Figure()
+
+    # 1. Añadimos el Salario Real (Línea sólida verde)
+    fig5.add_trace(
+        go.Scatter(
+            x=df_real_salary["anio"],
+            y=df_real_salary["salario_real"],
+            mode="lines+markers",
+            name="Salario Real (Poder Adquisitivo)",
+            line=dict(color="green", width=3),
         )
-
-        # Aumentamos el tiempo de la animación para que no vaya tan rápido
-        fig4.layout.updatemenus[0].buttons[0].args[1]["frame"]["duration"] = 1000
-
-        fig4.write_html(os.path.join(data_dir, "graphics", "4_paro_vs_salarios.html"))
-
-        # -------------------------------------------------------------------
-        # GRÁFICO 4.B: Correlación Paro-Salario por CCAA
-        # -------------------------------------------------------------------
-        print("5/8 Pintando matriz de correlaciones.")
-        df_correlation = pl.read_csv(os.path.join(csv_dir, "Correlacion_Paro_Salarios.csv"))
-        
-        fig_corr = px.bar(
-            df_correlation,
-            x="correlacion_pearson",
-            y="comunidad",
-            orientation="h",
-            title="Fuerza de la Curva Salarial: Correlación Paro vs Salario por CCAA",
-            labels={
-                "correlacion_pearson": "Coeficiente de Correlación de Pearson (r)",
-                "comunidad": "",
-            },
-            # Coloreamos según el valor: azul oscuro para correlaciones muy negativas (fuertes)
-            color="correlacion_pearson",
-            color_continuous_scale="RdBu",  # Rojo (positivo) a Azul (negativo)
-            range_color=[-1, 1],  # La correlación siempre va de -1 a 1
-            text_auto=".2f",  # Mostrar el numerito con 2 decimales
+    )
+
+    # 2. Añadimos el Salario Nominal (Línea punteada roja)
+    # El atributo 'fill=tonexty' rellena el hueco hasta la línea verde que pintamos antes
+    fig5.add_trace(
+        go.Scatter(
+            x=df_real_salary["anio"],
+            y=df_real_salary["salario_nominal"],
+            mode="lines+markers",
+            name="Salario Nominal (Euros Brutos en Nómina)",
+            line=dict(color="red", width=3, dash="dot"),
+            fill="tonexty",
+            fillcolor="rgba(255, 0, 0, 0.15)",  # Sombreado rojo translúcido
         )
+    )
+
+    # 3. Configuración visual
+    fig5.update_layout(
+        title="Ilusión Monetaria: Salario Nominal vs Salario Real (Base IPC 2021=100)",
+        xaxis_title="Año",
+        yaxis_title="Euros (€)",
+        hovermode="x unified",  # Al pasar el ratón, compara los dos valores del año de golpe
+    )
+
+    return fig5
+
+
+# -------------------------------------------------------------------
+# GRÁFICO 6: Calidad del Empleo (Área Apilada)
+# -------------------------------------------------------------------
+def grafico_calidad_empleo(datasets=None):
+    print("7/8 Generando gráfico de área de Temporalidad.")
+    df_job_quality = cargar_dataset("Calidad_Empleo", datasets)
+
+    fig6 = px.area(
+        df_job_quality,
+        x="anio",
+        y=[
+            "Indefinido (%)",
+            "Temporal (%)",
+        ],  # El orden importa: Indefinido abajo, Temporal arriba
+        title="Calidad del Empleo en España: Contratos Indefinidos vs Temporales",
+        labels={
+            "value": "Porcentaje sobre el total de Asalariados (%)",
+            "anio": "Año",
+            "variable": "Tipo de Contrato",
+        },
+        color_discrete_map={"Indefinido (%)": "#2ca02c", "Temporal (%)": "#d62728"},
+    )
+
+    # Configuramos el eje Y para que siempre vaya de 0 a 100 exactos
+    fig6.update_layout(yaxis=dict(range=[0, 100]), hovermode="x unified")
+
+    return fig6
+
+
+# -------------------------------------------------------------------
+# GRÁFICO 7: Desigualdad Salarial (Distribución de Riqueza)
+# -------------------------------------------------------------------
+def grafico_desigualdad_salarial(datasets=None):
+    print("8/8 Dibujando pirámide de desigualdad salarial...")
+    df_inequality = cargar_dataset("Desigualdad_Salarial", datasets)
+
+    fig7 = px.line(
+        df_inequality,
+        x="anio",
+        y="salario",
+        color="indicador",
+        markers=True,
+        title="Desigualdad Salarial en España: Evolución por Tramos de Ingresos",
+        labels={
+            "salario": "Salario Anual Bruto (€)",
+            "anio": "Año",
+            "indicador": "Tramo Salarial",
+        },
+        # Asignamos colores jerárquicos: Azul (Media, la más alta), Verde (Mediana), Naranja (Cuartil), Rojo (Pobres)
+        color_discrete_map={
+            "Salario_Anual_Media": "#1f77b4",
+            "Salario_Anual_Mediana": "#2ca02c",
+            "Salario_Anual_Cuartil inferior": "#ff7f0e",
+            "Salario_Anual_Percentil 10": "#d62728",
+        },
+    )
+
+    # Añadimos interactividad unificada para ver todos los sueldos a la vez al pasar el ratón
+    fig7.update_layout(hovermode="x unified")
+
+    return fig7
+
+
+# -------------------------------------------------------------------
+# GRÁFICO 8: Evolución del Paro por CCAA (Gráfico Facetado)
+# -------------------------------------------------------------------
+def grafico_paro_facetado(datasets=None):
+    print("Extra: Generando panel facetado (Subplots) de desempleo...")
+    df_unemployment_salaries = cargar_dataset("Relacion_Paro_Salarios", datasets)
+
+    # Con muchas comunidades el espaciado por defecto (0.07) no cabe entre tantas filas
+    filas = -(-df_unemployment_salaries["comunidad"].n_unique() // 4)
+    fig8 = px.line(
+        df_unemployment_salaries,
+        x="anio",
+        y="tasa_paro_media",
+        facet_col="comunidad",
+        facet_col_wrap=4,
+        facet_row_spacing=min(0.07, 0.5 / max(filas - 1, 1)),
+        title="Evolución de la Tasa de Paro por CCAA (Gráfico Facetado)",
+        labels={"tasa_paro_media": "Paro (%)", "anio": ""},
+    )
+
+    # Quitamos la etiqueta redundante de "comunidad=" en cada sub-título
+    fig8.for_each_annotation(lambda a: a.update(text=a.text.split("=")[-1]))
+
+    return fig8
+
+
+# Gráficos de la Fase 3: (fichero / pestaña, título de la pestaña, función)
+GRAFICOS = [
+    ("1_evolucion_salarios", "📈 Evolución Salario Medio", grafico_evolucion_salarios),
+    ("2_vivienda_vs_salarios", "🏠 Vivienda vs Salarios", grafico_vivienda_vs_salarios),
+    ("3_brecha_salarial", "⚖️ Brecha de Género", grafico_brecha_salarial),
+    ("4_paro_vs_salarios", "📉 Paro y Salarios", grafico_paro_vs_salarios),
+    ("4b_correlacion_paro_salarios", "🔗 Correlación Paro/Salario", grafico_correlacion_paro_salarios),
+    ("5_salario_nominal_vs_real", "💵 Salario Nominal vs Real", grafico_salario_nominal_vs_real),
+    ("6_calidad_empleo", "🏆 Calidad del Empleo", grafico_calidad_empleo),
+    ("7_desigualdad_salarial", "📊 Desigualdad Salarial", grafico_desigualdad_salarial),
+    ("8_paro_facetado", "🗺️ Paro por CCAA", grafico_paro_facetado),
+]
+
+
+# Los gráficos más lentos se envían primero al pool para que no queden para el final
+PESADOS = {"4_paro_vs_salarios", "8_paro_facetado"}
+
+
+def renderizar_grafico(indice, datasets=None, dashboard=False):
+    """
+    Construye y escribe un gráfico de GRAFICOS. Es un trabajo independiente:
+    un fallo no afecta a los demás. Devuelve (resultado, error, segundos,
+    segundos de CPU); el resultado es la especificación de la figura en modo
+    'dashboard'. La CPU es la del proceso que lo renderiza.
+    """
+    fichero, _, funcion = GRAFICOS[indice]
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    try:
+        fig = funcion(datasets)
+        if dashboard:
+            resultado = especificacion(fig)
+        else:
+            fig.write_html(os.path.join(graphics_dir, f"{fichero}.html"))
+            resultado = None
+        error = None
+    except Exception as e:
+        resultado, error = None, f"{type(e).__name__}: {e}"
+    return resultado, error, time.perf_counter() - inicio, time.process_time() - inicio_cpu
 
-        # Añadimos una línea en el 0 para marcar la frontera
-        fig_corr.add_vline(x=0, line_width=2, line_dash="solid", line_color="black")
-
-        # Forzamos que se vean todos los nombres de las CCAA
-        fig_corr.update_layout(yaxis=dict(tickmode="linear"))
-
-        fig_corr.write_html(os.path.join(data_dir, "graphics", "4b_correlacion_paro_salarios.html"))
-
-        # -------------------------------------------------------------------
-        # GRÁFICO 5: Salario Nominal vs Salario Real (Deflactado)
-        # -------------------------------------------------------------------
-        print("6/8 Visualizando Ilusión Monetaria...")
-        df_real_salary = pl.read_csv(os.path.join(csv_dir, "Salario_Nominal_vs_Real.csv"))
-
-        fig5 = go.Figure()
 
-        # 1. Añadimos el Salario Real (Línea sólida verde)
-        fig5.add_trace(
-            go.Scatter(
-                x=df_real_salary["anio"],
-                y=df_real_salary["salario_real"],
-                mode="lines+markers",
-                name="Salario Real (Poder Adquisitivo)",
-                line=dict(color="green", width=3),
+@metricas.etapa("fase3")
+def generate_plotly_charts(datasets=None, dashboard=False, procesos=None):
+    """
+    Función principal de visualización.
+    Recibe los datasets de la Fase 2 en memoria ({nombre: DataFrame}) o,
+    si no se pasan, los lee de sus Parquet, y genera gráficos interactivos en HTML.
+    Con 'dashboard', en lugar de un HTML autónomo por gráfico genera el cuadro
+    de mando de analysis/dashboard.py: una página con pestañas que comparten
+    una única copia de plotly.js.
+    Con 'procesos' cada gráfico se renderiza en un pool de hasta ese número
+    de procesos (como mucho uno por núcleo). Devuelve {fichero: (error o None, segundos)} de cada gráfico.
+    """
+    print("\nIniciando generación de gráficos con Plotly.")
+    inicio = time.perf_counter()
+    resultados = {}
+    informe = {}
+    if not dashboard:
+        # Se crea aquí y no al importar el módulo: importarlo no toca el disco
+        os.makedirs(graphics_dir, exist_ok=True)
+
+    # Más procesos que núcleos (o que gráficos) solo añade arranques
+    procesos = min(procesos or 1, len(GRAFICOS), os.cpu_count() or 1)
+    if procesos > 1:
+        # 'spawn' porque Polars usa hilos y hacer fork de un proceso con
+        # hilos puede dejar bloqueado al hijo
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            futuros = {
+                pool.submit(renderizar_grafico, indice, datasets, dashboard): indice
+                for indice in sorted(range(len(GRAFICOS)), key=lambda i: GRAFICOS[i][0] not in PESADOS)
+            }
+            for futuro in as_completed(futuros):
+                indice = futuros[futuro]
+                try:
+                    resultado, error, segundos, cpu = futuro.result()
+                except Exception as e:
+                    # El proceso del gráfico ha muerto (p. ej. sin memoria)
+                    resultado, error, segundos, cpu = None, f"{type(e).__name__}: {e}", 0.0, None
+                resultados[indice] = resultado
+                informe[GRAFICOS[indice][0]] = (error, segundos)
+                metricas.registrar(
+                    f"fase3.grafico.{GRAFICOS[indice][0]}", segundos, cpu, estado="error" if error else None
+                )
+    else:
+        for indice in range(len(GRAFICOS)):
+            resultado, error, segundos, cpu = renderizar_grafico(indice, datasets, dashboard)
+            resultados[indice] = resultado
+            informe[GRAFICOS[indice][0]] = (error, segundos)
+            metricas.registrar(
+                f"fase3.grafico.{GRAFICOS[indice][0]}", segundos, cpu, estado="error" if error else None
             )
-        )
 
-        # 2. Añadimos el Salario Nominal (Línea punteada roja)
-        # El atributo 'fill=tonexty' rellena el hueco hasta la línea verde que pintamos antes
-        fig5.add_trace(
-            go.Scatter(
-                x=df_real_salary["anio"],
-                y=df_real_salary["salario_nominal"],
-                mode="lines+markers",
-                name="Salario Nominal (Euros Brutos en Nómina)",
-                line=dict(color="red", width=3, dash="dot"),
-                fill="tonexty",
-                fillcolor="rgba(255, 0, 0, 0.15)",  # Sombreado rojo translúcido
+    print()
+    for fichero, _, _ in GRAFICOS:
+        error, segundos = informe[fichero]
+        if error:
+            print(f"  {fichero}: ERROR ({error})")
+        else:
+            print(f"  {fichero}: {segundos:.2f} s")
+
+    if dashboard:
+        figuras = [
+            (fichero, titulo, resultados[indice])
+            for indice, (fichero, titulo, _) in enumerate(GRAFICOS)
+            if resultados[indice] is not None
+        ]
+        try:
+            with metricas.etapa("fase3.dashboard"):
+                tamanos = construir_dashboard(figuras)
+            metricas.sumar("fase3.dashboard", bytes_escritos=sum(tamanos.values()))
+            print(
+                f"\nCuadro de mando generado en '{DASHBOARD_DIR}' "
+                f"({len(tamanos)} ficheros, {sum(tamanos.values()) / 1024:.0f} KB en total)"
             )
-        )
-
-        # 3. Configuración visual
-        fig5.update_layout(
-            title="Ilusión Monetaria: Salario Nominal vs Salario Real (Base IPC 2021=100)",
-            xaxis_title="Año",
-            yaxis_title="Euros (€)",
-            hovermode="x unified",  # Al pasar el ratón, compara los dos valores del año de golpe
-        )
-
-        fig5.write_html(os.path.join(data_dir, "graphics", "5_salario_nominal_vs_real.html"))
-
-        # -------------------------------------------------------------------
-        # GRÁFICO 6: Calidad del Empleo (Área Apilada)
-        # -------------------------------------------------------------------
-        print("7/8 Generando gráfico de área de Temporalidad.")
-        df_job_quality = pl.read_csv(os.path.join(csv_dir, "Calidad_Empleo.csv"))
-
-        fig6 = px.area(
-            df_job_quality,
-            x="anio",
-            y=[
-                "Indefinido (%)",
-                "Temporal (%)",
-            ],  # El orden importa: Indefinido abajo, Temporal arriba
-            title="Calidad del Empleo en España: Contratos Indefinidos vs Temporales",
-            labels={
-                "value": "Porcentaje sobre el total de Asalariados (%)",
-                "anio": "Año",
-                "variable": "Tipo de Contrato",
-            },
-            color_discrete_map={"Indefinido (%)": "#2ca02c", "Temporal (%)": "#d62728"},
-        )
-
-        # Configuramos el eje Y para que siempre vaya de 0 a 100 exactos
-        fig6.update_layout(yaxis=dict(range=[0, 100]), hovermode="x unified")
-
-        fig6.write_html(os.path.join(data_dir, "graphics", "6_calidad_empleo.html"))
-
-        # -------------------------------------------------------------------
-        # GRÁFICO 7: Desigualdad Salarial (Distribución de Riqueza)
-        # -------------------------------------------------------------------
-        print("8/8 Dibujando pirámide de desigualdad salarial...")
-        df_inequality = pl.read_csv(os.path.join(csv_dir, "Desigualdad_Salarial.csv"))
-
-        fig7 = px.line(
-            df_inequality,
-            x="anio",
-            y="salario",
-            color="indicador",
-            markers=True,
-            title="Desigualdad Salarial en España: Evolución por Tramos de Ingresos",
-            labels={
-                "salario": "Salario Anual Bruto (€)",
-                "anio": "Año",
-                "indicador": "Tramo Salarial",
-            },
-            # Asignamos colores jerárquicos: Azul (Media, la más alta), Verde (Mediana), Naranja (Cuartil), Rojo (Pobres)
-            color_discrete_map={
-                "Salario_Anual_Media": "#1f77b4",
-                "Salario_Anual_Mediana": "#2ca02c",
-                "Salario_Anual_Cuartil inferior": "#ff7f0e",
-                "Salario_Anual_Percentil 10": "#d62728",
-            },
-        )
-
-        # Añadimos interactividad unificada para ver todos los sueldos a la vez al pasar el ratón
-        fig7.update_layout(hovermode="x unified")
-
-        fig7.write_html(os.path.join(data_dir, "graphics", "7_desigualdad_salarial.html"))
-
-        # -------------------------------------------------------------------
-        # GRÁFICO 8: Evolución del Paro por CCAA (Gráfico Facetado)
-        # -------------------------------------------------------------------
-        print("Extra: Generando panel facetado (Subplots) de desempleo...")
-        fig8 = px.line(
-            df_unemployment_salaries,
-            x="anio",
-            y="tasa_paro_media",
-            facet_col="comunidad",
-            facet_col_wrap=4,
-            title="Evolución de la Tasa de Paro por CCAA (Gráfico Facetado)",
-            labels={"tasa_paro_media": "Paro (%)", "anio": ""},
-        )
-
-        # Quitamos la etiqueta redundante de "comunidad=" en cada sub-título
-        fig8.for_each_annotation(lambda a: a.update(text=a.text.split("=")[-1]))
-
-        fig8.write_html(os.path.join(data_dir, "graphics", "8_paro_facetado.html"))
-
+        except Exception as e:
+            print(f"\nError al generar el cuadro de mando: {e}")
+    else:
         print("\nGráficos generado en la carpeta data_output")
-    except Exception as e:
-        print(f"\nError al generar las visualizaciones: {e}")
+
+    fallidos = sum(1 for error, _ in informe.values() if error)
+    if fallidos:
+        print(f"Error al generar {fallidos} de {len(GRAFICOS)} visualizaciones.")
+    print(f"Fase 3 completada en {time.perf_counter() - inicio:.2f} s")
+    return informe
 
 
 if __name__ == "__main__":
-    generate_plotly_charts()
+    generate_plotly_charts(
+        dashboard="--dashboard" in sys.argv,
+        procesos=os.cpu_count() if "--paralelo" in sys.argv else None,
+    )
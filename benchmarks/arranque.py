@@ -0,0 +1,132 @@
+# arranque.py
+# Presupuesto de arranque de main.py
+#
+# Las actualizaciones programadas (cron) arrancan el proyecto muchas veces
+# para hacer poco trabajo, así que el arranque tiene que ser barato:
+#   - importar main debe caber en PRESUPUESTO_S y no cargar ninguna de las
+#     dependencias pesadas de las fases (MODULOS_PESADOS); cada fase las
+#     importa al ejecutarse
+#   - importar cualquier módulo del proyecto no debe crear ni modificar
+#     ficheros (los directorios de salida se crean al escribir en ellos)
+#
+# Cada comprobación se hace en un intérprete nuevo sobre una copia temporal
+# del proyecto, para no aprovechar módulos ya cargados ni tocar el repositorio.
+#
+# Uso: python -m benchmarks.arranque   (termina con código 1 si algo falla)
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from benchmarks.ejecutar import CODIGO
+from src.db import amarillo, reset, rojo, turquesa
+
+PRESUPUESTO_S = 0.2  # Importar main, sin contar el arranque del intérprete
+REPETICIONES = 5
+MODULOS_PESADOS = ["requests", "polars", "pyarrow", "numpy", "pandas", "plotly", "statsmodels"]
+# Módulos que no deben tocar el disco al importarse (los de entrada de cada fase)
+MODULOS_SIN_EFECTOS = [
+    "main",
+    "src.inedata",
+    "src.almacen_parquet",
+    "analysis.transform",
+    "analysis.visualize",
+    "analysis.dashboard",
+    "analysis.tendencias",
+]
+
+MEDIR_IMPORT = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+print(json.dumps({{
+    "segundos": time.perf_counter() - inicio,
+    "pesados": [m for m in {pesados!r} if m in sys.modules],
+}}))
+"""
+
+
+def _importar(directorio, modulo):
+    """Importa 'modulo' en un intérprete nuevo y devuelve lo que ha tardado y cargado"""
+    salida = subprocess.run(
+        [sys.executable, "-c", MEDIR_IMPORT.format(modulo=modulo, pesados=MODULOS_PESADOS)],
+        cwd=directorio, capture_output=True, text=True, check=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def _ficheros(directorio):
+    """{ruta relativa: (tamaño, fecha de modificación) o "carpeta"} sin contar los __pycache__"""
+    ficheros = {}
+    for raiz, carpetas, nombres in os.walk(directorio):
+        carpetas[:] = [c for c in carpetas if c != "__pycache__"]
+        ficheros[os.path.relpath(raiz, directorio)] = "carpeta"
+        for nombre in nombres:
+            ruta = os.path.join(raiz, nombre)
+            estado = os.stat(ruta)
+            ficheros[os.path.relpath(ruta, directorio)] = (estado.st_size, estado.st_mtime_ns)
+    return ficheros
+
+
+def comprobar_arranque(presupuesto=PRESUPUESTO_S, repeticiones=REPETICIONES):
+    """
+    Comprueba el presupuesto de arranque. Devuelve la lista de problemas
+    encontrados (vacía si todo está bien).
+    """
+    problemas = []
+    with tempfile.TemporaryDirectory(prefix="arranque_ine_") as directorio:
+        for elemento in CODIGO:
+            origen = os.path.join(project_root, elemento)
+            destino = os.path.join(directorio, elemento)
+            if os.path.isdir(origen):
+                shutil.copytree(origen, destino, ignore=shutil.ignore_patterns("__pycache__", "*.jsonl"))
+            else:
+                shutil.copy2(origen, destino)
+
+        # 1. Sin efectos en disco al importar
+        for modulo in MODULOS_SIN_EFECTOS:
+            antes = _ficheros(directorio)
+            _importar(directorio, modulo)
+            despues = _ficheros(directorio)
+            cambios = sorted(ruta for ruta in antes.keys() | despues.keys() if antes.get(ruta) != despues.get(ruta))
+            if cambios:
+                problemas.append(f"importar {modulo} modifica {', '.join(cambios)}")
+
+        # 2. Tiempo y dependencias de importar main (mediana de varias medidas,
+        #    ya con los .pyc compilados por el paso anterior)
+        medidas = [_importar(directorio, "main") for _ in range(repeticiones)]
+
+    segundos = statistics.median(medida["segundos"] for medida in medidas)
+    pesados = sorted({m for medida in medidas for m in medida["pesados"]})
+    print(
+        f"{turquesa}Importar main:{reset} {amarillo}{segundos * 1000:.1f} ms{reset} "
+        f"(presupuesto {presupuesto * 1000:.0f} ms, mediana de {repeticiones})"
+    )
+    if segundos > presupuesto:
+        problemas.append(f"importar main tarda {segundos:.3f} s (presupuesto {presupuesto} s)")
+    if pesados:
+        problemas.append(f"importar main carga {', '.join(pesados)}")
+    return problemas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comprueba el presupuesto de arranque de main.py")
+    parser.add_argument("--presupuesto", type=float, default=PRESUPUESTO_S, help="segundos para importar main")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    args = parser.parse_args()
+
+    problemas = comprobar_arranque(args.presupuesto, args.repeticiones)
+    for problema in problemas:
+        print(f"{rojo}{problema}{reset}")
+    if problemas:
+        sys.exit(1)
+    print("Arranque dentro del presupuesto y sin efectos en disco.")
@@ -0,0 +1,212 @@
+# ejecutar.py
+# Banco de pruebas de rendimiento de las fases 1 a 3 con datos sintéticos
+#
+# Para cada escala (series x periodos) se generan las siete tablas con
+# benchmarks/sinteticos.py y se miden, en un proceso aparte:
+#   procesar_datos, insertar_datos, exportar_almacen (Fase 1),
+#   process_data_polars (Fase 2) y generate_plotly_charts (Fase 3)
+# con su tiempo, filas por segundo y pico de memoria (RSS) del proceso.
+#
+# Cada escala se ejecuta en una copia temporal del proyecto: la base de
+# datos, el almacén Parquet, las cachés y data_output del repositorio no se
+# tocan y ninguna ejecución se aprovecha de las cachés de la anterior.
+# Los resultados se añaden como una línea JSON por escala a
+# benchmarks/resultados.jsonl para poder comparar ejecuciones en el tiempo.
+#
+# Uso: python -m benchmarks.ejecutar --escalas 1x1 10x1 1x10
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from src.metricas import rss_pico_mb
+
+RESULTADOS = os.path.join(current_dir, "resultados.jsonl")
+ESCALAS = ["1x1", "10x1", "1x10"]
+# Lo que se copia del proyecto para cada ejecución
+CODIGO = ["main.py", "config", "src", "analysis", "benchmarks"]
+
+
+class Etapas:
+    """Acumula tiempo y filas de cada etapa (una etapa puede medirse varias veces)"""
+
+    def __init__(self):
+        self.etapas = {}
+
+    @contextlib.contextmanager
+    def medir(self, nombre):
+        registro = self.etapas.setdefault(nombre, {"segundos": 0.0, "filas": 0})
+        inicio = time.perf_counter()
+        # La salida de cada fase no interesa aquí
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield registro
+        registro["segundos"] += time.perf_counter() - inicio
+        registro["rss_pico_mb"] = rss_pico_mb()
+
+    def resumen(self):
+        for registro in self.etapas.values():
+            segundos = registro["segundos"]
+            registro["segundos"] = round(segundos, 4)
+            registro["filas_por_segundo"] = round(registro["filas"] / segundos) if segundos else None
+        return self.etapas
+
+
+def medir_escala(escala_series, escala_periodos, semilla=0):
+    """
+    Ejecuta las tres fases sobre datos sintéticos en el directorio actual.
+    Debe llamarse desde una copia desechable del proyecto (ver ejecutar_escala).
+    """
+    from benchmarks.sinteticos import generar_tablas
+    from main import tabla_destino
+    from src.db import DatabaseConnection, crear_base_datos, unidad_de_trabajo
+    from src.procesar import procesar_datos, iniciar_cache_dimensiones
+    from src.almacenar import insertar_datos
+    from src.almacen_parquet import exportar_almacen
+    from analysis.transform import process_data_polars
+    from analysis.visualize import generate_plotly_charts
+
+    etapas = Etapas()
+
+    with etapas.medir("generar") as registro:
+        tablas = generar_tablas(escala_series, escala_periodos, semilla)
+        registro["filas"] = sum(len(serie["Data"]) for series in tablas.values() for serie in series)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        crear_base_datos()
+        iniciar_cache_dimensiones()
+
+    # Fase 1: procesado y carga de cada tabla, como cargar_tabla en main.py
+    for codigo, series in tablas.items():
+        with contextlib.redirect_stdout(io.StringIO()), unidad_de_trabajo():
+            with etapas.medir("procesar_datos") as registro:
+                filas = procesar_datos(codigo, series)
+                registro["filas"] += len(filas)
+            with etapas.medir("insertar_datos") as registro:
+                informe = insertar_datos(tabla_destino(codigo), filas)
+                registro["filas"] += informe["insertadas"]
+
+    with etapas.medir("exportar_almacen") as registro:
+        registro["filas"] = exportar_almacen()
+
+    # Fase 2 (desde cero: la copia no tiene estado ni caché de análisis)
+    with DatabaseConnection().lectura() as conn:
+        filas_hechos = sum(
+            conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+            for tabla in ["T_precios", "T_salarios", "T_empleo"]
+        )
+    with etapas.medir("process_data_polars") as registro:
+        datasets = process_data_polars()
+        registro["filas"] = filas_hechos
+    if datasets is None:
+        raise RuntimeError("La Fase 2 ha fallado")
+
+    # Fase 3 con los datasets en memoria, como en el pipeline completo
+    with etapas.medir("generate_plotly_charts") as registro:
+        informe = generate_plotly_charts(datasets)
+        registro["filas"] = sum(df.height for df in datasets.values())
+        registro["errores"] = sum(1 for error, _ in informe.values() if error)
+
+    DatabaseConnection().close()
+    return {
+        "escala_series": escala_series,
+        "escala_periodos": escala_periodos,
+        "semilla": semilla,
+        "etapas": etapas.resumen(),
+        "rss_pico_mb": rss_pico_mb(),
+    }
+
+
+def _commit():
+    try:
+        salida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+            capture_output=True, text=True, check=True,
+        )
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar_escala(escala_series, escala_periodos, semilla=0):
+    """Mide una escala en un proceso nuevo sobre una copia temporal del proyecto"""
+    with tempfile.TemporaryDirectory(prefix="bench_ine_") as directorio:
+        for elemento in CODIGO:
+            origen = os.path.join(project_root, elemento)
+            destino = os.path.join(directorio, elemento)
+            if os.path.isdir(origen):
+                shutil.copytree(origen, destino, ignore=shutil.ignore_patterns("__pycache__", "*.jsonl"))
+            else:
+                shutil.copy2(origen, destino)
+
+        resultado = os.path.join(directorio, "resultado.json")
+        subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.ejecutar",
+                "--medir", f"{escala_series}x{escala_periodos}",
+                "--semilla", str(semilla), "--resultado", resultado,
+            ],
+            cwd=directorio, check=True,
+        )
+        with open(resultado, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def ejecutar(escalas=ESCALAS, semilla=0, salida=RESULTADOS):
+    """Mide cada escala ('SERIESxPERIODOS') y añade los resultados a 'salida'"""
+    comun = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "nucleos": os.cpu_count(),
+    }
+    resultados = []
+    for escala in escalas:
+        escala_series, escala_periodos = (int(valor) for valor in escala.lower().split("x"))
+        print(f"\nEscala {escala_series}x series, {escala_periodos}x periodos...")
+        resultado = {**comun, **ejecutar_escala(escala_series, escala_periodos, semilla)}
+        resultados.append(resultado)
+
+        with open(salida, "a", encoding="utf-8") as f:
+            f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+
+        for nombre, etapa in resultado["etapas"].items():
+            velocidad = etapa["filas_por_segundo"]
+            print(
+                f"  {nombre:<24}{etapa['segundos']:>10.3f} s{etapa['filas']:>12} filas"
+                f"{velocidad if velocidad is not None else '-':>12} filas/s"
+                f"{etapa['rss_pico_mb'] if etapa['rss_pico_mb'] is not None else '-':>10} MB"
+            )
+    print(f"\nResultados añadidos a {salida}")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento con datos sintéticos del INE")
+    parser.add_argument("--escalas", nargs="+", default=ESCALAS, help="escalas SERIESxPERIODOS, p. ej. 1x1 10x1 100x1")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", default=RESULTADOS)
+    # Uso interno: medir una escala dentro de la copia temporal
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    parser.add_argument("--resultado", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        escala_series, escala_periodos = (int(valor) for valor in args.medir.lower().split("x"))
+        with open(args.resultado, "w", encoding="utf-8") as f:
+            json.dump(medir_escala(escala_series, escala_periodos, args.semilla), f)
+    else:
+        ejecutar(args.escalas, args.semilla, args.salida)
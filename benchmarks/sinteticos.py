@@ -0,0 +1,158 @@
+# sinteticos.py
+# Generador de respuestas sintéticas de la API del INE (DATOS_TABLA)
+#
+# Produce, para las siete tablas del proyecto, listas de series con la misma
+# forma que devuelve servicios.ine.es: {"Nombre": "...", "Data": [{"Anyo",
+# "FK_Periodo", "Valor"}, ...]}. Los nombres siguen el formato real de cada
+# tabla (incluidas las series que procesar.py descarta, como las variaciones
+# mensuales o la jornada parcial), así que recorren los mismos caminos que
+# los datos de verdad.
+#
+# El tamaño se controla con dos escalas independientes:
+#   - escala_series:   multiplica las geografías (y con ellas las series)
+#   - escala_periodos: multiplica los años de cada serie
+#
+# Uso: python -m benchmarks.sinteticos --series 10 --periodos 10 --salida carpeta/
+
+import argparse
+import json
+import os
+import random
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from config.constantes import (
+    IPC,
+    IPV,
+    TASA_PARO,
+    TEMPORALIDAD,
+    EAES_OCUPACION,
+    EAES_PERCENTILES,
+    ETCL,
+)
+
+GEOGRAFIAS = [
+    "Total Nacional", "Andalucía", "Aragón", "Asturias, Principado de", "Balears, Illes",
+    "Canarias", "Cantabria", "Castilla y León", "Castilla - La Mancha", "Cataluña",
+    "Comunitat Valenciana", "Extremadura", "Galicia", "Madrid, Comunidad de",
+    "Murcia, Región de", "Navarra, Comunidad Foral de", "País Vasco", "Rioja, La",
+]
+ULTIMO_ANIO = 2023
+ANIOS_BASE = 16  # 2008-2023, como las tablas reales
+
+MESES = list(range(1, 13))
+TRIMESTRES = [19, 20, 21, 22]
+ANUAL = [28]
+
+CATEGORIAS_IPC = [
+    "Índice general", "01 Alimentos y bebidas no alcohólicas", "04 Vivienda, agua, electricidad, gas y otros combustibles",
+    "07 Transporte",
+]
+TIPOS_IPC = ["Índice", "Variación mensual", "Variación anual", "Variación en lo que va de año"]
+SECTORES_ETCL = ["Industria", "Construcción", "Servicios", "Industria, construcción y servicios (excepto actividades de los hogares)"]
+ESTADISTICOS_EAES = ["Media", "10", "25", "50", "75", "90"]
+OCUPACIONES = [
+    "Total", "A Directores y gerentes", "B Técnicos y profesionales científicos e intelectuales de la salud y la enseñanza",
+    "E Empleados de oficina que no atienden al público", "G Trabajadores de los servicios de restauración y comercio",
+    "P Peones de la agricultura, pesca, construcción, industrias manufactureras y transportes",
+]
+EDADES = ["Todas las edades", "De 16 a 19 años", "De 20 a 24 años", "De 25 a 54 años", "55 y más años"]
+CONTRATOS = ["Total asalariados", "Asalariados con contrato indefinido", "Asalariados con contrato temporal"]
+JORNADAS = ["Total", "Jornada a tiempo completo", "Jornada a tiempo parcial"]
+
+
+def geografias(escala_series):
+    """Las 18 reales y, a partir de la escala 2, otras inventadas con el mismo formato"""
+    total = len(GEOGRAFIAS) * escala_series
+    extra = [f"Comunidad sintética {i}" for i in range(1, total - len(GEOGRAFIAS) + 1)]
+    return GEOGRAFIAS + extra
+
+
+def _serie(rng, nombre, anios, periodos, base, ruido):
+    """Serie con una tendencia suave y ruido (paseo aleatorio alrededor de 'base')"""
+    valor = base
+    datos = []
+    for anio in anios:
+        for fk in periodos:
+            valor = max(0.0, valor * (1 + rng.gauss(0.005, ruido)))
+            datos.append({"Anyo": anio, "FK_Periodo": fk, "Valor": round(valor, 2)})
+    return {"Nombre": nombre, "Data": datos}
+
+
+def generar_tabla(codigo, escala_series=1, escala_periodos=1, semilla=0):
+    """Lista de series de la tabla del INE 'codigo' a la escala indicada"""
+    rng = random.Random(f"{codigo}-{semilla}")
+    geos = geografias(escala_series)
+    anios = range(ULTIMO_ANIO - ANIOS_BASE * escala_periodos + 1, ULTIMO_ANIO + 1)
+
+    if codigo == IPC:
+        return [
+            _serie(rng, f"{g}. {c}. {t}.", anios, MESES, 100, 0.004)
+            for g in geos for c in CATEGORIAS_IPC for t in TIPOS_IPC
+        ]
+    if codigo == IPV:
+        return [
+            _serie(rng, f"{g}. {c}. {t}.", anios, TRIMESTRES, 100, 0.01)
+            for g in geos for c in ["General", "Vivienda nueva", "Vivienda segunda mano"]
+            for t in ["Índice", "Variación trimestral", "Variación anual"]
+        ]
+    if codigo == ETCL:
+        return [
+            _serie(rng, f"{g}. {s}. {c}. Costes laborales. Euros.", anios, TRIMESTRES, 1900, 0.01)
+            for g in geos for s in SECTORES_ETCL
+            for c in ["Coste laboral total", "Coste salarial total", "Otros costes"]
+        ]
+    if codigo == EAES_PERCENTILES:
+        return [
+            _serie(rng, f"{s}. {g}. Dato base. {e}.", anios, ANUAL, 24000, 0.02)
+            for g in geos for s in ["Total", "Hombres", "Mujeres"] for e in ESTADISTICOS_EAES
+        ]
+    if codigo == EAES_OCUPACION:
+        return [
+            _serie(rng, f"{o}. {s}. Salario medio bruto. {g}. Dato base.", anios, ANUAL, 22000, 0.02)
+            for g in geos for s in ["Total", "Hombres", "Mujeres"] for o in OCUPACIONES
+        ]
+    if codigo == TASA_PARO:
+        return [
+            _serie(rng, f"Tasa de paro de la población. {s}. {g}. {e}.", anios, TRIMESTRES, 15, 0.03)
+            for g in geos for s in ["Ambos sexos", "Hombres", "Mujeres"] for e in EDADES
+        ]
+    if codigo == TEMPORALIDAD:
+        return [
+            _serie(rng, f"{g}. Asalariados. {s}. {c}. {j}. Personas.", anios, TRIMESTRES, 800, 0.01)
+            for g in geos for s in ["Ambos sexos", "Hombres", "Mujeres"] for c in CONTRATOS for j in JORNADAS
+        ]
+    raise ValueError(f"Tabla del INE desconocida: {codigo}")
+
+
+def generar_tablas(escala_series=1, escala_periodos=1, semilla=0):
+    """{código INE: lista de series} de las siete tablas del proyecto"""
+    return {
+        codigo: generar_tabla(codigo, escala_series, escala_periodos, semilla)
+        for codigo in [IPC, IPV, ETCL, EAES_PERCENTILES, EAES_OCUPACION, TASA_PARO, TEMPORALIDAD]
+    }
+
+
+def guardar_tablas(tablas, directorio):
+    """Escribe cada tabla como <código>.json, igual que la respuesta de la API"""
+    os.makedirs(directorio, exist_ok=True)
+    for codigo, series in tablas.items():
+        with open(os.path.join(directorio, f"{codigo}.json"), "w", encoding="utf-8") as f:
+            json.dump(series, f, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera respuestas sintéticas de la API del INE")
+    parser.add_argument("--series", type=int, default=1, help="escala del número de series")
+    parser.add_argument("--periodos", type=int, default=1, help="escala del número de periodos")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", default="sinteticos_ine")
+    args = parser.parse_args()
+
+    tablas = generar_tablas(args.series, args.periodos, args.semilla)
+    guardar_tablas(tablas, args.salida)
+    for codigo, series in tablas.items():
+        print(f"{codigo}: {len(series)} series, {sum(len(s['Data']) for s in series)} datos")
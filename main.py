@@ -1,5 +1,11 @@
+import argparse
 import sys
 
+# Aquí solo se importa lo ligero (biblioteca estándar y SQLite). Las
+# dependencias pesadas de cada fase (requests, Polars, Plotly, NumPy) se
+# importan al ejecutarla, para que arrancar el menú o una opción suelta no
+# las cargue todas. benchmarks/arranque.py vigila que siga siendo así.
+
 # --- Imports de la Fase 1 (API -> SQLite) ---
 from config.constantes import (
     IPC,
@@ -10,53 +16,239 @@ from config.constantes import (
     EAES_PERCENTILES,
     ETCL,
 )
-from src.inedata import INEDataExtractor
-from src.procesar import procesar_datos
+from src.cache import CacheINE
+from src.incremental import calcular_nult, registrar_carga_completa
+from src.procesar import procesar_datos, iniciar_cache_dimensiones, procesar_tablas_en_paralelo
 from src.almacenar import insertar_datos
-from src.db import DatabaseConnection, crear_base_datos
+from src.pipeline import ejecutar_pipeline
+from src.db import DatabaseConnection, crear_base_datos, unidad_de_trabajo, rojo, reset
+from src.indices import crear_indices, actualizar_estadisticas
+from src import metricas
 
-# --- Imports de la Fase 2 y 3 (Polars y Plotly) ---
-from analysis.transform import process_data_polars
-from analysis.visualize import generate_plotly_charts
 
-def etl_fase1_extraccion():
+def tabla_destino(codigo):
+    """Tabla de hechos a la que van los datos de cada tabla del INE"""
+    if codigo in [IPC, IPV]:
+        return "T_precios"
+    elif codigo in [ETCL, EAES_OCUPACION, EAES_PERCENTILES]:
+        return "T_salarios"
+    elif codigo in [TASA_PARO, TEMPORALIDAD]:
+        return "T_empleo"
+    return ""
 
-    crear_base_datos()
 
-    tablas = [IPC, IPV, TASA_PARO, TEMPORALIDAD, EAES_OCUPACION, EAES_PERCENTILES, ETCL]
-    for codigo in tablas:
-        extractor = INEDataExtractor(codigo)
-        if extractor.obtener_datos():
-            datos_procesados = procesar_datos(codigo, extractor.raw_data)
-            
+def cargar_tabla(codigo, raw_data=None, carga_completa=True, series=None, motor="python"):
+    """
+    Procesa e inserta una tabla del INE dentro de una única unidad de trabajo
+    (dimensiones + hechos); los hechos de todas sus series se insertan de una vez.
+    Si ya viene procesada (pool de procesos) se pasan directamente sus 'series'.
+    'motor' es el de procesar_datos ("python" o "polars").
+    Si algo falla se revierte la tabla entera y se informa del error, sin
+    detener la carga de las demás. Devuelve si la tabla se ha cargado.
+    """
+    destino = tabla_destino(codigo)
+    etapa = f"fase1.tabla.{codigo}"
+    try:
+        with metricas.etapa(etapa), unidad_de_trabajo():
+            if series is None:
+                with metricas.etapa(f"{etapa}.procesar"):
+                    series = procesar_datos(codigo, raw_data, por_serie=True, motor=motor)
+
             print("Procesando datos de tabla (Mostrando la primera fila)", codigo)
-            print(datos_procesados[0])
+            if series:
+                print(series[0][0])
 
-            print("Número de filas a insertar", len(datos_procesados))
+            print("Número de filas a insertar", sum(len(filas) for filas in series))
+            metricas.sumar(etapa, filas_procesadas=sum(len(filas) for filas in series))
 
-            tabla_destino = ""
+            # Llamamos a almacenar pasándole el nombre
+            if destino and series:
+                with metricas.etapa(f"{etapa}.insertar"):
+                    # Todas las series de la tabla pasan por un único staging y una única fusión
+                    totales = insertar_datos(destino, [fila for filas in series for fila in filas])
+                print(
+                    f"[{codigo}] {destino}: {totales['insertadas']} insertadas, "
+                    f"{totales['omitidas']} omitidas (duplicadas), {totales['rechazadas']} rechazadas"
+                )
+                metricas.sumar(etapa, **{f"filas_{clave}": cantidad for clave, cantidad in totales.items()})
+                if carga_completa:
+                    registrar_carga_completa(codigo)
+    except Exception as e:
+        # La transacción se ha revertido: la caché de dimensiones ya no es fiable
+        iniciar_cache_dimensiones()
+        print(f"{rojo}[{codigo}] Error al cargar la tabla, cambios revertidos: {e}{reset}")
+        metricas.sumar(etapa, errores=1)
+        return False
+    return True
 
-            if codigo in [IPC, IPV]:
-                tabla_destino = "T_precios"
-            elif codigo in [ETCL, EAES_OCUPACION, EAES_PERCENTILES]:
-                tabla_destino = "T_salarios"
-            elif codigo in [TASA_PARO, TEMPORALIDAD]:
-                tabla_destino = "T_empleo"
 
-            # Llamamos a almacenar pasándole el nombre
-            if tabla_destino and datos_procesados:
-                insertar_datos(tabla_destino, datos_procesados)
-                pass
-            # ---------------------------------------------------------
-        else:
-            print(f"No se pudieron obtener los datos de la tabla {codigo}")
+@metricas.etapa("fase1")
+def etl_fase1_extraccion(paralelo=True, streaming=False, usar_cache=True, offline=False, incremental=False, procesos=None, pipeline=False, motor="python"):
+    """
+    Fase 1: descarga las tablas del INE y las carga en SQLite.
+    'motor' elige cómo se procesa cada tabla: serie a serie ("python")
+    o de forma columnar con Polars ("polars"); las filas son las mismas.
+    Una tabla que no se puede cargar no detiene a las demás; devuelve la
+    lista de las que han fallado.
+    """
+    # requests (descarga) y Polars (almacén Parquet)
+    from src.inedata import INEDataExtractor, extraer_tablas
+    from src.almacen_parquet import sincronizar_almacen
+
+    fallidas = []
+    # Perfil de escritura masiva (WAL, sin fsync por transacción, caché grande)
+    # solo durante la carga: al terminar se vuelve al perfil que había
+    with DatabaseConnection().perfil("bulk-load"):
+        try:
+            crear_base_datos()
+            crear_indices()
+            # Dimensiones precargadas en memoria para no consultar SQLite por cada dato
+            iniciar_cache_dimensiones()
+
+            # Caché en disco: evita volver a descargar tablas que el INE no ha cambiado
+            cache = CacheINE(offline=offline) if (usar_cache or offline) else None
+
+            tablas = [IPC, IPV, TASA_PARO, TEMPORALIDAD, EAES_OCUPACION, EAES_PERCENTILES, ETCL]
+
+            # En modo streaming cada tabla se decodifica mientras se procesa,
+            # así que ni la descarga ni el procesamiento pueden ir en paralelo
+            # (en la tubería se decodifica en la etapa de procesamiento)
+            paralelo = paralelo and not streaming
+            procesos = None if streaming else procesos
+            # En modo tubería la extracción es una etapa más que se solapa con el resto
+            paralelo = paralelo and not pipeline
+
+            # Modo incremental: solo pedimos los periodos posteriores al último cargado
+            # (None = historia completa, por ser la primera carga o por calendario)
+            nult_por_tabla = {}
+            if incremental:
+                nult_por_tabla = {codigo: calcular_nult(codigo) for codigo in tablas}
+                for codigo, nult in nult_por_tabla.items():
+                    modo = "completa" if nult is None else f"últimos {nult} periodos"
+                    print(f"[{codigo}] Extracción incremental: {modo}")
+
+            if paralelo:
+                # Descargamos todas las tablas a la vez con una sesión HTTP compartida
+                extractores = extraer_tablas(tablas, cache=cache, nult_por_tabla=nult_por_tabla)
+            else:
+                extractores = {
+                    codigo: INEDataExtractor(codigo, cache=cache, nult=nult_por_tabla.get(codigo))
+                    for codigo in tablas
+                }
+
+            def cargar(codigo, **argumentos):
+                # Una tabla que falla se anota y se sigue con las demás
+                if not cargar_tabla(codigo, motor=motor, **argumentos):
+                    fallidas.append(codigo)
+
+            if pipeline:
+                # Extracción, procesamiento y carga solapadas con colas acotadas
+                ejecutar_pipeline(
+                    extractores,
+                    lambda codigo, series, extractor: cargar(
+                        codigo, series=series, carga_completa=extractor.nult is None
+                    ),
+                    motor=motor,
+                    streaming=streaming,
+                )
+            elif procesos:
+                # Procesamiento en un pool de procesos; este proceso es el único
+                # que escribe en SQLite, según van llegando las tablas procesadas
+                descargadas = {}
+                for codigo in tablas:
+                    extractor = extractores[codigo]
+                    descargado = extractor.raw_data is not None if paralelo else extractor.obtener_datos()
+                    if descargado:
+                        descargadas[codigo] = extractor.raw_data
+                    else:
+                        print(f"No se pudieron obtener los datos de la tabla {codigo}")
+
+                for codigo, series in procesar_tablas_en_paralelo(descargadas, procesos, motor=motor):
+                    cargar(codigo, series=series, carga_completa=extractores[codigo].nult is None)
+            else:
+                for codigo in tablas:
+                    extractor = extractores[codigo]
+                    # En modo secuencial la descarga se hace aquí, tabla a tabla
+                    descargado = extractor.raw_data is not None if paralelo else extractor.obtener_datos(streaming=streaming)
+                    if descargado:
+                        cargar(codigo, raw_data=extractor.raw_data, carga_completa=extractor.nult is None)
+                    else:
+                        print(f"No se pudieron obtener los datos de la tabla {codigo}")
+
+            # Estadísticas frescas para que las consultas de la Fase 2 usen los índices
+            with metricas.etapa("fase1.estadisticas"):
+                actualizar_estadisticas()
+            # La Fase 2 lee del almacén Parquet: reescribimos los indicadores cargados
+            with metricas.etapa("fase1.almacen"):
+                sincronizar_almacen(tablas)
+        finally:
+            # También si algo falla: se cierra la conexión y se libera la BD
+            DatabaseConnection().close()
+    return fallidas
 
-    DatabaseConnection().close()
 
-def menu():
+def etl_fase2_transformacion(**opciones):
+    """Fase 2 con Polars; devuelve los datasets para pasárselos a la Fase 3"""
+    from analysis.transform import process_data_polars
+    # Perfil de lecturas grandes mientras dura la fase
+    with DatabaseConnection().perfil("analytics"):
+        return process_data_polars(**opciones)
+
+
+def etl_fase3_visualizacion(datasets=None, **opciones):
+    """Fase 3 con Plotly, a partir de los datasets en memoria o de sus Parquet"""
+    from analysis.visualize import generate_plotly_charts
+    return generate_plotly_charts(datasets, **opciones)
+
+
+def pipeline_completo(fase1=None, fase3=None):
+    """
+    Las tres fases seguidas; se detiene en la primera que falle (las tablas
+    de la Fase 1 que no se cargan no la detienen, pero sí el mensaje de éxito).
+    'fase1' y 'fase3' son las opciones de etl_fase1_extraccion y de
+    etl_fase3_visualizacion.
+    """
+    print("\nINICIANDO PIPELINE COMPLETO...")
+    fallidas = etl_fase1_extraccion(**(fase1 or {}))
+    # Los datasets pasan en memoria a la Fase 3 (sin releerlos de disco)
+    datasets = etl_fase2_transformacion()
+    if datasets is None:
+        raise RuntimeError("la Fase 2 no ha generado los datasets")
+    informe = etl_fase3_visualizacion(datasets, **(fase3 or {}))
+    fallidos = [fichero for fichero, (error, _) in informe.items() if error]
+    if fallidos:
+        raise RuntimeError(f"no se han podido generar los gráficos {', '.join(fallidos)}")
+    if fallidas:
+        # Las fases 2 y 3 se han hecho con los datos que sí se cargaron
+        print(f"\n{rojo}Pipeline completo terminado sin las tablas {', '.join(map(str, fallidas))}.{reset}")
+        return
+    print("\n¡PIPELINE COMPLETO FINALIZADO CON ÉXITO!")
+
+
+def ejecutar_opcion(descripcion, funcion):
+    """
+    Ejecuta una opción del menú como una ejecución con su propio informe en
+    informes/. Un error detiene la opción, pero no el menú.
+    Devuelve si ha terminado sin errores.
+    """
+    metricas.iniciar(descripcion)
+    try:
+        funcion()
+        return True
+    except Exception as e:
+        print(f"\n{rojo}{descripcion}: detenida por un error: {e}{reset}")
+        return False
+    finally:
+        metricas.guardar_informe(mostrar_resumen=True)
+
+
+def menu(fase1=None, fase3=None):
     """
     Menú interactivo de terminal para orquestar todo el pipeline de datos.
+    'fase1' y 'fase3' son las opciones con las que se ejecutan esas fases.
     """
+    fase1 = fase1 or {}
+    fase3 = fase3 or {}
     while True:
         print("\n" + "="*50)
         print(" PANEL DE CONTROL - PROYECTO DATOS INE")
@@ -71,20 +263,16 @@ def menu():
         opcion = input("Elige una opción (1-5): ")
         
         if opcion == '1':
-            etl_fase1_extraccion()
+            ejecutar_opcion("Fase 1", lambda: etl_fase1_extraccion(**fase1))
         
         elif opcion == '2':
-            process_data_polars()
+            ejecutar_opcion("Fase 2", etl_fase2_transformacion)
             
         elif opcion == '3':
-            generate_plotly_charts()
+            ejecutar_opcion("Fase 3", lambda: etl_fase3_visualizacion(**fase3))
             
         elif opcion == '4':
-            print("\nINICIANDO PIPELINE COMPLETO...")
-            etl_fase1_extraccion()
-            process_data_polars()
-            generate_plotly_charts()
-            print("\n¡PIPELINE COMPLETO FINALIZADO CON ÉXITO!")
+            ejecutar_opcion("Pipeline completo", lambda: pipeline_completo(fase1, fase3))
             
         elif opcion == '5':
             print("\n¡Hasta pronto!")
@@ -94,5 +282,87 @@ def menu():
             print("\nOpción no válida. Inténtalo de nuevo.")
 
 
+FASES = {
+    "fase1": "Fase 1",
+    "fase2": "Fase 2",
+    "fase3": "Fase 3",
+    "todo": "Pipeline completo",
+}
+
+
+def argumentos(argv=None):
+    """Opciones de la línea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Pipeline de datos del INE. Sin fase, abre el menú interactivo "
+        "(que usa también las opciones indicadas)."
+    )
+    parser.add_argument("fase", nargs="?", choices=list(FASES), help="fase a ejecutar sin pasar por el menú")
+    parser.add_argument(
+        "--motor", choices=["python", "polars"], default="python",
+        help="Fase 1: procesamiento serie a serie o columnar con Polars",
+    )
+    parser.add_argument(
+        "--procesos", type=int, metavar="N",
+        help="Fase 1: procesa las tablas en un pool de N procesos (un único proceso escribe en SQLite). "
+        "Fase 3: renderiza los gráficos en un pool de hasta N procesos (como mucho uno por núcleo)",
+    )
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="Fase 1: solapa descarga, procesamiento y carga con colas acotadas",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Fase 1: pide al INE solo los periodos posteriores al último cargado",
+    )
+    parser.add_argument(
+        "--streaming", action="store_true",
+        help="Fase 1: decodifica cada tabla por bloques mientras se procesa (menos memoria, sin paralelismo)",
+    )
+    parser.add_argument(
+        "--offline", action="store_true",
+        help="Fase 1: usa solo las tablas de la caché en disco, sin llamar a la API del INE",
+    )
+    parser.add_argument(
+        "--sin-cache", action="store_true",
+        help="Fase 1: descarga siempre las tablas completas, sin usar ni actualizar la caché en disco",
+    )
+    parser.add_argument(
+        "--dashboard", action="store_true",
+        help="Fase 3: genera el cuadro de mando con pestañas en lugar de un HTML por gráfico",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Ejecuta la fase indicada o, si no se indica ninguna, abre el menú"""
+    args = argumentos(argv)
+    fase1 = {
+        "motor": args.motor,
+        "procesos": args.procesos,
+        "pipeline": args.pipeline,
+        "incremental": args.incremental,
+        "streaming": args.streaming,
+        "offline": args.offline,
+        "usar_cache": not args.sin_cache,
+    }
+    fase3 = {"dashboard": args.dashboard, "procesos": args.procesos}
+
+    if args.fase is None:
+        menu(fase1, fase3)
+        return
+
+    funciones = {
+        "fase1": lambda: etl_fase1_extraccion(**fase1),
+        "fase2": etl_fase2_transformacion,
+        "fase3": lambda: etl_fase3_visualizacion(**fase3),
+        "todo": lambda: pipeline_completo(fase1, fase3),
+    }
+    # Código de salida 1 si la fase falla (para las ejecuciones programadas),
+    # también si solo han fallado algunas tablas de la Fase 1
+    terminada = ejecutar_opcion(FASES[args.fase], funciones[args.fase])
+    if not terminada or metricas.informe()["totales"].get("errores"):
+        sys.exit(1)
+
+
 if __name__ == "__main__":
-    menu()
\ No newline at end of file
+    main()
\ No newline at end of file
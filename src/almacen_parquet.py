@@ -0,0 +1,215 @@
+"""
+Almacén columnar de hechos para la Fase 2.
+Las tres tablas de hechos se exportan ya desnormalizadas (con los nombres
+de indicador, comunidad y periodo) a Parquet particionado al estilo Hive:
+
+    almacen_parquet/<bloque>/indicador=<nombre>/anio=<anio>/datos.parquet
+
+analysis/transform.py lo lee con scan_parquet, que solo abre las
+particiones de los indicadores que filtra y no toca SQLite.
+Tras cada carga de la Fase 1 se reescriben solo los indicadores afectados.
+Cada fila guarda además el rowid de su tabla de hechos ('_fila'), que las
+medias incrementales de analysis/agregados.py usan como marca de agua.
+"""
+import os
+import shutil
+from urllib.parse import quote
+
+import polars as pl
+
+from src.db import DatabaseConnection, turquesa, amarillo, reset
+from src.incremental import TABLAS_INCREMENTALES
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+ALMACEN_DIR = os.path.join(project_root, "almacen_parquet")
+
+# Bloque del almacén -> (tabla de hechos, consulta desnormalizada, esquema)
+# La tabla de hechos va siempre con el alias 'f' para poder filtrar sobre ella.
+# Los nombres de columna coinciden con los de las consultas maestras de la
+# Fase 2. El esquema es fijo para que todas las particiones sean compatibles
+# aunque alguna tenga una columna entera a NULL.
+BLOQUES = {
+    "salarios": (
+        "T_salarios",
+        """
+        SELECT f.valor as salario, g.nombre as comunidad, p.anio, p.mes, p.trimestre,
+               i.nombre as indicador, f.sexo, f.sector_cnae, f.ocupacion_cno11 as ocupacion
+        FROM T_salarios f
+        JOIN tbl_geografia g ON f.id_geografia = g.id_geografia
+        JOIN tbl_periodo p ON f.id_periodo = p.id_periodo
+        JOIN tbl_indicador i ON f.id_indicador = i.id_indicador
+        """,
+        {
+            "salario": pl.Float64, "comunidad": pl.String, "anio": pl.Int64,
+            "mes": pl.Int64, "trimestre": pl.Int64, "indicador": pl.String,
+            "sexo": pl.String, "sector_cnae": pl.String, "ocupacion": pl.String,
+        },
+    ),
+    "precios": (
+        "T_precios",
+        """
+        SELECT f.valor as precio, g.nombre as comunidad, p.anio, p.mes, p.trimestre,
+               i.nombre as indicador, f.categoria_gasto
+        FROM T_precios f
+        JOIN tbl_geografia g ON f.id_geografia = g.id_geografia
+        JOIN tbl_periodo p ON f.id_periodo = p.id_periodo
+        JOIN tbl_indicador i ON f.id_indicador = i.id_indicador
+        """,
+        {
+            "precio": pl.Float64, "comunidad": pl.String, "anio": pl.Int64,
+            "mes": pl.Int64, "trimestre": pl.Int64, "indicador": pl.String,
+            "categoria_gasto": pl.String,
+        },
+    ),
+    "empleo": (
+        "T_empleo",
+        """
+        SELECT f.valor as valor_empleo, g.nombre as comunidad, p.anio, p.mes, p.trimestre,
+               i.nombre as indicador, f.sexo, f.grupo_edad, f.tipo_jornada, f.tipo_contrato
+        FROM T_empleo f
+        JOIN tbl_geografia g ON f.id_geografia = g.id_geografia
+        JOIN tbl_periodo p ON f.id_periodo = p.id_periodo
+        JOIN tbl_indicador i ON f.id_indicador = i.id_indicador
+        """,
+        {
+            "valor_empleo": pl.Float64, "comunidad": pl.String, "anio": pl.Int64,
+            "mes": pl.Int64, "trimestre": pl.Int64, "indicador": pl.String,
+            "sexo": pl.String, "grupo_edad": pl.String, "tipo_jornada": pl.String,
+            "tipo_contrato": pl.String,
+        },
+    ),
+}
+
+
+def consulta_bloque(bloque, condicion, con_fila=False):
+    """
+    Consulta desnormalizada de un bloque con la condición WHERE dada.
+    'con_fila' añade el rowid de la tabla de hechos como columna '_fila'.
+    """
+    _, consulta, _ = BLOQUES[bloque]
+    if con_fila:
+        consulta = consulta.replace("SELECT", "SELECT f.rowid AS _fila,", 1)
+    return f"{consulta}    WHERE {condicion}\n"
+
+
+def ruta_bloque(bloque, directorio=ALMACEN_DIR):
+    return os.path.join(directorio, bloque)
+
+
+def existe_almacen(directorio=ALMACEN_DIR):
+    """True si están los tres bloques (si no, la Fase 2 lee de SQLite)"""
+    return all(os.path.isdir(ruta_bloque(bloque, directorio)) for bloque in BLOQUES)
+
+
+def _ruta_indicador(raiz, indicador):
+    # Los nombres de indicador llevan espacios; Polars decodifica el %-encoding
+    return os.path.join(raiz, f"indicador={quote(indicador, safe='')}")
+
+
+def _indicadores_en_bd(tabla, conn):
+    cursor = conn.execute(
+        f"SELECT DISTINCT i.nombre FROM {tabla} f "
+        "JOIN tbl_indicador i ON f.id_indicador = i.id_indicador"
+    )
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def _exportar_indicador(bloque, indicador, conn, directorio):
+    """Reescribe todas las particiones de un indicador. Devuelve las filas exportadas"""
+    _, _, esquema = BLOQUES[bloque]
+    esquema = {"_fila": pl.Int64, **esquema}
+    df = pl.read_database(
+        consulta_bloque(bloque, "i.nombre = ?", con_fila=True),
+        connection=conn,
+        execute_options={"parameters": [indicador]},
+        schema_overrides=esquema,
+    ).select(pl.col(columna).cast(tipo) for columna, tipo in esquema.items())
+
+    destino = _ruta_indicador(ruta_bloque(bloque, directorio), indicador)
+    # Las particiones nuevas se escriben aparte y luego se mueven a su sitio,
+    # para que un lector nunca vea un indicador a medio escribir
+    temporal = _ruta_indicador(os.path.join(directorio, ".tmp", bloque), indicador)
+    shutil.rmtree(temporal, ignore_errors=True)
+
+    # Las columnas de partición van en la ruta, no dentro del fichero
+    for (anio,), particion in df.partition_by("anio", as_dict=True).items():
+        ruta = os.path.join(temporal, f"anio={anio}")
+        os.makedirs(ruta, exist_ok=True)
+        particion.drop("indicador", "anio").write_parquet(os.path.join(ruta, "datos.parquet"))
+
+    shutil.rmtree(destino, ignore_errors=True)
+    if not df.is_empty():
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(temporal, destino)
+    return df.height
+
+
+def exportar_almacen(indicadores_por_tabla=None, directorio=ALMACEN_DIR):
+    """
+    Exporta las tablas de hechos al almacén Parquet.
+    'indicadores_por_tabla' es {tabla de hechos: [indicadores]} para
+    reescribir solo esos; None exporta todos los de todas las tablas.
+    Lee con una conexión de solo lectura, así que no bloquea al escritor.
+    """
+    total = 0
+    with DatabaseConnection().lectura() as conn:
+        for bloque, (tabla, _, _) in BLOQUES.items():
+            if indicadores_por_tabla is None:
+                indicadores = _indicadores_en_bd(tabla, conn)
+                # En una exportación completa sobran los indicadores que ya no están en la BD
+                shutil.rmtree(ruta_bloque(bloque, directorio), ignore_errors=True)
+            else:
+                indicadores = indicadores_por_tabla.get(tabla, [])
+            os.makedirs(ruta_bloque(bloque, directorio), exist_ok=True)
+
+            for indicador in indicadores:
+                total += _exportar_indicador(bloque, indicador, conn, directorio)
+
+    shutil.rmtree(os.path.join(directorio, ".tmp"), ignore_errors=True)
+    print(f"{turquesa}Almacén Parquet actualizado:{reset} {amarillo}{total}{reset}{turquesa} filas exportadas.{reset}")
+    return total
+
+
+def sincronizar_almacen(codigos, directorio=ALMACEN_DIR):
+    """
+    Pone al día el almacén tras cargar las tablas del INE 'codigos'.
+    La primera vez (o si falta algún bloque) lo exporta entero.
+    """
+    if not existe_almacen(directorio):
+        return exportar_almacen(directorio=directorio)
+
+    indicadores_por_tabla = {}
+    for codigo in codigos:
+        tabla, indicadores, _ = TABLAS_INCREMENTALES[codigo]
+        indicadores_por_tabla.setdefault(tabla, []).extend(indicadores)
+    return exportar_almacen(indicadores_por_tabla, directorio)
+
+
+def escanear_bloque(bloque, indicadores=None, directorio=ALMACEN_DIR, con_fila=False):
+    """
+    LazyFrame de un bloque del almacén. Filtrar por 'indicador' (o 'anio')
+    poda particiones: los ficheros de los demás indicadores ni se abren.
+    'con_fila' añade la columna '_fila' (rowid en la tabla de hechos).
+    """
+    _, _, esquema = BLOQUES[bloque]
+    if con_fila:
+        esquema = {"_fila": pl.Int64, **esquema}
+    ruta = ruta_bloque(bloque, directorio)
+    if not any(os.scandir(ruta)):
+        # Bloque sin datos: scan_parquet no admite un directorio vacío
+        return pl.LazyFrame(schema=esquema)
+
+    lf = pl.scan_parquet(
+        os.path.join(ruta, "**", "*.parquet"),
+        hive_partitioning=True,
+        hive_schema={"indicador": pl.String, "anio": pl.Int64},
+    )
+    if indicadores is not None:
+        lf = lf.filter(pl.col("indicador").is_in(indicadores))
+    return lf.select(list(esquema))
+
+
+if __name__ == "__main__":
+    exportar_almacen()
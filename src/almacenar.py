@@ -3,50 +3,95 @@ Recibe los datos procesados de procesar.py y los inserta en la BD
 """
 import sqlite3
 
-from src.db import get_cursor
+from src.db import get_cursor, en_unidad_de_trabajo
+
+# COLUMNAS DE CADA TABLA DE HECHOS
+# 'clave' son las columnas del UNIQUE (sin el valor) y 'obligatorias' las NOT NULL.
+TABLAS_HECHOS = {
+    "T_precios": {
+        "columnas": ["id_periodo", "id_indicador", "id_geografia", "categoria_gasto", "valor"],
+        "clave": ["id_periodo", "id_indicador", "id_geografia", "categoria_gasto"],
+        "obligatorias": ["id_periodo", "id_indicador", "id_geografia", "categoria_gasto", "valor"],
+    },
+    "T_salarios": {
+        "columnas": ["id_periodo", "id_indicador", "id_geografia", "sexo", "sector_cnae", "ocupacion_cno11", "valor"],
+        "clave": ["id_periodo", "id_indicador", "id_geografia", "sexo", "sector_cnae", "ocupacion_cno11"],
+        "obligatorias": ["id_periodo", "id_indicador", "id_geografia", "valor"],
+    },
+    "T_empleo": {
+        "columnas": ["id_periodo", "id_indicador", "id_geografia", "sexo", "grupo_edad", "tipo_jornada", "tipo_contrato", "valor"],
+        "clave": ["id_periodo", "id_indicador", "id_geografia", "sexo", "grupo_edad", "tipo_jornada", "tipo_contrato"],
+        "obligatorias": ["id_periodo", "id_indicador", "id_geografia", "sexo", "valor"],
+    },
+}
+
 
 def insertar_datos( tabla, datos):
-    
+    """
+    Carga masiva a través de una tabla temporal de staging sin índices:
+    1. Las filas se vuelcan al staging con executemany (sin comprobar UNIQUE).
+    2. Un único INSERT ... SELECT las fusiona en la tabla de hechos,
+       descartando inválidas (NOT NULL) y duplicados, ya existan en la tabla
+       o se repitan dentro del propio lote.
+    Devuelve {'insertadas', 'omitidas', 'rechazadas'}.
+    """
+    informe = {"insertadas": 0, "omitidas": 0, "rechazadas": 0}
+
     if not datos:
         print(f"No existen datos para insertar en la tabla: {tabla}.")
-        return
-
-    
-    sql = ""
-
-    
-    # CONSULTAS SQL SEGUN LA TABLA DE DESTINO:
-    if tabla == "T_precios":
-        sql = """
-        INSERT OR IGNORE INTO T_precios 
-        (id_periodo, id_indicador, id_geografia, categoria_gasto, valor) 
-        VALUES (?, ?, ?, ?, ?)
-        """
-        #Ignore para evitar valores duplicados 
-
-    elif tabla == "T_salarios":
-        sql = """
-        INSERT OR IGNORE INTO T_salarios 
-        (id_periodo, id_indicador, id_geografia, sexo, sector_cnae, ocupacion_cno11, valor) 
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """
-
-    elif tabla == "T_empleo":
-        sql = """
-        INSERT OR IGNORE INTO T_empleo 
-        (id_periodo, id_indicador, id_geografia, sexo, grupo_edad, tipo_jornada, tipo_contrato, valor) 
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """
-
-    else:
+        return informe
+
+    if tabla not in TABLAS_HECHOS:
         print(f"La tabla '{tabla}' no existe")
-        return
+        return informe
+
+    definicion = TABLAS_HECHOS[tabla]
+    columnas = ", ".join(definicion["columnas"])
+    staging = f"stg_{tabla}"
 
+    validas = " AND ".join(f"{col} IS NOT NULL" for col in definicion["obligatorias"])
+    clave = ", ".join(definicion["clave"])
+    # 'IS' compara NULL como igual, así que un NULL en la clave también cuenta como duplicado
+    misma_clave = " AND ".join(f"t.{col} IS s.{col}" for col in definicion["clave"])
 
+    sql_merge = f"""
+        INSERT INTO {tabla} ({columnas})
+        SELECT {", ".join(f"s.{col}" for col in definicion["columnas"])}
+        FROM {staging} s
+        WHERE s.rowid IN (
+            -- Primera aparición de cada clave dentro del lote
+            SELECT MIN(rowid) FROM {staging} WHERE {validas} GROUP BY {clave}
+        )
+        AND NOT EXISTS (SELECT 1 FROM {tabla} t WHERE {misma_clave})
+        -- Insertar en orden de clave hace que el índice UNIQUE crezca de forma secuencial
+        ORDER BY {", ".join(f"s.{col}" for col in definicion["clave"])}
+    """
 
-# INSERCIÓN MASIVA DE DATOS 
+# INSERCIÓN MASIVA DE DATOS
     with get_cursor() as cursor:
         try:
-            cursor.executemany(sql, datos)
+            cursor.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS {staging} AS SELECT {columnas} FROM {tabla} WHERE 0"
+            )
+            cursor.execute(f"DELETE FROM {staging}")
+            cursor.executemany(
+                f"INSERT INTO {staging} ({columnas}) VALUES ({', '.join('?' for _ in definicion['columnas'])})",
+                datos,
+            )
+
+            cursor.execute(f"SELECT COUNT(*) FROM {staging} WHERE NOT ({validas})")
+            informe["rechazadas"] = cursor.fetchone()[0]
+
+            cursor.execute(sql_merge)
+            informe["insertadas"] = cursor.rowcount
+            informe["omitidas"] = len(datos) - informe["insertadas"] - informe["rechazadas"]
+
+            cursor.execute(f"DELETE FROM {staging}")
         except sqlite3.Error as e:
             print(f"Se ha producido un error al insertar datos en la tabla {tabla}: {e}")
+            # Dentro de una unidad de trabajo propagamos el error para que
+            # se revierta la unidad (o el savepoint que envuelva la llamada)
+            if en_unidad_de_trabajo():
+                raise
+
+    return informe
@@ -0,0 +1,121 @@
+"""
+Caché en disco de las respuestas de la API del INE.
+Guarda el cuerpo comprimido (gzip) de cada tabla junto con sus cabeceras
+de validación (ETag / Last-Modified) para poder revalidarlo con peticiones
+condicionales en lugar de descargar la tabla completa en cada ejecución.
+"""
+import gzip
+import json
+import os
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+CACHE_DIR = os.path.join(project_root, "cache_ine")
+CACHE_TTL = 6 * 60 * 60  # Segundos durante los que una copia se usa sin preguntar al INE
+
+
+class CacheINE:
+    def __init__(self, directorio=CACHE_DIR, ttl=CACHE_TTL, offline=False):
+        self.directorio = directorio
+        self.ttl = ttl
+        self.offline = offline  # Solo lee de la caché, nunca llama a la API
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def ruta(self, codigo):
+        """Ruta del cuerpo comprimido de la tabla"""
+        return os.path.join(self.directorio, f"{codigo}.json.gz")
+
+    def _ruta_meta(self, codigo):
+        return os.path.join(self.directorio, f"{codigo}.meta.json")
+
+    def existe(self, codigo):
+        return os.path.exists(self.ruta(codigo))
+
+    def leer_meta(self, codigo):
+        try:
+            with open(self._ruta_meta(codigo), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _escribir_meta(self, codigo, meta):
+        ruta_tmp = self._ruta_meta(codigo) + ".tmp"
+        with open(ruta_tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(ruta_tmp, self._ruta_meta(codigo))
+
+    def es_fresco(self, codigo):
+        """True si la copia en disco está dentro del TTL"""
+        meta = self.leer_meta(codigo)
+        validada = meta.get("validada")
+        return (
+            self.existe(codigo)
+            and validada is not None
+            and time.time() - validada < self.ttl
+        )
+
+    def cabeceras_condicionales(self, codigo):
+        """Cabeceras If-None-Match / If-Modified-Since para revalidar"""
+        if not self.existe(codigo):
+            return {}
+        meta = self.leer_meta(codigo)
+        cabeceras = {}
+        if meta.get("etag"):
+            cabeceras["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            cabeceras["If-Modified-Since"] = meta["last_modified"]
+        return cabeceras
+
+    def renovar(self, codigo):
+        """El servidor ha respondido 304: la copia sigue siendo válida"""
+        meta = self.leer_meta(codigo)
+        meta["validada"] = time.time()
+        self._escribir_meta(codigo, meta)
+
+    def guardar(self, codigo, respuesta, tam_bloque=64 * 1024):
+        """
+        Vuelca el cuerpo de la respuesta a disco comprimido, bloque a bloque,
+        y guarda sus validadores. Devuelve los bytes descargados.
+        """
+        ruta_tmp = self.ruta(codigo) + ".tmp"
+        descargados = 0
+        try:
+            with gzip.open(ruta_tmp, "wb") as f:
+                for bloque in respuesta.iter_content(chunk_size=tam_bloque):
+                    f.write(bloque)
+                    descargados += len(bloque)
+            os.replace(ruta_tmp, self.ruta(codigo))
+        except BaseException:
+            # Descarga cortada o disco lleno: no se deja el fichero a medias
+            if os.path.exists(ruta_tmp):
+                os.remove(ruta_tmp)
+            raise
+        finally:
+            respuesta.close()
+
+        self._escribir_meta(
+            codigo,
+            {
+                "etag": respuesta.headers.get("ETag"),
+                "last_modified": respuesta.headers.get("Last-Modified"),
+                "validada": time.time(),
+                "bytes": descargados,
+            },
+        )
+        return descargados
+
+    def bloques(self, codigo, tam_bloque=64 * 1024):
+        """Lee el cuerpo descomprimido de la caché por bloques"""
+        with gzip.open(self.ruta(codigo), "rb") as f:
+            while True:
+                bloque = f.read(tam_bloque)
+                if not bloque:
+                    return
+                yield bloque
+
+    def cargar(self, codigo):
+        """Decodifica la tabla completa desde la caché"""
+        with gzip.open(self.ruta(codigo), "rt", encoding="utf-8") as f:
+            return json.load(f)
@@ -7,20 +7,91 @@ turquesa = '\033[38;5;44m'
 reset = '\033[0m'
 
 import sqlite3
+import threading
+from collections import deque
 from contextlib import contextmanager
+from pathlib import Path
 
 DB_NAME = 'proyecto_datos.db'
 
+# PERFILES DE RENDIMIENTO DE SQLITE
+# Cada fase del pipeline tiene necesidades distintas:
+# * bulk-load: cargas masivas de la Fase 1. Prima la velocidad de escritura.
+# * analytics: lecturas grandes de la Fase 2 (Polars). Mucha caché y mmap.
+# * safe: máxima durabilidad, para cuando se prefiere seguridad a velocidad.
+PERFILES = {
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,   # KiB negativos = 256 MB
+        "mmap_size": 268435456,  # 256 MB
+        "temp_store": "MEMORY",
+    },
+    "analytics": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -131072,    # 128 MB
+        "mmap_size": 1073741824,  # 1 GB
+        "temp_store": "MEMORY",
+    },
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+}
+PERFIL_POR_DEFECTO = "safe"
+# page_size es una propiedad del fichero, no de la conexión: solo se aplica
+# al crear la BD (o tras un VACUUM fuera de WAL), así que es común a todos los perfiles.
+PAGE_SIZE = 8192
+
+# POOL DE CONEXIONES
+# Una única conexión de escritura (SQLite solo admite un escritor a la vez)
+# protegida por un cerrojo, y hasta MAX_LECTORES conexiones de solo lectura
+# (mode=ro + query_only). Con WAL los lectores no bloquean al escritor ni al revés.
+MAX_LECTORES = 4
+ESPERA_LECTOR = 30  # Segundos esperando a que quede libre una conexión de lectura
+BUSY_TIMEOUT = 30   # Segundos que SQLite reintenta antes de dar "database is locked"
+# Los lectores solo toman del perfil los pragmas propios de la conexión
+PERFIL_LECTURA = "analytics"
+PRAGMAS_LECTURA = ("cache_size", "mmap_size", "temp_store")
+_HUECO = object()  # Turno que autoriza a abrir una conexión de lectura nueva
+
+
+def _esta_sana(conn):
+    """Comprobación de salud: la conexión sigue abierta y responde"""
+    try:
+        conn.execute("SELECT 1").fetchone()
+        return True
+    except sqlite3.Error:
+        return False
+
+
 class DatabaseConnection:
     _instance = None
+    _lock_instancia = threading.Lock()
     _connection = None
+    _unidad_activa = None  # UnidadDeTrabajo en curso, si la hay
+    _perfil = PERFIL_POR_DEFECTO
 
     def __new__(cls):
         """Implementa el patrón Singleton (asegura que solo se cree una instancia)"""
-        if cls._instance is None:
-            cls._instance = super(DatabaseConnection, cls).__new__(cls)
-            # Inicializar la conexion la primera vez que se llama a la instancia
-            cls._instance.connect()
+        with cls._lock_instancia:
+            if cls._instance is None:
+                instancia = super(DatabaseConnection, cls).__new__(cls)
+                # Quien tenga este cerrojo es el dueño de la conexión de escritura
+                instancia._lock_escritor = threading.RLock()
+                instancia._lock_lectores = threading.Lock()
+                instancia._lectores_libres = []    # (conexion, generacion) sin prestar
+                instancia._esperando = deque()     # Hilos esperando lector, en orden de llegada
+                instancia._lectores_abiertos = 0
+                instancia._generacion = 0  # Cambia en cada close() para descartar lectores viejos
+                instancia._hilo = threading.local()
+                # Inicializar la conexion la primera vez que se llama a la instancia
+                instancia.connect()
+                cls._instance = instancia
 
         return cls._instance
     
@@ -28,22 +99,172 @@ class DatabaseConnection:
         """Establece la conexion a la base de datos"""
         if self._connection is None:
             try:
-                self._connection = sqlite3.connect(DB_NAME)
+                # check_same_thread=False: la conexión puede pasar de un hilo a
+                # otro, pero solo la usa quien tiene el cerrojo de escritura
+                self._connection = sqlite3.connect(
+                    DB_NAME, timeout=BUSY_TIMEOUT, check_same_thread=False
+                )
+                self._connection.execute(f"PRAGMA page_size = {PAGE_SIZE}")
+                self._aplicar_pragmas(self._perfil)
             except sqlite3.Error as e:
                 print(f"Error al conectar a la BD: {e}")
                 self._connection = None
 
+    def _aplicar_pragmas(self, perfil):
+        for pragma, valor in PERFILES[perfil].items():
+            self._connection.execute(f"PRAGMA {pragma} = {valor}")
+
+    def aplicar_perfil(self, perfil):
+        """
+        Cambia el perfil de rendimiento ('bulk-load', 'analytics', 'safe')
+        de la conexión de escritura. Se mantiene en futuras reconexiones.
+        """
+        if perfil not in PERFILES:
+            raise ValueError(f"Perfil '{perfil}' no existe. Opciones: {list(PERFILES)}")
+        with self._lock_escritor:
+            self._perfil = perfil
+            # Sin conexión abierta basta con recordarlo: se aplica al conectar
+            conn = self._connection
+            if conn is not None:
+                if conn.in_transaction:
+                    # journal_mode no puede cambiarse dentro de una transacción
+                    conn.commit()
+                self._aplicar_pragmas(perfil)
+        print(f"{turquesa}Perfil de SQLite:{reset} {amarillo}{perfil}{reset}")
+
+    @contextmanager
+    def perfil(self, perfil):
+        """Aplica un perfil durante el bloque y al salir vuelve al que había"""
+        anterior = self._perfil
+        self.aplicar_perfil(perfil)
+        try:
+            yield
+        finally:
+            self.aplicar_perfil(anterior)
+
     def get_connection(self):
-        """Devuelve el objeto de conexion"""
+        """Devuelve la conexión de escritura (reconectando si se ha caído)"""
+        if self._connection is not None and not _esta_sana(self._connection):
+            print(f"{rojo}Conexión de escritura caída, reconectando.{reset}")
+            self._connection = None
         if self._connection is None:
             self.connect()
         return self._connection
-    
+
+    @contextmanager
+    def escritura(self):
+        """Conexión de escritura en exclusiva para el hilo actual"""
+        with self._lock_escritor:
+            yield self.get_connection()
+
+    def _abrir_lector(self):
+        uri = f"{Path(DB_NAME).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        for pragma in PRAGMAS_LECTURA:
+            conn.execute(f"PRAGMA {pragma} = {PERFILES[PERFIL_LECTURA][pragma]}")
+        return conn
+
+    def _tomar_lector(self):
+        """
+        Saca una conexión de lectura sana del pool, abre una si hay hueco o
+        espera su turno. Las esperas se atienden por orden de llegada para
+        que un hilo que devuelve y vuelve a pedir no deje sin turno al resto.
+        """
+        while True:
+            espera = None
+            with self._lock_lectores:
+                if self._lectores_libres:
+                    turno = self._lectores_libres.pop()
+                elif self._lectores_abiertos < MAX_LECTORES:
+                    self._lectores_abiertos += 1
+                    turno = _HUECO
+                else:
+                    espera = [threading.Event(), None]
+                    self._esperando.append(espera)
+
+            if espera is not None:
+                espera[0].wait(ESPERA_LECTOR)
+                with self._lock_lectores:
+                    turno = espera[1]
+                    if turno is None:
+                        self._esperando.remove(espera)
+                        raise sqlite3.OperationalError(
+                            f"No hay conexiones de lectura libres tras {ESPERA_LECTOR}s"
+                        )
+
+            if turno is _HUECO:
+                try:
+                    return self._abrir_lector(), self._generacion
+                except sqlite3.Error:
+                    self._liberar_hueco()
+                    raise
+
+            conn, generacion = turno
+            if generacion == self._generacion and _esta_sana(conn):
+                return conn, generacion
+            # Conexión caída o de antes de un close(): se descarta
+            conn.close()
+            self._liberar_hueco()
+
+    def _devolver_lector(self, conn, generacion):
+        with self._lock_lectores:
+            if self._esperando:
+                espera = self._esperando.popleft()
+                espera[1] = (conn, generacion)
+                espera[0].set()
+            else:
+                self._lectores_libres.append((conn, generacion))
+
+    def _liberar_hueco(self):
+        """Una conexión de lectura se ha cerrado: su hueco pasa al primero que espera"""
+        with self._lock_lectores:
+            if self._esperando:
+                espera = self._esperando.popleft()
+                espera[1] = _HUECO
+                espera[0].set()
+            else:
+                self._lectores_abiertos -= 1
+
+    @contextmanager
+    def lectura(self):
+        """
+        Presta una conexión de solo lectura al hilo actual. Las llamadas
+        anidadas del mismo hilo reciben la misma conexión; al salir del
+        bloque más externo vuelve al pool.
+        """
+        prestada = getattr(self._hilo, "lector", None)
+        if prestada is not None:
+            yield prestada[0]
+            return
+
+        conn, generacion = self._tomar_lector()
+        self._hilo.lector = (conn, generacion)
+        try:
+            yield conn
+        finally:
+            self._hilo.lector = None
+            if conn.in_transaction:
+                conn.rollback()
+            if generacion == self._generacion:
+                self._devolver_lector(conn, generacion)
+            else:
+                conn.close()
+                self._liberar_hueco()
+
     def close(self):
-        """Cierra la conexion"""
-        if self._connection:
-            self._connection.close()
-            self._connection = None # Resetea oara permitir una nueva conexion si es necesario
+        """Cierra la conexión de escritura y las de lectura libres"""
+        with self._lock_escritor:
+            if self._connection:
+                self._connection.close()
+                self._connection = None # Resetea oara permitir una nueva conexion si es necesario
+        # Las conexiones de lectura prestadas se cerrarán al devolverse
+        with self._lock_lectores:
+            self._generacion += 1
+            libres, self._lectores_libres = self._lectores_libres, []
+        for conn, _ in libres:
+            conn.close()
+            self._liberar_hueco()
     
 
 @contextmanager
@@ -51,18 +272,159 @@ def get_cursor():
     """
     Proporciona un cursor para realizar operaciones de BD, 
     gestionando automáticamente el commit o rollback.
+    Dentro de una unidad de trabajo no hace commit: lo hará la unidad al final.
+    Usa la conexión de escritura, así que los demás hilos esperan a que termine.
     """
-    conn = DatabaseConnection().get_connection()
-    cursor = conn.cursor()
-    try:
-        yield cursor
-        conn.commit()  # Si todo sale bien, guarda los cambios
-    except Exception as e:
-        conn.rollback() # Si hay un error, revierte
-        print(f"Operación de base de datos fallida: {e}")
-        raise
-    
-    
+    db = DatabaseConnection()
+    with db.escritura() as conn:
+        cursor = conn.cursor()
+
+        if db._unidad_activa is not None:
+            # El commit y el rollback los gestiona la unidad de trabajo
+            yield cursor
+            db._unidad_activa.commits_ahorrados += 1
+            return
+
+        try:
+            yield cursor
+            conn.commit()  # Si todo sale bien, guarda los cambios
+        except Exception as e:
+            conn.rollback() # Si hay un error, revierte
+            print(f"Operación de base de datos fallida: {e}")
+            raise
+
+
+@contextmanager
+def get_cursor_lectura():
+    """
+    Cursor sobre una conexión de solo lectura del pool. No bloquea ni es
+    bloqueado por el escritor, así que sirve para consultas concurrentes
+    con una carga (análisis, API...).
+    """
+    with DatabaseConnection().lectura() as conn:
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+
+def en_unidad_de_trabajo():
+    """True si hay una unidad de trabajo abierta"""
+    return DatabaseConnection()._unidad_activa is not None
+
+
+class UnidadDeTrabajo:
+    """
+    Agrupa la recarga completa de una tabla (dimensiones + hechos) en una
+    única transacción. Un bloque puede ir en su propio savepoint para
+    revertirlo por separado si falla en SQLite sin perder el resto.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.commits_ahorrados = 0
+        self.savepoints_revertidos = 0
+        self._contador_savepoints = 0
+
+    @contextmanager
+    def savepoint(self, nombre=None):
+        """
+        Savepoint: si el bloque falla con un error de SQLite, se deshace solo
+        lo hecho dentro de él y la unidad sigue. Cualquier otra excepción se
+        propaga y revierte la unidad entera.
+        """
+        self._contador_savepoints += 1
+        nombre = nombre or f"sp_{self._contador_savepoints}"
+        self.conn.execute(f'SAVEPOINT "{nombre}"')
+        try:
+            yield
+        except sqlite3.Error as e:
+            self.conn.execute(f'ROLLBACK TO "{nombre}"')
+            self.conn.execute(f'RELEASE "{nombre}"')
+            self.savepoints_revertidos += 1
+            print(f"{rojo}Savepoint '{nombre}' revertido: {e}{reset}")
+        else:
+            self.conn.execute(f'RELEASE "{nombre}"')
+
+
+@contextmanager
+def unidad_de_trabajo():
+    """
+    Abre una transacción explícita. Las llamadas a get_cursor() dentro del
+    bloque no hacen commit; al salir se hace un único commit (o rollback si
+    hay una excepción). Informa de los commits que se han ahorrado.
+    """
+    db = DatabaseConnection()
+    # El hilo retiene la conexión de escritura durante toda la unidad
+    with db.escritura() as conn:
+        if db._unidad_activa is not None:
+            # Unidades anidadas: se integran en la exterior
+            yield db._unidad_activa
+            return
+
+        unidad = UnidadDeTrabajo(conn)
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        db._unidad_activa = unidad
+        try:
+            yield unidad
+            conn.commit()
+            # Todos los get_cursor() se resuelven en este único commit
+            unidad.commits_ahorrados = max(unidad.commits_ahorrados - 1, 0)
+            print(f"{turquesa}Unidad de trabajo confirmada: {unidad.commits_ahorrados} commits ahorrados.{reset}")
+        except Exception as e:
+            conn.rollback()
+            print(f"{rojo}Unidad de trabajo revertida: {e}{reset}")
+            raise
+        finally:
+            db._unidad_activa = None
+
+
+def clave_periodo(anio, mes=None, trimestre=None):
+    """
+    Clave determinista de tbl_periodo: anio * 1000 + mes * 10 + frecuencia.
+    Frecuencia: 0 = anual, 1 = mensual, 3 = trimestral.
+    Ej: 2024-03 mensual -> 2024031, T2 2024 -> 2024043, anual 2024 -> 2024000.
+    Es función pura del periodo, así que no hace falta consultar la BD para
+    obtener el id y las claves ordenan cronológicamente.
+    """
+    if mes is None:
+        return anio * 1000
+    frecuencia = 3 if trimestre is not None else 1
+    return anio * 1000 + mes * 10 + frecuencia
+
+
+def migrar_claves_periodo():
+    """
+    Migra bases de datos antiguas (id_periodo autoincremental) al esquema
+    de claves deterministas, actualizando también las tablas de hechos.
+    Si ya está migrada no hace nada.
+    """
+    with get_cursor() as cursor:
+        cursor.execute("SELECT id_periodo, anio, mes, trimestre FROM tbl_periodo")
+        cambios = [
+            (id_periodo, clave_periodo(anio, mes, trimestre))
+            for id_periodo, anio, mes, trimestre in cursor.fetchall()
+            if id_periodo != clave_periodo(anio, mes, trimestre)
+        ]
+        if not cambios:
+            return
+
+        cursor.execute("CREATE TEMP TABLE tmp_migracion_periodo (viejo INTEGER PRIMARY KEY, nuevo INTEGER NOT NULL)")
+        cursor.executemany("INSERT INTO tmp_migracion_periodo (viejo, nuevo) VALUES (?, ?)", cambios)
+
+        for tabla in ("T_precios", "T_salarios", "T_empleo", "tbl_periodo"):
+            cursor.execute(f"""
+                UPDATE {tabla}
+                SET id_periodo = (SELECT nuevo FROM tmp_migracion_periodo WHERE viejo = {tabla}.id_periodo)
+                WHERE id_periodo IN (SELECT viejo FROM tmp_migracion_periodo)
+            """)
+
+        cursor.execute("DROP TABLE tmp_migracion_periodo")
+    print(f"{turquesa}Migradas {len(cambios)} claves de periodo al formato determinista.{reset}")
+
+
 def crear_base_datos():
     with get_cursor() as cursor:
 
@@ -76,9 +438,10 @@ def crear_base_datos():
         # Se eliminó esa estructura porque hacía más difícil combinar datos.
         # Ahora existe un único lookup con flexibilidad para IPC (mensual),
         # IPV (trimestral), ETCL (trimestral) y EES (anual).
+        # El id no es autoincremental: se calcula con clave_periodo().
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS tbl_periodo (
-            id_periodo INTEGER PRIMARY KEY,
+            id_periodo INTEGER PRIMARY KEY, -- anio*1000 + mes*10 + frecuencia
             anio INTEGER NOT NULL,
             trimestre INTEGER, -- NULL si es mensual o anual
             mes INTEGER, -- NULL si es trimestral o anual
@@ -207,4 +570,19 @@ def crear_base_datos():
         """)
         print(f"{turquesa}Tabla{reset}{amarillo} 'T_empleo'{reset}{turquesa} creada o ya existente.{reset}")
         
+        # TABLA DE CONTROL DE CARGAS
+        # Registra cuándo se descargó por última vez la historia completa de
+        # cada tabla del INE. La extracción incremental la usa para decidir
+        # cuándo toca volver a hacer una carga completa.
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tbl_control_carga (
+            codigo_ine INTEGER PRIMARY KEY,
+            ultima_carga_completa TEXT NOT NULL  -- YYYY-MM-DD
+        );
+        """)
+        print(f"{turquesa}Tabla{reset}{amarillo} 'tbl_control_carga'{reset}{turquesa} creada o ya existente.{reset}")
+        
+    # Bases de datos creadas con la versión anterior (ids autoincrementales)
+    migrar_claves_periodo()
+
     print(f"\n{turquesa}Base de Datos lista. Faltan las funciones de precarga.{reset}")
@@ -0,0 +1,114 @@
+"""
+Extracción incremental: calcula cuántos periodos recientes hay que pedir
+al INE (parámetro 'nult') a partir del último periodo ya cargado en la BD.
+"""
+from datetime import date
+
+from config.constantes import (
+    IPC,
+    IPV,
+    ETCL,
+    EAES_OCUPACION,
+    EAES_PERCENTILES,
+    TASA_PARO,
+    TEMPORALIDAD,
+)
+from src.db import get_cursor
+
+# Periodos extra que se vuelven a pedir para recoger revisiones del INE
+MARGEN_REVISIONES = 2
+# Cada cuántos días se fuerza una descarga completa de la historia
+DIAS_CARGA_COMPLETA = 30
+
+# Tabla de hechos, indicadores que genera y meses que abarca cada periodo
+TABLAS_INCREMENTALES = {
+    IPC: ("T_precios", ["IPC_Indice", "IPC_Variacion_Anual"], 1),
+    IPV: ("T_precios", ["IPV_Indice", "IPV_Variacion_Anual"], 3),
+    TASA_PARO: ("T_empleo", ["Tasa_Paro"], 3),
+    TEMPORALIDAD: ("T_empleo", ["Asalariados_Total", "Asalariados_Temporal"], 3),
+    ETCL: ("T_salarios", ["Salario_Coste_Trimestral"], 3),
+    EAES_PERCENTILES: (
+        "T_salarios",
+        [
+            "Salario_Anual_Media",
+            "Salario_Anual_Mediana",
+            "Salario_Anual_Cuartil inferior",
+            "Salario_Anual_Percentil 10",
+        ],
+        12,
+    ),
+    EAES_OCUPACION: ("T_salarios", ["Salario_Anual_Ocupacion"], 12),
+}
+
+
+def consulta_ultimos_periodos(codigo):
+    """SQL y parámetros para el último periodo cargado por indicador"""
+    tabla_hechos, indicadores, _ = TABLAS_INCREMENTALES[codigo]
+    marcadores = ", ".join("?" for _ in indicadores)
+    sql = f"""
+        SELECT i.nombre, MAX(p.anio * 12 + COALESCE(p.mes, 1) - 1)
+        FROM {tabla_hechos} f
+        JOIN tbl_periodo p ON f.id_periodo = p.id_periodo
+        JOIN tbl_indicador i ON f.id_indicador = i.id_indicador
+        WHERE i.nombre IN ({marcadores})
+        GROUP BY i.nombre
+    """
+    return sql, tuple(indicadores)
+
+
+def ultimos_periodos(codigo):
+    """
+    Devuelve {indicador: (anio, mes)} con el último periodo cargado
+    para cada indicador de la tabla del INE.
+    """
+    with get_cursor() as cursor:
+        cursor.execute(*consulta_ultimos_periodos(codigo))
+        return {
+            nombre: (ordinal // 12, ordinal % 12 + 1)
+            for nombre, ordinal in cursor.fetchall()
+        }
+
+
+def toca_carga_completa(codigo, hoy=None):
+    """True si nunca se cargó la tabla completa o la última es demasiado antigua"""
+    hoy = hoy or date.today()
+    with get_cursor() as cursor:
+        cursor.execute(
+            "SELECT ultima_carga_completa FROM tbl_control_carga WHERE codigo_ine = ?",
+            (codigo,),
+        )
+        resultado = cursor.fetchone()
+
+    if not resultado:
+        return True
+    return (hoy - date.fromisoformat(resultado[0])).days >= DIAS_CARGA_COMPLETA
+
+
+def registrar_carga_completa(codigo, hoy=None):
+    hoy = hoy or date.today()
+    with get_cursor() as cursor:
+        cursor.execute(
+            "INSERT OR REPLACE INTO tbl_control_carga (codigo_ine, ultima_carga_completa) VALUES (?, ?)",
+            (codigo, hoy.isoformat()),
+        )
+
+
+def calcular_nult(codigo, hoy=None, margen=MARGEN_REVISIONES):
+    """
+    Número de periodos recientes a pedir al INE para la tabla.
+    Devuelve None cuando hay que descargar la historia completa: tabla no
+    incremental, algún indicador sin datos o carga completa programada.
+    """
+    if codigo not in TABLAS_INCREMENTALES or toca_carga_completa(codigo, hoy):
+        return None
+
+    _, indicadores, meses_periodo = TABLAS_INCREMENTALES[codigo]
+    ultimos = ultimos_periodos(codigo)
+    if any(indicador not in ultimos for indicador in indicadores):
+        return None
+
+    hoy = hoy or date.today()
+    # Partimos del indicador más atrasado para no dejar huecos
+    anio, mes = min(ultimos.values())
+    meses_transcurridos = (hoy.year - anio) * 12 + (hoy.month - mes)
+    return max(meses_transcurridos, 0) // meses_periodo + 1 + margen
@@ -0,0 +1,88 @@
+"""
+Índices secundarios de las tablas de hechos y estadísticas del planificador.
+Los UNIQUE de las tablas de hechos empiezan por id_periodo, así que no sirven
+para los filtros por indicador/geografía que hacen las consultas del pipeline.
+"""
+from src.db import get_cursor, get_cursor_lectura, turquesa, amarillo, reset
+
+# (nombre, tabla, columnas)
+# Todos empiezan por indicador + geografía + periodo y añaden las columnas que
+# leen las consultas maestras de analysis/transform.py para que sean "covering"
+# (la consulta se resuelve desde el índice sin tocar la tabla).
+INDICES = [
+    (
+        "idx_precios_ind_geo_per",
+        "T_precios",
+        ["id_indicador", "id_geografia", "id_periodo", "categoria_gasto", "valor"],
+    ),
+    (
+        "idx_salarios_ind_geo_per",
+        "T_salarios",
+        ["id_indicador", "id_geografia", "id_periodo", "sexo", "ocupacion_cno11", "valor"],
+    ),
+    (
+        "idx_empleo_ind_geo_per",
+        "T_empleo",
+        ["id_indicador", "id_geografia", "id_periodo", "sexo", "grupo_edad", "valor"],
+    ),
+]
+
+
+def crear_indices():
+    """Crea los índices gestionados que falten"""
+    with get_cursor() as cursor:
+        for nombre, tabla, columnas in INDICES:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} ({', '.join(columnas)})"
+            )
+    print(f"{turquesa}Índices de las tablas de hechos creados o ya existentes.{reset}")
+
+
+def actualizar_estadisticas():
+    """ANALYZE tras una carga para que el planificador elija bien los índices"""
+    with get_cursor() as cursor:
+        cursor.execute("ANALYZE")
+    print(f"{turquesa}Estadísticas del planificador actualizadas (ANALYZE).{reset}")
+
+
+def plan_consulta(sql, parametros=()):
+    """Devuelve las líneas de EXPLAIN QUERY PLAN de una consulta"""
+    with get_cursor_lectura() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parametros)
+        return [fila[-1] for fila in cursor.fetchall()]
+
+
+def informe_planes(consultas):
+    """
+    Imprime el plan de cada consulta ({nombre: sql} o {nombre: (sql, parametros)})
+    y avisa de los recorridos completos de tabla (SCAN sin índice).
+    Devuelve {nombre: [lineas del plan]}.
+    """
+    informe = {}
+    for nombre, consulta in consultas.items():
+        sql, parametros = consulta if isinstance(consulta, tuple) else (consulta, ())
+        plan = plan_consulta(sql, parametros)
+        informe[nombre] = plan
+
+        print(f"\n{amarillo}{nombre}{reset}")
+        for linea in plan:
+            aviso = ""
+            if linea.startswith("SCAN") and "INDEX" not in linea:
+                aviso = "  <- recorrido completo de tabla"
+            print(f"  {linea}{aviso}")
+    return informe
+
+
+def consultas_pipeline():
+    """Consultas del propio pipeline cuyo plan interesa vigilar"""
+    from analysis.transform import CONSULTAS_MAESTRAS
+    from src.incremental import consulta_ultimos_periodos
+    from config.constantes import IPC
+
+    consultas = dict(CONSULTAS_MAESTRAS)
+    consultas["ultimos_periodos_IPC"] = consulta_ultimos_periodos(IPC)
+    return consultas
+
+
+if __name__ == "__main__":
+    informe_planes(consultas_pipeline())
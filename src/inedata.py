@@ -1,20 +1,134 @@
 import requests
+import codecs
 import json
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+from src import metricas
 
 INE_BASE_URL = "https://servicios.ine.es/wstempus/jsCache/ES/DATOS_TABLA/"
 
+# Parámetros de la extracción en paralelo
+MAX_WORKERS = 4      # Hilos del pool de descarga
+MAX_POR_HOST = 4     # Peticiones simultáneas como máximo contra un mismo servidor
+TIMEOUT = 30
+TAM_BLOQUE = 64 * 1024  # Bytes leídos por iteración en modo streaming
+
+# Sesión HTTP compartida (keep-alive) y semáforos por host
+_session = None
+_session_lock = threading.Lock()
+_semaforos_host = {}
+
+
+def obtener_sesion():
+    """
+    Devuelve una sesión HTTP compartida por todos los extractores.
+    Reutiliza las conexiones TCP/TLS con servicios.ine.es en lugar de
+    abrir una nueva por cada tabla.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_POR_HOST)
+            _session.mount("https://", adaptador)
+            _session.mount("http://", adaptador)
+        return _session
+
+
+def _semaforo_host(url):
+    """Semáforo que limita las peticiones concurrentes a un mismo host."""
+    host = urlparse(url).netloc
+    with _session_lock:
+        if host not in _semaforos_host:
+            _semaforos_host[host] = threading.BoundedSemaphore(MAX_POR_HOST)
+        return _semaforos_host[host]
+
+
+def _liberador(semaforo):
+    """Función que libera 'semaforo' una única vez, aunque se la llame varias"""
+    cerrojo = threading.Lock()
+    pendiente = [True]
+
+    def liberar():
+        with cerrojo:
+            if pendiente:
+                pendiente.pop()
+                semaforo.release()
+
+    return liberar
+
+
 class INEDataExtractor:
-    def __init__(self, codigo_tabla):
+    def __init__(self, codigo_tabla, session=None, cache=None, nult=None):
         self.codigo_tabla = codigo_tabla
+        self.session = session
+        self.cache = cache  # CacheINE opcional para reutilizar descargas previas
+        self.nult = nult    # Si se indica, solo se piden los últimos N periodos
         self.raw_data = None
         self.esquema = None
+        self.tiempo_descarga = None
+        self.bytes_descargados = 0
 
-    def obtener_datos(self):
+    def obtener_datos(self, streaming=False):
+        """
+        Descarga la tabla del INE.
+        En modo streaming 'raw_data' pasa a ser un generador que decodifica
+        la respuesta por bloques y entrega las series de una en una.
+        """
         url = f"{INE_BASE_URL}{self.codigo_tabla}"
+        if self.nult is not None:
+            url += f"?nult={self.nult}"
+        session = self.session or obtener_sesion()
+        etapa = f"fase1.descarga.{self.codigo_tabla}"
+        inicio = time.perf_counter()
+        error = False
         try:
-            r = requests.get(url, timeout=30)
-            r.raise_for_status()
-            
+            if self.cache is not None:
+                self._actualizar_cache(url, session)
+                if streaming:
+                    self.raw_data = _contar_datos(
+                        _iterar_series(self.cache.bloques(self._clave_cache())), etapa
+                    )
+                    return True
+                respuesta = self.cache.cargar(self._clave_cache())
+                self.raw_data = respuesta if isinstance(respuesta, list) else [respuesta]
+                metricas.sumar(etapa, filas_extraidas=_num_datos(self.raw_data))
+                return True
+
+            # El semáforo cubre la descarga entera del cuerpo, no solo la petición
+            semaforo = _semaforo_host(url)
+            semaforo.acquire()
+            liberar = _liberador(semaforo)
+            try:
+                r = session.get(
+                    url,
+                    timeout=TIMEOUT,
+                    stream=streaming,
+                    headers={"Accept-Encoding": "gzip, deflate"},
+                )
+                r.raise_for_status()
+
+                if streaming:
+                    # El cuerpo se lee según se procesa: el semáforo lo libera
+                    # el generador al terminar de leerlo y cerrar la respuesta,
+                    # o al recogerse si nunca se llega a leer
+                    bloques = _bloques_respuesta(r, etapa=etapa, al_cerrar=liberar)
+                    weakref.finalize(bloques, liberar)
+                    liberar = None
+                    # Los bytes y los datos se cuentan según se van leyendo
+                    self.raw_data = _contar_datos(_iterar_series(bloques), etapa)
+                    return True
+            finally:
+                if liberar is not None:
+                    liberar()
+
+            self.bytes_descargados = len(r.content)
             respuesta = r.json()
             
             if isinstance(respuesta, list):
@@ -22,13 +136,57 @@ class INEDataExtractor:
             else:
                 self.raw_data = [respuesta] # Asegurar que siempre sea una lista
 
+            metricas.sumar(etapa, filas_extraidas=_num_datos(self.raw_data))
             return True
         
 
         except Exception as e:
             print(f"[{self.codigo_tabla}] Error en obtención: {e}")
             self.raw_data = None
+            error = True
             return False
+        finally:
+            self.tiempo_descarga = time.perf_counter() - inicio
+            metricas.registrar(
+                etapa,
+                self.tiempo_descarga,
+                estado="error" if error else None,
+                bytes_descargados=self.bytes_descargados,
+            )
+
+    def _clave_cache(self):
+        """Las descargas parciales (nult) se guardan aparte de la tabla completa"""
+        if self.nult is None:
+            return self.codigo_tabla
+        return f"{self.codigo_tabla}_nult{self.nult}"
+
+    def _actualizar_cache(self, url, session):
+        """
+        Deja en la caché una copia válida de la tabla.
+        Dentro del TTL no se hace ninguna petición; después se revalida con
+        ETag/Last-Modified y solo se descarga el cuerpo si ha cambiado.
+        """
+        codigo = self._clave_cache()
+        if self.cache.offline or self.cache.es_fresco(codigo):
+            if not self.cache.existe(codigo):
+                raise FileNotFoundError(f"La tabla {codigo} no está en la caché (modo offline)")
+            print(f"[{codigo}] Usando copia en caché")
+            return
+
+        cabeceras = {"Accept-Encoding": "gzip, deflate"}
+        cabeceras.update(self.cache.cabeceras_condicionales(codigo))
+        # El cuerpo se vuelca a la caché sin soltar el semáforo del host
+        with _semaforo_host(url):
+            r = session.get(url, timeout=TIMEOUT, stream=True, headers=cabeceras)
+
+            if r.status_code == 304:
+                r.close()
+                self.cache.renovar(codigo)
+                print(f"[{codigo}] Sin cambios en el INE (304), usando caché")
+                return
+
+            r.raise_for_status()
+            self.bytes_descargados = self.cache.guardar(codigo, r)
 
     # Para inspeccionar la estructura de la tabla
     def _tipo_simple(self, valor):
@@ -67,3 +225,128 @@ class INEDataExtractor:
         if self.esquema is None:
             self.generar_esquema()
         print(json.dumps(self.esquema, indent=4, ensure_ascii=False))
+
+
+def _bloques_respuesta(respuesta, tam_bloque=TAM_BLOQUE, etapa=None, al_cerrar=None):
+    """
+    Cuerpo de la respuesta HTTP por bloques (ya descomprimido si venía en gzip).
+    Con 'etapa' suma al terminar los bytes leídos al informe de la ejecución.
+    'al_cerrar' se llama después de cerrar la respuesta (p. ej. para liberar
+    el semáforo del host).
+    """
+    descargados = 0
+    try:
+        for bloque in respuesta.iter_content(chunk_size=tam_bloque):
+            descargados += len(bloque)
+            yield bloque
+    finally:
+        respuesta.close()
+        if al_cerrar is not None:
+            al_cerrar()
+        if etapa is not None:
+            metricas.sumar(etapa, bytes_descargados=descargados)
+
+
+def _num_datos(series):
+    """Número de datos (periodo y valor) que trae una lista de series del INE"""
+    return sum(len(serie.get("Data") or []) for serie in series if isinstance(serie, dict))
+
+
+def _contar_datos(series, etapa):
+    """Entrega las series tal cual y, al terminar, suma sus datos al informe de la ejecución"""
+    extraidos = 0
+    try:
+        for serie in series:
+            extraidos += _num_datos([serie])
+            yield serie
+    finally:
+        metricas.sumar(etapa, filas_extraidas=extraidos)
+
+
+def _iterar_series(bloques):
+    """
+    Decodifica de forma incremental un array JSON de series del INE.
+    Recibe el cuerpo como un iterador de bloques de bytes y entrega
+    cada serie en cuanto está completa, sin cargar la tabla entera en memoria.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    bloques = iter(bloques)
+    buffer = ""
+    pos = 0
+
+    def leer_mas():
+        nonlocal buffer
+        for bloque in bloques:
+            texto = utf8.decode(bloque)
+            if texto:
+                buffer += texto
+                return True
+        buffer += utf8.decode(b"", final=True)
+        return False
+
+    def saltar(caracteres):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in caracteres:
+                pos += 1
+            if pos < len(buffer) or not leer_mas():
+                return pos < len(buffer)
+
+    try:
+        if not saltar(" \t\r\n"):
+            return
+
+        # Respuesta con un único objeto: se decodifica entero
+        if buffer[pos] != "[":
+            while leer_mas():
+                pass
+            yield json.loads(buffer[pos:])
+            return
+        pos += 1
+
+        while saltar(" \t\r\n,"):
+            if buffer[pos] == "]":
+                return
+            try:
+                serie, fin = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Serie incompleta: pedimos otro bloque y reintentamos
+                if not leer_mas():
+                    raise
+                continue
+            # Descartamos lo ya decodificado para no acumular memoria
+            buffer = buffer[fin:]
+            pos = 0
+            yield serie
+    finally:
+        if hasattr(bloques, "close"):
+            bloques.close()
+
+
+def extraer_tablas(codigos, max_workers=MAX_WORKERS, cache=None, nult_por_tabla=None):
+    """
+    Descarga varias tablas del INE en paralelo con un pool de hilos acotado
+    que comparte una única sesión HTTP.
+    'nult_por_tabla' permite pedir solo los últimos N periodos de cada tabla.
+    Devuelve un diccionario {codigo: extractor} en el mismo orden que 'codigos'.
+    """
+    session = obtener_sesion()
+    nult_por_tabla = nult_por_tabla or {}
+    extractores = {
+        codigo: INEDataExtractor(
+            codigo, session=session, cache=cache, nult=nult_por_tabla.get(codigo)
+        )
+        for codigo in codigos
+    }
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futuros = {pool.submit(ext.obtener_datos): codigo for codigo, ext in extractores.items()}
+        for futuro in as_completed(futuros):
+            codigo = futuros[futuro]
+            estado = "OK" if futuro.result() else "ERROR"
+            print(f"[{codigo}] Descarga {estado} en {extractores[codigo].tiempo_descarga:.2f}s")
+
+    print(f"Extracción completada en {time.perf_counter() - inicio:.2f}s")
+    return extractores
@@ -0,0 +1,229 @@
+# metricas.py
+# Instrumentación de una ejecución del pipeline
+#
+# Cada parte del pipeline mide su trabajo como una etapa con un nombre
+# jerárquico separado por puntos:
+#
+#   fase1                          fase2                      fase3
+#   fase1.descarga.<tabla>         fase2.agregados            fase3.grafico.<fichero>
+#   fase1.tabla.<tabla>            fase2.analisis.<dataset>
+#   fase1.tabla.<tabla>.procesar   fase2.exportacion
+#   fase1.tabla.<tabla>.insertar
+#
+# De cada etapa se guarda el tiempo de pared, el tiempo de CPU, el pico de
+# memoria del proceso al terminar y los contadores que se le sumen (filas
+# extraídas, procesadas, insertadas, omitidas..., bytes descargados).
+# Al final de cada ejecución se escribe un informe JSON en informes/, junto
+# a data_output, y opcionalmente un resumen legible por pantalla.
+#
+# El tiempo de CPU es el del proceso entero mientras dura la etapa: en las
+# etapas que se solapan (descargas en paralelo, la tubería, los nodos del
+# grafo) incluye también el trabajo de las demás.
+
+import contextlib
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src.db import amarillo, reset, rojo, turquesa
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+INFORMES_DIR = os.path.join(project_root, "informes")
+
+_lock = threading.Lock()
+_ejecucion = {}
+_etapas = {}  # nombre -> registro, en orden de inicio
+
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso hasta ahora (None si no se puede medir)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def iniciar(descripcion=None):
+    """Empieza una ejecución nueva y descarta las etapas de la anterior"""
+    with _lock:
+        _etapas.clear()
+        _ejecucion.clear()
+        _ejecucion.update(
+            descripcion=descripcion,
+            inicio=datetime.now().isoformat(timespec="seconds"),
+            pared=time.perf_counter(),
+            cpu=time.process_time(),
+        )
+
+
+def _registro(nombre, inicio):
+    # Se llama con el cerrojo cogido
+    if not _ejecucion:
+        # Sin iniciar(): la ejecución empieza con la primera etapa
+        _ejecucion.update(
+            descripcion=None,
+            inicio=datetime.now().isoformat(timespec="seconds"),
+            pared=inicio,
+            cpu=time.process_time(),
+        )
+    if nombre not in _etapas:
+        _etapas[nombre] = {
+            "inicio_s": round(inicio - _ejecucion["pared"], 4),
+            "pared_s": 0.0,
+            "cpu_s": None,
+            "veces": 0,
+            "estado": "ok",
+            "rss_pico_mb": None,
+            "contadores": {},
+        }
+    return _etapas[nombre]
+
+
+@contextlib.contextmanager
+def etapa(nombre):
+    """
+    Mide el bloque como la etapa 'nombre' (si se repite, se acumula).
+    También sirve como decorador: @metricas.etapa("fase1").
+    """
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    with _lock:
+        _registro(nombre, inicio)
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        pared = time.perf_counter() - inicio
+        cpu = time.process_time() - inicio_cpu
+        with _lock:
+            registro = _registro(nombre, inicio)
+            registro["pared_s"] += pared
+            registro["cpu_s"] = (registro["cpu_s"] or 0.0) + cpu
+            registro["veces"] += 1
+            registro["rss_pico_mb"] = rss_pico_mb()
+            if error:
+                registro["estado"] = "error"
+
+
+def registrar(nombre, pared_s, cpu_s=None, estado=None, **contadores):
+    """
+    Añade una etapa medida por otro lado (en otro proceso o con su propio
+    cronómetro). 'estado' sustituye al "ok" por defecto.
+    """
+    ahora = time.perf_counter()
+    with _lock:
+        registro = _registro(nombre, ahora - pared_s)
+        registro["pared_s"] += pared_s
+        if cpu_s is not None:
+            registro["cpu_s"] = (registro["cpu_s"] or 0.0) + cpu_s
+        registro["veces"] += 1
+        if estado is not None:
+            registro["estado"] = estado
+        _sumar(registro, contadores)
+
+
+def sumar(nombre, **contadores):
+    """Suma contadores (filas_insertadas=..., bytes_descargados=...) a la etapa 'nombre'"""
+    with _lock:
+        _sumar(_registro(nombre, time.perf_counter()), contadores)
+
+
+def _sumar(registro, contadores):
+    for clave, cantidad in contadores.items():
+        registro["contadores"][clave] = registro["contadores"].get(clave, 0) + cantidad
+
+
+def informe():
+    """Informe de la ejecución en curso como diccionario serializable a JSON"""
+    with _lock:
+        etapas = {
+            nombre: {
+                **registro,
+                "pared_s": round(registro["pared_s"], 4),
+                "cpu_s": None if registro["cpu_s"] is None else round(registro["cpu_s"], 4),
+                "contadores": dict(registro["contadores"]),
+            }
+            for nombre, registro in _etapas.items()
+        }
+        ejecucion = dict(_ejecucion)
+
+    # Cada contador se suma en una sola etapa, así que el total no cuenta nada dos veces
+    totales = {}
+    for registro in etapas.values():
+        for clave, cantidad in registro["contadores"].items():
+            totales[clave] = totales.get(clave, 0) + cantidad
+
+    return {
+        "descripcion": ejecucion.get("descripcion"),
+        "inicio": ejecucion.get("inicio"),
+        "fin": datetime.now().isoformat(timespec="seconds"),
+        "pared_s": round(time.perf_counter() - ejecucion["pared"], 4) if ejecucion else 0.0,
+        "cpu_s": round(time.process_time() - ejecucion["cpu"], 4) if ejecucion else 0.0,
+        "rss_pico_mb": rss_pico_mb(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "nucleos": os.cpu_count(),
+        "totales": totales,
+        "etapas": etapas,
+    }
+
+
+def resumen(datos=None):
+    """Texto legible de un informe (por defecto, el de la ejecución en curso)"""
+    datos = datos or informe()
+    pico = datos["rss_pico_mb"]
+    lineas = [
+        f"{turquesa}Resumen de la ejecución:{reset} {amarillo}{datos['pared_s']:.2f} s{reset} "
+        f"(CPU {datos['cpu_s']:.2f} s, pico de memoria {pico if pico is not None else '-'} MB)",
+        f"  {'etapa':<44}{'pared':>10}{'CPU':>10}{'MB':>9}  contadores",
+    ]
+    for nombre, registro in datos["etapas"].items():
+        # Sangría según la profundidad, sin repetir el nombre de la fase
+        partes = nombre.split(".")
+        etiqueta = "  " * (len(partes) - 1) + ".".join(partes[1:] or partes)
+        cpu = "-" if registro["cpu_s"] is None else f"{registro['cpu_s']:.2f}s"
+        memoria = "-" if registro["rss_pico_mb"] is None else registro["rss_pico_mb"]
+        contadores = " ".join(f"{clave}={cantidad}" for clave, cantidad in registro["contadores"].items())
+        if registro["estado"] != "ok":
+            color = rojo if registro["estado"] == "error" else amarillo
+            contadores = f"{color}[{registro['estado']}]{reset} {contadores}"
+        lineas.append(
+            f"  {etiqueta:<44}{registro['pared_s']:>9.2f}s{cpu:>10}{memoria:>9}  {contadores}".rstrip()
+        )
+    if datos["totales"]:
+        totales = " ".join(f"{clave}={cantidad}" for clave, cantidad in datos["totales"].items())
+        lineas.append(f"  {turquesa}Totales:{reset} {totales}")
+    return "\n".join(lineas)
+
+
+def guardar_informe(directorio=INFORMES_DIR, mostrar_resumen=False):
+    """
+    Escribe el informe de la ejecución en curso como
+    informes/ejecucion_<fecha>.json y devuelve su ruta.
+    Con 'mostrar_resumen' imprime además el resumen legible.
+    """
+    datos = informe()
+    os.makedirs(directorio, exist_ok=True)
+    marca = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ruta = os.path.join(directorio, f"ejecucion_{marca}.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+
+    if mostrar_resumen:
+        print("\n" + resumen(datos))
+    print(f"Informe de la ejecución guardado en '{ruta}'")
+    return ruta
@@ -0,0 +1,191 @@
+"""
+Fase 1 en tubería: extracción -> procesamiento -> carga.
+Cada etapa corre en su propio hilo y se comunica con la siguiente mediante
+colas acotadas (backpressure): mientras se procesa o se carga una tabla,
+la siguiente ya se está descargando.
+La carga se ejecuta en el hilo que llama, que es el dueño de la conexión
+SQLite; las otras etapas nunca tocan la BD.
+Si la carga se interrumpe (una excepción), las demás etapas se paran y las
+colas se vacían para que ningún hilo quede bloqueado en ellas.
+"""
+import queue
+import threading
+import time
+
+from src import metricas
+from src.procesar import (
+    iniciar_cache_dimensiones,
+    integrar_resultado_worker,
+    procesar_en_worker,
+)
+
+TAM_COLA = 2  # Tablas en vuelo como máximo entre dos etapas
+ESPERA_PARADA = 0.1  # Segundos entre comprobaciones de la señal de parada
+_FIN = object()
+
+
+class EstadisticasEtapa:
+    """Tiempo que una etapa pasa trabajando y esperando a las otras"""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.ocupado = 0.0
+        self.esperando = 0.0
+        self.tablas = 0
+
+    def __str__(self):
+        return (
+            f"{self.nombre:<15} {self.tablas} tablas | "
+            f"ocupada {self.ocupado:6.2f}s | esperando {self.esperando:6.2f}s"
+        )
+
+
+def _poner(cola, elemento, estadisticas, parar):
+    """Espera hueco en la cola; devuelve False si antes llega la señal de parada"""
+    inicio = time.perf_counter()
+    try:
+        while not parar.is_set():
+            try:
+                cola.put(elemento, timeout=ESPERA_PARADA)
+                return True
+            except queue.Full:
+                pass
+        return False
+    finally:
+        estadisticas.esperando += time.perf_counter() - inicio
+
+
+def _sacar(cola, estadisticas, parar=None):
+    """Siguiente elemento de la cola; _FIN si antes llega la señal de parada"""
+    inicio = time.perf_counter()
+    try:
+        while parar is None or not parar.is_set():
+            try:
+                return cola.get(timeout=ESPERA_PARADA)
+            except queue.Empty:
+                pass
+        return _FIN
+    finally:
+        estadisticas.esperando += time.perf_counter() - inicio
+
+
+def _etapa_extraccion(extractores, salida, estadisticas, parar, streaming):
+    try:
+        for codigo, extractor in extractores.items():
+            if parar.is_set():
+                return
+            inicio = time.perf_counter()
+            # En streaming la tabla se decodifica en la etapa de procesamiento
+            descargado = extractor.obtener_datos(streaming=streaming)
+            estadisticas.ocupado += time.perf_counter() - inicio
+            estadisticas.tablas += 1
+
+            if descargado:
+                if not _poner(salida, (codigo, extractor), estadisticas, parar):
+                    return
+            else:
+                print(f"No se pudieron obtener los datos de la tabla {codigo}")
+    finally:
+        _poner(salida, _FIN, estadisticas, parar)
+
+
+def _etapa_procesado(entrada, salida, instantanea, motor, estadisticas, parar):
+    try:
+        while not parar.is_set():
+            elemento = _sacar(entrada, estadisticas, parar)
+            if elemento is _FIN:
+                break
+            codigo, extractor = elemento
+
+            inicio = time.perf_counter()
+            try:
+                with metricas.etapa(f"fase1.tabla.{codigo}.procesar"):
+                    resultado = procesar_en_worker(codigo, extractor.raw_data, instantanea, motor)
+            except Exception as e:
+                print(f"[{codigo}] Error al procesar: {e}")
+                continue
+            finally:
+                estadisticas.ocupado += time.perf_counter() - inicio
+                estadisticas.tablas += 1
+            extractor.raw_data = None  # Liberamos el JSON en cuanto está procesado
+
+            if not _poner(salida, (codigo, extractor, resultado), estadisticas, parar):
+                return
+    finally:
+        _poner(salida, _FIN, estadisticas, parar)
+
+
+def _vaciar(cola):
+    while True:
+        try:
+            cola.get_nowait()
+        except queue.Empty:
+            return
+
+
+def ejecutar_pipeline(extractores, cargar, tam_cola=TAM_COLA, motor="python", streaming=False):
+    """
+    Ejecuta extracción, procesamiento y carga solapadas.
+    'extractores' es {codigo: INEDataExtractor} y 'cargar(codigo, series, extractor)'
+    inserta una tabla ya procesada; se llama siempre desde este hilo.
+    Con 'streaming' cada tabla se decodifica por bloques en la etapa de
+    procesamiento en lugar de descargarse entera en la de extracción.
+    Devuelve las estadísticas de cada etapa.
+    """
+    descargadas = queue.Queue(maxsize=tam_cola)
+    procesadas = queue.Queue(maxsize=tam_cola)
+
+    estadisticas = [
+        EstadisticasEtapa("Extracción"),
+        EstadisticasEtapa("Procesamiento"),
+        EstadisticasEtapa("Carga"),
+    ]
+    est_extraccion, est_procesado, est_carga = estadisticas
+
+    # Los hilos de procesamiento trabajan sobre una copia de las dimensiones
+    instantanea = iniciar_cache_dimensiones().instantanea()
+    parar = threading.Event()
+
+    hilos = [
+        threading.Thread(
+            target=_etapa_extraccion,
+            args=(extractores, descargadas, est_extraccion, parar, streaming),
+            name="etapa-extraccion",
+            daemon=True,
+        ),
+        threading.Thread(
+            target=_etapa_procesado,
+            args=(descargadas, procesadas, instantanea, motor, est_procesado, parar),
+            name="etapa-procesado",
+            daemon=True,
+        ),
+    ]
+    inicio_total = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+
+    try:
+        while True:
+            elemento = _sacar(procesadas, est_carga)
+            if elemento is _FIN:
+                break
+            codigo, extractor, (series, pendientes) = elemento
+
+            inicio = time.perf_counter()
+            cargar(codigo, integrar_resultado_worker(series, pendientes), extractor)
+            est_carga.ocupado += time.perf_counter() - inicio
+            est_carga.tablas += 1
+    finally:
+        # Si la carga ha terminado antes de tiempo, las etapas dejan de
+        # trabajar y se vacían las colas para desbloquear sus put()/get()
+        parar.set()
+        while any(hilo.is_alive() for hilo in hilos):
+            _vaciar(descargadas)
+            _vaciar(procesadas)
+            for hilo in hilos:
+                hilo.join(ESPERA_PARADA)
+
+    print(f"\nPipeline de la Fase 1 completado en {time.perf_counter() - inicio_total:.2f}s")
+    for estadistica in estadisticas:
+        print(f"  {estadistica}")
+    return estadisticas
@@ -1,3 +1,5 @@
+import threading
+
 from config.constantes import (
     IPC,
     IPV,
@@ -7,34 +9,52 @@ from config.constantes import (
     TASA_PARO,
     TEMPORALIDAD,
 )
-from src.db import get_cursor
+from src.db import get_cursor, clave_periodo
 
 
-def procesar_datos(codigo, datos):
+def procesar_datos(codigo, datos, por_serie=False, motor="python"):
     """
     Función principal de transformación. Despacha el procesamiento
     a las funciones especializadas según el código INE.
+    'datos' puede ser una lista o un iterador de series (modo streaming).
+    Con 'por_serie' devuelve una lista de filas por cada serie del INE
+    en lugar de una única lista plana.
+    'motor' elige entre el bucle serie a serie ("python") y el procesamiento
+    columnar ("polars"); ambos generan las mismas filas.
     """
     # 1. SEGREGACIÓN POR GRUPO DE TABLA DE HECHOS
 
     if not datos:
         return []
 
+    elif codigo not in [IPC, IPV, ETCL, EAES_OCUPACION, EAES_PERCENTILES, TASA_PARO, TEMPORALIDAD]:
+        print(f"[Procesar] ERROR: Código {codigo} no mapeado a una tabla de hechos.")
+        return []
+
+    elif motor == "polars":
+        from src.procesar_polars import procesar_tabla_polars
+        series = procesar_tabla_polars(codigo, datos, _obtener_cache())
+
     elif codigo in [IPC, IPV]:
         # T1: Precios (Mensual y Trimestral)
-        return _procesar_precios(codigo, datos)
+        series = _procesar_precios(codigo, datos)
 
     elif codigo in [ETCL, EAES_OCUPACION, EAES_PERCENTILES]:
         # T2: Ingresos/Salarios (Trimestral y Anual)
-        return _procesar_salarios(codigo, datos)
+        series = _procesar_salarios(codigo, datos)
 
-    elif codigo in [TASA_PARO, TEMPORALIDAD]:
+    else:
         # T3: Empleo/Calidad Laboral (Trimestral)
-        return _procesar_empleo(codigo, datos)
+        series = _procesar_empleo(codigo, datos)
 
+    if por_serie:
+        filas = [filas_serie for filas_serie in series if filas_serie]
     else:
-        print(f"[Procesar] ERROR: Código {codigo} no mapeado a una tabla de hechos.")
-        return []
+        filas = [fila for filas_serie in series for fila in filas_serie]
+
+    # 2. Escribimos de una vez las dimensiones nuevas antes de cargar los hechos
+    _obtener_cache().volcar()
+    return filas
 
 
 def _aplanar_nombre_serie(codigo, nombre_serie):
@@ -114,7 +134,7 @@ def _aplanar_nombre_serie(codigo, nombre_serie):
 
 
 def _procesar_precios(codigo, data):
-    filas_insertar = []
+    """Genera, serie a serie, las filas de T_precios"""
 
     for serie in data:
         nombre_serie = serie.get("Nombre", "")
@@ -164,6 +184,7 @@ def _procesar_precios(codigo, data):
         id_indicador = _obtener_o_crear("indicador", "nombre", nombre_indicador, unidad=unidad)
 
         # --- DATOS TEMPORALES ---
+        filas_serie = []
         for dato in serie.get("Data", []):
             # Lectura segura del periodo (Mayúsculas/Minúsculas)
             periodo_ine = dato.get("FK_Periodo") or dato.get("Fk_Periodo")
@@ -181,15 +202,15 @@ def _procesar_precios(codigo, data):
             if valor is None: 
                 continue
 
-            filas_insertar.append(
+            filas_serie.append(
                 (id_periodo, id_indicador, id_geografia, categoria_limpia, valor)
             )
-            
-    return filas_insertar
+
+        yield filas_serie
 
 
 def _procesar_empleo(codigo, data):
-    filas_insertar = []
+    """Genera, serie a serie, las filas de T_empleo"""
 
     for serie in data:
         # 1. Obtener los metadatos del nombre
@@ -234,6 +255,7 @@ def _procesar_empleo(codigo, data):
             "indicador", "nombre", nombre_indicador, unidad=unidad
         )
 
+        filas_serie = []
         for dato in serie.get("Data"):
             # Obtener ID del periodo
             id_periodo = _obtener_o_crear_periodo(
@@ -245,7 +267,7 @@ def _procesar_empleo(codigo, data):
             tipo_contrato = metadata_dims.get("Tipo_Contrato", None)
             valor = dato.get("Valor")
 
-            filas_insertar.append(
+            filas_serie.append(
                 (
                     id_periodo,
                     id_indicador,
@@ -258,12 +280,12 @@ def _procesar_empleo(codigo, data):
                 )
             )
 
-    return filas_insertar
+        yield filas_serie
 
 
-def _procesar_salarios(codigo, data):
 
-    filas_insertar = []
+def _procesar_salarios(codigo, data):
+    """Genera, serie a serie, las filas de T_salarios"""
 
     for serie in data:
         nombre_serie = serie.get("Nombre", "")
@@ -311,6 +333,7 @@ def _procesar_salarios(codigo, data):
         )
 
         # Iterar datos temporales
+        filas_serie = []
         for dato in serie.get("Data", []):
             id_periodo = _obtener_o_crear_periodo(
                 anio=dato.get("Anyo"), trimestre_fk=dato.get("FK_Periodo")
@@ -329,14 +352,215 @@ def _procesar_salarios(codigo, data):
 
             # Estructura T_salarios:
             # id_periodo, id_indicador, id_geografia, sexo, sector_cnae, ocupacion_cno11, valor
-            filas_insertar.append(
+            filas_serie.append(
                 (id_periodo, id_indicador, id_geografia, sexo, sector, ocupacion, valor)
             )
 
-    return filas_insertar
+        yield filas_serie
 
 
-def _obtener_o_crear_periodo(anio, mes=None, trimestre_fk=None):
+
+class CacheDimensiones:
+    """
+    Caché en memoria de las dimensiones (periodo, geografía, indicador).
+    Se precarga desde la BD al empezar una ejecución; los miembros nuevos
+    reciben su id en memoria y se escriben todos juntos en 'volcar()'.
+    Las búsquedas de claves conocidas no tocan SQLite.
+
+    Si se construye a partir de una 'instantanea' (procesos worker) no toca
+    la BD en absoluto: los miembros nuevos reciben ids provisionales negativos
+    que el proceso escritor traduce después con 'integrar_resultado_worker'.
+    """
+
+    def __init__(self, instantanea=None):
+        self.periodos = set()  # id_periodo ya existentes (clave determinista)
+        self.geografias = {}   # nombre -> id_geografia
+        self.indicadores = {}  # nombre -> id_indicador
+        self._siguiente_id = {}
+        self._pendientes = {"periodo": [], "geografia": [], "indicador": []}
+        self.provisional = instantanea is not None
+
+        if self.provisional:
+            self.periodos = set(instantanea["periodos"])
+            self.geografias = dict(instantanea["geografias"])
+            self.indicadores = dict(instantanea["indicadores"])
+            self._siguiente_id = {"geografia": -1, "indicador": -1}
+        else:
+            self.cargar()
+
+    def instantanea(self):
+        """Copia serializable de las dimensiones conocidas, para los workers"""
+        return {
+            "periodos": set(self.periodos),
+            "geografias": dict(self.geografias),
+            "indicadores": dict(self.indicadores),
+        }
+
+    def cargar(self):
+        with get_cursor() as cursor:
+            cursor.execute("SELECT id_periodo FROM tbl_periodo")
+            self.periodos = {fila[0] for fila in cursor.fetchall()}
+            cursor.execute("SELECT id_geografia, nombre FROM tbl_geografia")
+            self.geografias = {nombre: id_geo for id_geo, nombre in cursor.fetchall()}
+            cursor.execute("SELECT id_indicador, nombre FROM tbl_indicador")
+            self.indicadores = {nombre: id_ind for id_ind, nombre in cursor.fetchall()}
+
+            for tabla in ("geografia", "indicador"):
+                cursor.execute(f"SELECT COALESCE(MAX(id_{tabla}), 0) FROM tbl_{tabla}")
+                self._siguiente_id[tabla] = cursor.fetchone()[0] + 1
+
+    def _nuevo_id(self, tabla):
+        nuevo_id = self._siguiente_id[tabla]
+        self._siguiente_id[tabla] += -1 if self.provisional else 1
+        return nuevo_id
+
+    def periodo(self, anio, mes, trimestre, fecha_iso):
+        id_periodo = clave_periodo(anio, mes, trimestre)
+        if id_periodo not in self.periodos:
+            self.periodos.add(id_periodo)
+            self._pendientes["periodo"].append((id_periodo, anio, mes, trimestre, fecha_iso))
+        return id_periodo
+
+    def geografia(self, nombre):
+        id_geografia = self.geografias.get(nombre)
+        if id_geografia is None:
+            id_geografia = self._nuevo_id("geografia")
+            self.geografias[nombre] = id_geografia
+            self._pendientes["geografia"].append((id_geografia, nombre))
+        return id_geografia
+
+    def indicador(self, nombre, unidad=None):
+        id_indicador = self.indicadores.get(nombre)
+        if id_indicador is None:
+            id_indicador = self._nuevo_id("indicador")
+            self.indicadores[nombre] = id_indicador
+            self._pendientes["indicador"].append((id_indicador, nombre, unidad))
+        return id_indicador
+
+    def volcar(self):
+        """Escribe en bloque (una sola transacción) los miembros nuevos"""
+        if self.provisional:
+            raise RuntimeError("Una caché provisional (worker) no puede escribir en la BD")
+        if not any(self._pendientes.values()):
+            return
+        with get_cursor() as cursor:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO tbl_periodo (id_periodo, anio, mes, trimestre, fecha_iso) VALUES (?, ?, ?, ?, ?)",
+                self._pendientes["periodo"],
+            )
+            cursor.executemany(
+                "INSERT INTO tbl_geografia (id_geografia, nombre) VALUES (?, ?)",
+                self._pendientes["geografia"],
+            )
+            cursor.executemany(
+                "INSERT INTO tbl_indicador (id_indicador, nombre, unidad) VALUES (?, ?, ?)",
+                self._pendientes["indicador"],
+            )
+        self._pendientes = {"periodo": [], "geografia": [], "indicador": []}
+
+
+_cache_dimensiones = None
+# Caché provisional del worker en curso. Es local al hilo para que la etapa
+# de procesamiento del pipeline (src/pipeline.py) no pise la caché central,
+# que sigue usando el hilo escritor.
+_cache_worker = threading.local()
+
+
+def iniciar_cache_dimensiones():
+    """Precarga (o recarga) la caché de dimensiones al empezar una ejecución"""
+    global _cache_dimensiones
+    _cache_dimensiones = CacheDimensiones()
+    return _cache_dimensiones
+
+
+def procesar_en_worker(codigo, datos, instantanea, motor="python"):
+    """
+    Punto de entrada de los procesos worker: procesa una tabla sin tocar la BD.
+    Devuelve las filas por serie (con ids provisionales para las dimensiones
+    nuevas) y la lista de dimensiones nuevas en el orden en que aparecieron.
+    """
+    cache = _cache_worker.cache = CacheDimensiones(instantanea)
+    try:
+        if motor == "polars":
+            from src.procesar_polars import procesar_tabla_polars
+            series = procesar_tabla_polars(codigo, datos, cache)
+        elif codigo in [IPC, IPV]:
+            series = _procesar_precios(codigo, datos)
+        elif codigo in [ETCL, EAES_OCUPACION, EAES_PERCENTILES]:
+            series = _procesar_salarios(codigo, datos)
+        elif codigo in [TASA_PARO, TEMPORALIDAD]:
+            series = _procesar_empleo(codigo, datos)
+        else:
+            return [], cache._pendientes
+
+        series = [filas_serie for filas_serie in series if filas_serie]
+        return series, cache._pendientes
+    finally:
+        _cache_worker.cache = None
+
+
+def integrar_resultado_worker(series, pendientes):
+    """
+    Lado del escritor: registra en la caché central las dimensiones nuevas
+    de un worker (en su orden de aparición, para que los ids coincidan con
+    el procesamiento secuencial), traduce los ids provisionales y las vuelca.
+    """
+    cache = _obtener_cache()
+    for id_periodo, anio, mes, trimestre, fecha_iso in pendientes["periodo"]:
+        cache.periodo(anio, mes, trimestre, fecha_iso)
+
+    # Los workers registran geografía e indicador intercalados; el orden
+    # relativo dentro de cada dimensión es lo único que afecta a los ids
+    geos = {provisional: cache.geografia(nombre) for provisional, nombre in pendientes["geografia"]}
+    inds = {
+        provisional: cache.indicador(nombre, unidad)
+        for provisional, nombre, unidad in pendientes["indicador"]
+    }
+
+    if geos or inds:
+        # Las columnas 1 y 2 de todas las tablas de hechos son id_indicador e id_geografia
+        series = [
+            [
+                (fila[0], inds.get(fila[1], fila[1]), geos.get(fila[2], fila[2])) + fila[3:]
+                for fila in filas_serie
+            ]
+            for filas_serie in series
+        ]
+
+    cache.volcar()
+    return series
+
+
+def procesar_tablas_en_paralelo(datos_por_tabla, procesos=None, motor="python"):
+    """
+    Procesa varias tablas a la vez en un pool de procesos. Los workers no
+    abren la BD: este proceso es el único escritor. Genera (codigo, series)
+    en el orden de 'datos_por_tabla' según van estando listas.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    instantanea = _obtener_cache().instantanea()
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = [
+            (codigo, pool.submit(procesar_en_worker, codigo, datos, instantanea, motor))
+            for codigo, datos in datos_por_tabla.items()
+        ]
+        for codigo, futuro in futuros:
+            series, pendientes = futuro.result()
+            yield codigo, integrar_resultado_worker(series, pendientes)
+
+
+def _obtener_cache():
+    cache_worker = getattr(_cache_worker, "cache", None)
+    if cache_worker is not None:
+        return cache_worker
+    if _cache_dimensiones is None:
+        return iniciar_cache_dimensiones()
+    return _cache_dimensiones
+
+
+def _calcular_periodo(anio, mes=None, trimestre_fk=None):
+    """Traduce el periodo del INE a (mes, trimestre, fecha_iso) de tbl_periodo"""
     mes_calculado = mes
     trimestre_calculado = None
     fecha_iso = ""
@@ -372,74 +596,24 @@ def _obtener_o_crear_periodo(anio, mes=None, trimestre_fk=None):
     else:
         fecha_iso = f"{anio}-01-01"
 
-
-    with get_cursor() as cursor:
-        # Construimos la query dinámica para manejar los NULL de SQLite
-        sql_select = "SELECT id_periodo FROM tbl_periodo WHERE anio = ?"
-        parametros = [anio]
-
-        if mes_calculado is not None:
-            sql_select += " AND mes = ?"
-            parametros.append(mes_calculado)
-        else:
-            sql_select += " AND mes IS NULL"
-
-        if trimestre_calculado is not None:
-            sql_select += " AND trimestre = ?"
-            parametros.append(trimestre_calculado)
-        else:
-            sql_select += " AND trimestre IS NULL"
-
-        cursor.execute(sql_select, tuple(parametros))
-        resultado = cursor.fetchone()
-
-        if resultado:
-            return resultado[0] # Ya existe este periodo con esta granularidad exacta
-        
-        # Si no existe, lo insertamos como un periodo nuevo e independiente
-        sql_insert = "INSERT INTO tbl_periodo (anio, mes, trimestre, fecha_iso) VALUES (?, ?, ?, ?)"
-        cursor.execute(sql_insert, (anio, mes_calculado, trimestre_calculado, fecha_iso))
-        return cursor.lastrowid
+    return mes_calculado, trimestre_calculado, fecha_iso
 
 
+def _obtener_o_crear_periodo(anio, mes=None, trimestre_fk=None):
+    mes_calculado, trimestre_calculado, fecha_iso = _calcular_periodo(anio, mes, trimestre_fk)
+    return _obtener_cache().periodo(anio, mes_calculado, trimestre_calculado, fecha_iso)
 
 
 def _obtener_o_crear(tabla, columna_busqueda, valor_busqueda, **kwargs):
     """
-    Función centralizada para buscar o crear una dimensión (Periodo, Geografía, Indicador).
+    Función centralizada para buscar o crear una dimensión (Geografía, Indicador).
+    Resuelve contra la caché en memoria; los nuevos se escriben en 'volcar()'.
     """
-    id_columna = f"id_{tabla}"
-    tabla_nombre = f"tbl_{tabla}"
-
-    with get_cursor() as cursor:
-        # 1. Intentar buscar el ID
-        sql_select = f"SELECT {id_columna} FROM {tabla_nombre} WHERE {columna_busqueda} = ?"
-        cursor.execute(sql_select, (valor_busqueda,))
-
-        resultado = cursor.fetchone()
-
-        if resultado:
-            # El periodo ya existe. Devolvemos su ID.
-            return resultado[0]
+    cache = _obtener_cache()
 
-        # 2. El registro no existe. Lo insertamos.
-
-        sql_insert = ""
-        parametros = ()
-
-        if tabla == "periodo":
-            sql_insert = "INSERT INTO tbl_periodo (anio, mes, trimestre, fecha_iso) VALUES (?, ?, ?, ?)"
-            parametros = (kwargs.get("anio"), kwargs.get("mes"), kwargs.get("trimestre"), valor_busqueda)
-
-        elif tabla == "geografia":
-            sql_insert = "INSERT INTO tbl_geografia (nombre) VALUES (?)"
-            parametros = (valor_busqueda,)
-
-        elif tabla == "indicador":
-            sql_insert = "INSERT INTO tbl_indicador (nombre, unidad) VALUES (?, ?)"
-            parametros = (valor_busqueda, kwargs.get("unidad"))
-        else:
-            raise ValueError(f"Tabla '{tabla}' no soportada.")
-
-        cursor.execute(sql_insert, parametros)
-        return cursor.lastrowid
+    if tabla == "geografia":
+        return cache.geografia(valor_busqueda)
+    elif tabla == "indicador":
+        return cache.indicador(valor_busqueda, kwargs.get("unidad"))
+    else:
+        raise ValueError(f"Tabla '{tabla}' no soportada.")
@@ -0,0 +1,327 @@
+"""
+Motor columnar de procesamiento con Polars.
+Produce exactamente las mismas filas que las funciones _procesar_* de
+procesar.py, pero parseando 'Nombre', filtrando y resolviendo dimensiones
+con expresiones vectorizadas y joins en lugar de bucles por dato.
+"""
+from itertools import chain, repeat
+
+import polars as pl
+
+from config.constantes import (
+    IPC,
+    IPV,
+    ETCL,
+    EAES_OCUPACION,
+    EAES_PERCENTILES,
+    TASA_PARO,
+    TEMPORALIDAD,
+)
+
+# FK_Periodo del INE -> (mes, trimestre, mes de fecha_iso) igual que _calcular_periodo
+# (se respetan tal cual los valores históricos de T3 y T4)
+PERIODOS_INE = {
+    19: (1, 1, "01"),
+    20: (4, 2, "04"),
+    21: (7, 4, "07"),
+    22: (10, 4, None),
+}
+PERIODO_ANUAL = 28
+
+
+def procesar_tabla_polars(codigo, datos, cache):
+    """
+    Devuelve una lista con las filas de cada serie (como procesar_datos con
+    por_serie=True). 'cache' es la CacheDimensiones de procesar.py.
+    """
+    if not isinstance(datos, list):
+        datos = list(datos)  # El motor columnar necesita la tabla completa
+    if not datos:
+        return []
+
+    series = _parsear_nombres(codigo, pl.DataFrame(
+        {"Nombre": [serie.get("Nombre", "") for serie in datos]}
+    ).with_row_index("serie"))
+
+    if codigo in [IPC, IPV]:
+        series, columnas = _dimensiones_precios(codigo, series)
+    elif codigo in [ETCL, EAES_OCUPACION, EAES_PERCENTILES]:
+        series, columnas = _dimensiones_salarios(codigo, series)
+    elif codigo in [TASA_PARO, TEMPORALIDAD]:
+        series, columnas = _dimensiones_empleo(codigo, series)
+    else:
+        return []
+
+    if series.height == 0:
+        return []
+
+    # Geografía e indicador: se registran en el mismo orden en que los
+    # encontraría el bucle por series, para que los ids coincidan
+    for geo, indicador, unidad in (
+        series.select("geografia", "indicador", "unidad").rows()
+    ):
+        cache.geografia(geo)
+        cache.indicador(indicador, unidad)
+
+    datos_series = _datos_series(codigo, datos, series["serie"].to_list())
+    if datos_series.height == 0:
+        return []
+
+    df = datos_series.join(series, on="serie", how="inner")
+    df = _resolver_periodos(codigo, df, cache)
+
+    if codigo in [IPC, IPV]:
+        # En precios los datos sin valor se descartan (después de crear el periodo)
+        df = df.filter(pl.col("valor").is_not_null())
+
+    df = (
+        df.with_columns(
+            pl.col("geografia").replace_strict(cache.geografias, return_dtype=pl.Int64).alias("id_geografia"),
+            pl.col("indicador").replace_strict(cache.indicadores, return_dtype=pl.Int64).alias("id_indicador"),
+        )
+        .sort(["serie", "orden"])
+    )
+
+    # Convertimos a tuplas de una vez y cortamos la lista por series
+    filas = df.select(columnas).rows()
+    tamanos = df.group_by("serie", maintain_order=True).len()["len"].to_list()
+    series_filas = []
+    inicio = 0
+    for tamano in tamanos:
+        series_filas.append(filas[inicio:inicio + tamano])
+        inicio += tamano
+    return series_filas
+
+
+def _parsear_nombres(codigo, series):
+    """Equivalente vectorizado de _aplanar_nombre_serie: split('.') y strip"""
+    partes = (
+        pl.col("Nombre")
+        .str.split(".")
+        .list.eval(pl.element().str.strip_chars())
+        .list.eval(pl.element().filter(pl.element() != ""))
+    )
+    series = series.with_columns(partes.alias("partes"))
+
+    def parte(i):
+        return pl.col("partes").list.get(i, null_on_oob=True)
+
+    if codigo == TASA_PARO:
+        campos = {"sexo": parte(1), "geografia": parte(2), "grupo_edad": parte(3)}
+    elif codigo == TEMPORALIDAD:
+        campos = {"geografia": parte(0), "sexo": parte(2), "tipo_contrato": parte(3), "tipo_jornada": parte(4)}
+    elif codigo in [IPC, IPV]:
+        campos = {"geografia": parte(0), "categoria": parte(1), "tipo_dato": parte(2)}
+    elif codigo == ETCL:
+        campos = {"geografia": parte(0), "sector": parte(1), "indicador_ine": parte(2)}
+    elif codigo == EAES_PERCENTILES:
+        campos = {"sexo": parte(0), "geografia": parte(1), "indicador_ine": parte(3)}
+    elif codigo == EAES_OCUPACION:
+        campos = {"sexo": parte(1), "ocupacion": parte(0), "geografia": parte(3)}
+    else:
+        campos = {}
+
+    return series.with_columns(**campos).drop("partes")
+
+
+def _dimensiones_precios(codigo, series):
+    tipo = pl.col("tipo_dato")
+    es_indice = tipo.str.contains("Índice", literal=True) & ~tipo.str.contains("Variación", literal=True)
+    es_var_anual = tipo.str.contains("Variación anual", literal=True)
+
+    series = series.with_columns(es_indice.alias("es_indice"), es_var_anual.alias("es_var_anual"))
+    series = series.filter(pl.col("es_indice") | pl.col("es_var_anual"))
+
+    if codigo == IPV:
+        series = series.filter(pl.col("categoria") == "General")
+        categoria = pl.lit("Vivienda Total")
+    else:
+        categoria = (
+            pl.when(pl.col("categoria") == "Índice general")
+            .then(pl.lit("IPC General"))
+            .otherwise(pl.col("categoria"))
+        )
+
+    nombre_base = "IPC" if codigo == IPC else "IPV"
+    unidad_indice = "Base 2021=100" if codigo == IPC else "Base 2015=100"
+
+    series = series.with_columns(
+        categoria.alias("categoria_gasto"),
+        pl.col("geografia").fill_null("Total Nacional"),
+        pl.when(pl.col("es_var_anual"))
+        .then(pl.lit(f"{nombre_base}_Variacion_Anual"))
+        .otherwise(pl.lit(f"{nombre_base}_Indice"))
+        .alias("indicador"),
+        pl.when(pl.col("es_var_anual"))
+        .then(pl.lit("%"))
+        .otherwise(pl.lit(unidad_indice))
+        .alias("unidad"),
+    )
+    columnas = ["id_periodo", "id_indicador", "id_geografia", "categoria_gasto", "valor"]
+    return series, columnas
+
+
+def _dimensiones_empleo(codigo, series):
+    if codigo == TASA_PARO:
+        series = series.with_columns(
+            pl.lit("Tasa_Paro").alias("indicador"),
+            pl.lit("%").alias("unidad"),
+            pl.lit(None, dtype=pl.String).alias("tipo_jornada"),
+            pl.lit(None, dtype=pl.String).alias("tipo_contrato"),
+        )
+    else:
+        contrato = pl.col("tipo_contrato").fill_null("")
+        series = (
+            series.filter(pl.col("tipo_jornada").fill_null("").str.contains("Total", literal=True))
+            .with_columns(
+                pl.when(contrato.str.contains("Total asalariados", literal=True))
+                .then(pl.lit("Asalariados_Total"))
+                .when(contrato.str.contains("Asalariados con contrato temporal", literal=True))
+                .then(pl.lit("Asalariados_Temporal"))
+                .otherwise(pl.lit(None, dtype=pl.String))
+                .alias("indicador"),
+                pl.lit("Miles de personas").alias("unidad"),
+                pl.lit(None, dtype=pl.String).alias("grupo_edad"),
+            )
+            .filter(pl.col("indicador").is_not_null())
+        )
+
+    columnas = [
+        "id_periodo", "id_indicador", "id_geografia",
+        "sexo", "grupo_edad", "tipo_jornada", "tipo_contrato", "valor",
+    ]
+    return series, columnas
+
+
+def _dimensiones_salarios(codigo, series):
+    if codigo == ETCL:
+        series = series.filter(
+            pl.col("indicador_ine").fill_null("").str.contains("Coste salarial total", literal=True)
+        ).with_columns(pl.lit("Salario_Coste_Trimestral").alias("indicador"))
+
+    elif codigo == EAES_PERCENTILES:
+        # Mapeamos los códigos exactos que nos manda el INE en su JSON
+        series = series.with_columns(
+            pl.col("indicador_ine").fill_null("").str.strip_chars().str.to_lowercase()
+            .replace_strict(
+                {
+                    "media": "Salario_Anual_Media",
+                    "50": "Salario_Anual_Mediana",
+                    "25": "Salario_Anual_Cuartil inferior",
+                    "10": "Salario_Anual_Percentil 10",
+                },
+                default=pl.lit(None, dtype=pl.String),
+                return_dtype=pl.String,
+            )
+            .alias("indicador")
+        ).filter(pl.col("indicador").is_not_null())
+
+    else:
+        series = series.with_columns(pl.lit("Salario_Anual_Ocupacion").alias("indicador"))
+
+    for columna in ("sexo", "sector", "ocupacion"):
+        if columna not in series.columns:
+            series = series.with_columns(pl.lit(None, dtype=pl.String).alias(columna))
+
+    series = series.with_columns(
+        pl.col("geografia").fill_null("Total Nacional"),
+        pl.col("sexo").fill_null("Total"),
+        pl.col("sector").fill_null("N/A").alias("sector_cnae"),
+        pl.col("ocupacion").fill_null("N/A").alias("ocupacion_cno11"),
+        pl.lit("Euros").alias("unidad"),
+    )
+    columnas = [
+        "id_periodo", "id_indicador", "id_geografia",
+        "sexo", "sector_cnae", "ocupacion_cno11", "valor",
+    ]
+    return series, columnas
+
+
+def _datos_series(codigo, datos, indices_series):
+    """Aplana el array 'Data' de las series seleccionadas a un frame largo"""
+    bloques = [datos[num_serie].get("Data") or [] for num_serie in indices_series]
+    puntos = [dato for bloque in bloques for dato in bloque]
+
+    if codigo in [IPC, IPV]:
+        # En precios se acepta también la variante 'Fk_Periodo'
+        periodos = [dato.get("FK_Periodo") or dato.get("Fk_Periodo") for dato in puntos]
+    else:
+        periodos = [dato.get("FK_Periodo") for dato in puntos]
+
+    return pl.DataFrame(
+        {
+            "serie": list(chain.from_iterable(
+                repeat(num_serie, len(bloque))
+                for num_serie, bloque in zip(indices_series, bloques)
+            )),
+            "orden": range(len(puntos)),
+            "anio": [dato.get("Anyo") for dato in puntos],
+            "fk_periodo": periodos,
+            "valor": [dato.get("Valor") for dato in puntos],
+        },
+        schema=_ESQUEMA_DATOS,
+        strict=False,
+    )
+
+
+_ESQUEMA_DATOS = {
+    "serie": pl.UInt32,
+    "orden": pl.Int64,
+    "anio": pl.Int64,
+    "fk_periodo": pl.Int64,
+    "valor": pl.Float64,
+}
+
+
+def _resolver_periodos(codigo, df, cache):
+    """Calcula (mes, trimestre, fecha_iso) y el id determinista de cada periodo"""
+    anio = pl.col("anio").cast(pl.String)
+    fk = pl.col("fk_periodo")
+
+    if codigo == IPC:
+        # Mensual: el FK_Periodo es el propio mes
+        df = df.with_columns(
+            fk.alias("mes"),
+            pl.lit(None, dtype=pl.Int64).alias("trimestre"),
+            pl.when(fk.is_not_null())
+            .then(anio + "-" + fk.cast(pl.String).str.zfill(2) + "-01")
+            .otherwise(anio + "-01-01")
+            .alias("fecha_iso"),
+        )
+    else:
+        desconocidos = df.filter(
+            fk.is_not_null() & ~fk.is_in(list(PERIODOS_INE) + [PERIODO_ANUAL])
+        )
+        if desconocidos.height:
+            raise ValueError(f"Código trimestre {desconocidos['fk_periodo'][0]} error")
+
+        meses = {fk_ine: mes for fk_ine, (mes, _, _) in PERIODOS_INE.items()}
+        trimestres = {fk_ine: trim for fk_ine, (_, trim, _) in PERIODOS_INE.items()}
+        mes_fecha = {fk_ine: m for fk_ine, (_, _, m) in PERIODOS_INE.items() if m}
+
+        df = df.with_columns(
+            fk.replace_strict(meses, default=pl.lit(None, dtype=pl.Int64), return_dtype=pl.Int64).alias("mes"),
+            fk.replace_strict(trimestres, default=pl.lit(None, dtype=pl.Int64), return_dtype=pl.Int64).alias("trimestre"),
+            pl.when(fk.is_in(list(mes_fecha)))
+            .then(anio + "-" + fk.replace_strict(mes_fecha, default=pl.lit(None, dtype=pl.String), return_dtype=pl.String) + "-01")
+            .when(fk == 22)
+            .then(pl.lit(""))
+            .otherwise(anio + "-01-01")
+            .alias("fecha_iso"),
+        )
+
+    # Clave determinista (ver db.clave_periodo)
+    frecuencia = pl.when(pl.col("trimestre").is_not_null()).then(3).otherwise(1)
+    df = df.with_columns(
+        pl.when(pl.col("mes").is_null())
+        .then(pl.col("anio") * 1000)
+        .otherwise(pl.col("anio") * 1000 + pl.col("mes") * 10 + frecuencia)
+        .alias("id_periodo")
+    )
+
+    for anio_p, mes, trimestre, fecha_iso in (
+        df.select("anio", "mes", "trimestre", "fecha_iso").unique(maintain_order=True).rows()
+    ):
+        cache.periodo(anio_p, mes, trimestre, fecha_iso)
+
+    return df
@@ -0,0 +1,29 @@
+# conftest.py
+# Configuración común de los tests: el proyecto se importa desde su raíz,
+# igual que al ejecutar main.py
+
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+
+@pytest.fixture
+def bd(tmp_path, monkeypatch):
+    """
+    Base de datos nueva (esquema creado, sin datos) en un directorio temporal.
+    DB_NAME es relativo, así que basta con cambiar de directorio y reconectar.
+    """
+    from src.db import DatabaseConnection, crear_base_datos
+    from src.procesar import iniciar_cache_dimensiones
+
+    monkeypatch.chdir(tmp_path)
+    DatabaseConnection().close()
+    crear_base_datos()
+    iniciar_cache_dimensiones()
+    yield DatabaseConnection()
+    DatabaseConnection().close()
@@ -0,0 +1,80 @@
+# test_almacenar.py
+# Recuentos de la carga por staging de insertar_datos
+
+from src.almacenar import insertar_datos
+from src.db import get_cursor
+
+
+def _filas(tabla):
+    with get_cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
+        return cursor.fetchone()[0]
+
+
+# (id_periodo, id_indicador, id_geografia, categoria_gasto, valor)
+PRECIOS = [
+    (2024011, 1, 1, "General", 100.0),
+    (2024021, 1, 1, "General", 101.0),
+    (2024031, 1, 1, "General", 102.0),
+]
+
+
+def test_inserta_filas_nuevas(bd):
+    informe = insertar_datos("T_precios", PRECIOS)
+    assert informe == {"insertadas": 3, "omitidas": 0, "rechazadas": 0}
+    assert _filas("T_precios") == 3
+
+
+def test_recarga_omite_las_existentes(bd):
+    insertar_datos("T_precios", PRECIOS)
+    informe = insertar_datos("T_precios", PRECIOS + [(2024041, 1, 1, "General", 103.0)])
+    assert informe == {"insertadas": 1, "omitidas": 3, "rechazadas": 0}
+    assert _filas("T_precios") == 4
+
+
+def test_duplicados_dentro_del_lote(bd):
+    # Se queda la primera aparición de cada clave
+    informe = insertar_datos("T_precios", [PRECIOS[0], (2024011, 1, 1, "General", 999.0)])
+    assert informe == {"insertadas": 1, "omitidas": 1, "rechazadas": 0}
+    with get_cursor() as cursor:
+        cursor.execute("SELECT valor FROM T_precios")
+        assert cursor.fetchall() == [(100.0,)]
+
+
+def test_rechaza_obligatorias_nulas(bd):
+    informe = insertar_datos(
+        "T_precios",
+        [
+            PRECIOS[0],
+            (None, 1, 1, "General", 1.0),      # sin periodo
+            (2024021, 1, 1, "General", None),  # sin valor
+        ],
+    )
+    assert informe == {"insertadas": 1, "omitidas": 0, "rechazadas": 2}
+    assert _filas("T_precios") == 1
+
+
+# (id_periodo, id_indicador, id_geografia, sexo, sector_cnae, ocupacion_cno11, valor)
+SALARIO_SIN_SECTOR = (2024000, 1, 1, "Ambos", None, "Directores", 3000.0)
+
+
+def test_clave_con_nulos_cuenta_como_duplicado(bd):
+    # En SQLite el UNIQUE no iguala los NULL; la fusión sí los trata como la misma clave
+    informe = insertar_datos("T_salarios", [SALARIO_SIN_SECTOR, SALARIO_SIN_SECTOR])
+    assert informe == {"insertadas": 1, "omitidas": 1, "rechazadas": 0}
+
+    informe = insertar_datos("T_salarios", [SALARIO_SIN_SECTOR])
+    assert informe == {"insertadas": 0, "omitidas": 1, "rechazadas": 0}
+    assert _filas("T_salarios") == 1
+
+
+def test_recuentos_suman_el_lote(bd):
+    insertar_datos("T_precios", PRECIOS[:1])
+    lote = PRECIOS + [PRECIOS[1], (2024041, 1, 1, None, 1.0)]
+    informe = insertar_datos("T_precios", lote)
+    assert informe == {"insertadas": 2, "omitidas": 2, "rechazadas": 1}
+    assert sum(informe.values()) == len(lote)
+
+
+def test_lote_vacio(bd):
+    assert insertar_datos("T_precios", []) == {"insertadas": 0, "omitidas": 0, "rechazadas": 0}
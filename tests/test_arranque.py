@@ -0,0 +1,10 @@
+# test_arranque.py
+# El presupuesto de arranque de benchmarks/arranque.py como test
+
+from benchmarks.arranque import comprobar_arranque
+
+
+def test_arranque_dentro_del_presupuesto():
+    # Importar main es rápido, no carga dependencias pesadas y ningún
+    # módulo del proyecto toca el disco al importarse
+    assert comprobar_arranque() == []
@@ -0,0 +1,160 @@
+# test_cache.py
+# Caché en disco de las respuestas del INE: TTL, revalidación (304) y modo offline
+
+import json
+import time
+
+import pytest
+
+from src.cache import CacheINE
+from src.inedata import INEDataExtractor
+
+SERIES = [{"COD": "IPC1", "Nombre": "Total Nacional. Índice general. Índice.", "Data": [{"Valor": 1.5}]}]
+NUEVAS = SERIES + [{"COD": "IPC2", "Nombre": "Andalucía. Índice general. Índice.", "Data": []}]
+
+
+class _Respuesta:
+    def __init__(self, status_code=200, cuerpo=b"", headers=None):
+        self.status_code = status_code
+        self.cuerpo = cuerpo
+        self.headers = headers or {}
+        self.cerrada = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.cuerpo), chunk_size):
+            yield self.cuerpo[i:i + chunk_size]
+
+    def close(self):
+        self.cerrada = True
+
+
+class _Sesion:
+    """Devuelve las respuestas indicadas y anota las cabeceras de cada petición"""
+
+    def __init__(self, *respuestas):
+        self.respuestas = list(respuestas)
+        self.peticiones = []
+
+    def get(self, url, **kwargs):
+        self.peticiones.append(kwargs.get("headers", {}))
+        return self.respuestas.pop(0)
+
+
+def _cuerpo(series):
+    return json.dumps(series, ensure_ascii=False).encode("utf-8")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CacheINE(directorio=str(tmp_path), ttl=60)
+    cache.guardar("50913", _Respuesta(cuerpo=_cuerpo(SERIES), headers={
+        "ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }))
+    return cache
+
+
+def _caducar(cache, codigo="50913"):
+    meta = cache.leer_meta(codigo)
+    meta["validada"] = time.time() - 3600
+    cache._escribir_meta(codigo, meta)
+
+
+def _extraer(cache, sesion, streaming=False, nult=None):
+    extractor = INEDataExtractor("50913", session=sesion, cache=cache, nult=nult)
+    assert extractor.obtener_datos(streaming=streaming)
+    return list(extractor.raw_data)
+
+
+def test_guarda_el_cuerpo_y_sus_validadores(cache):
+    assert cache.cargar("50913") == SERIES
+    assert json.loads(b"".join(cache.bloques("50913", tam_bloque=7))) == SERIES
+    assert cache.cabeceras_condicionales("50913") == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+    assert cache.leer_meta("50913")["bytes"] == len(_cuerpo(SERIES))
+
+
+def test_sin_copia_no_hay_cabeceras_condicionales(tmp_path):
+    assert CacheINE(directorio=str(tmp_path)).cabeceras_condicionales("50913") == {}
+
+
+def test_dentro_del_ttl_no_pregunta_al_ine(cache):
+    sesion = _Sesion()
+    assert cache.es_fresco("50913")
+    assert _extraer(cache, sesion) == SERIES
+    assert sesion.peticiones == []
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_304_renueva_la_copia(cache, streaming):
+    _caducar(cache)
+    assert not cache.es_fresco("50913")
+    respuesta = _Respuesta(status_code=304)
+    sesion = _Sesion(respuesta)
+
+    assert _extraer(cache, sesion, streaming=streaming) == SERIES
+    # Petición condicional con los validadores guardados
+    assert sesion.peticiones[0]["If-None-Match"] == '"v1"'
+    assert respuesta.cerrada
+    # La copia vuelve a estar dentro del TTL sin cambiar sus validadores
+    assert cache.es_fresco("50913")
+    assert cache.leer_meta("50913")["etag"] == '"v1"'
+
+
+def test_200_sustituye_la_copia(cache):
+    _caducar(cache)
+    sesion = _Sesion(_Respuesta(cuerpo=_cuerpo(NUEVAS), headers={"ETag": '"v2"'}))
+
+    assert _extraer(cache, sesion) == NUEVAS
+    assert cache.cargar("50913") == NUEVAS
+    assert cache.cabeceras_condicionales("50913") == {"If-None-Match": '"v2"'}
+
+
+def test_error_del_ine_no_toca_la_copia(cache):
+    _caducar(cache)
+    extractor = INEDataExtractor("50913", session=_Sesion(_Respuesta(status_code=500)), cache=cache)
+    assert not extractor.obtener_datos()
+    assert cache.cargar("50913") == SERIES
+
+
+def test_descarga_cortada_no_deja_temporales(cache, tmp_path):
+    class _Cortada(_Respuesta):
+        def iter_content(self, chunk_size):
+            yield b"[{"
+            raise ConnectionError("conexión cortada")
+
+    respuesta = _Cortada()
+    with pytest.raises(ConnectionError):
+        cache.guardar("50913", respuesta)
+    assert respuesta.cerrada
+    assert not [f for f in tmp_path.iterdir() if f.name.endswith(".tmp")]
+    assert cache.cargar("50913") == SERIES
+
+
+def test_offline_usa_la_copia_aunque_haya_caducado(cache):
+    _caducar(cache)
+    offline = CacheINE(directorio=cache.directorio, offline=True)
+    sesion = _Sesion()
+    assert _extraer(offline, sesion) == SERIES
+    assert sesion.peticiones == []
+
+
+def test_offline_sin_copia_falla_sin_pedir_nada(tmp_path):
+    sesion = _Sesion()
+    extractor = INEDataExtractor("50913", session=sesion, cache=CacheINE(directorio=str(tmp_path), offline=True))
+    assert not extractor.obtener_datos()
+    assert extractor.raw_data is None
+    assert sesion.peticiones == []
+
+
+def test_descargas_parciales_van_aparte(cache):
+    sesion = _Sesion(_Respuesta(cuerpo=_cuerpo(NUEVAS)))
+    assert _extraer(cache, sesion, nult=2) == NUEVAS
+    # La parcial no pisa la tabla completa
+    assert cache.cargar("50913") == SERIES
+    assert cache.cargar("50913_nult2") == NUEVAS
@@ -0,0 +1,139 @@
+# test_dag.py
+# Planificador del grafo de análisis: memoización y fallos
+
+import os
+
+import polars as pl
+import pytest
+
+from analysis.dag import GrafoAnalisis
+
+llamadas = []
+
+
+def _grafo(cache_dir):
+    """base -> doble -> suma, falla -> depende_de_falla, e independiente"""
+    grafo = GrafoAnalisis(cache_dir=str(cache_dir))
+
+    @grafo.nodo("doble", entradas=["base"])
+    def doble(base):
+        llamadas.append("doble")
+        return base.with_columns(pl.col("x") * 2)
+
+    @grafo.nodo("suma", entradas=["doble"])
+    def suma(doble):
+        llamadas.append("suma")
+        return doble.lazy().select(pl.col("x").sum())
+
+    @grafo.nodo("falla", entradas=["base"])
+    def falla(base):
+        llamadas.append("falla")
+        raise ValueError("fallo provocado")
+
+    @grafo.nodo("depende_de_falla", entradas=["falla"])
+    def depende_de_falla(falla):
+        llamadas.append("depende_de_falla")
+        return falla
+
+    @grafo.nodo("independiente", entradas=["base"])
+    def independiente(base):
+        llamadas.append("independiente")
+        return base.head(1)
+
+    return grafo
+
+
+@pytest.fixture(autouse=True)
+def limpiar_llamadas():
+    llamadas.clear()
+
+
+def _base(n=3):
+    return {"base": pl.DataFrame({"x": list(range(n))})}
+
+
+def _estados(informe):
+    return {nombre: estado for nombre, (estado, _) in informe.items()}
+
+
+def test_calcula_y_devuelve_los_objetivos(tmp_path):
+    resultados, informe = _grafo(tmp_path).ejecutar(["suma"], _base())
+    assert resultados["suma"].item() == 6
+    assert list(resultados) == ["suma"]
+    assert _estados(informe) == {"doble": "calculado", "suma": "calculado"}
+    assert sorted(llamadas) == ["doble", "suma"]
+
+
+def test_reutiliza_el_resultado_en_memoria(tmp_path):
+    grafo = _grafo(tmp_path)
+    grafo.ejecutar(["suma"], _base())
+    llamadas.clear()
+
+    resultados, informe = grafo.ejecutar(["suma"], _base())
+    assert resultados["suma"].item() == 6
+    # 'suma' está en caché, así que ni siquiera hace falta 'doble'
+    assert _estados(informe) == {"suma": "caché"}
+    assert llamadas == []
+
+
+def test_reutiliza_el_resultado_en_disco(tmp_path):
+    _grafo(tmp_path).ejecutar(["suma"], _base())
+    llamadas.clear()
+
+    # Un grafo nuevo (otro proceso) lo lee de la caché en disco
+    resultados, informe = _grafo(tmp_path).ejecutar(["suma"], _base())
+    assert resultados["suma"].item() == 6
+    assert _estados(informe) == {"suma": "caché"}
+    assert llamadas == []
+
+
+def test_recalcula_si_cambian_las_entradas(tmp_path):
+    grafo = _grafo(tmp_path)
+    grafo.ejecutar(["suma"], _base(3))
+    llamadas.clear()
+
+    resultados, informe = grafo.ejecutar(["suma"], _base(4))
+    assert resultados["suma"].item() == 12
+    assert _estados(informe) == {"doble": "calculado", "suma": "calculado"}
+
+
+def test_solo_guarda_la_ultima_version_de_cada_nodo(tmp_path):
+    grafo = _grafo(tmp_path)
+    for n in range(2, 6):
+        grafo.ejecutar(["suma"], _base(n))
+
+    assert sorted(grafo._memoria) == ["doble", "suma"]
+    ficheros = sorted(fichero.split("-")[0] for fichero in os.listdir(tmp_path))
+    assert ficheros == ["doble", "suma"]
+
+    # La versión anterior ya no está: volver a ella la recalcula
+    llamadas.clear()
+    grafo.ejecutar(["suma"], _base(4))
+    assert sorted(llamadas) == ["doble", "suma"]
+
+
+def test_un_fallo_solo_omite_a_sus_dependientes(tmp_path):
+    resultados, informe = _grafo(tmp_path).ejecutar(
+        ["depende_de_falla", "independiente", "suma"], _base()
+    )
+    assert _estados(informe) == {
+        "falla": "error",
+        "depende_de_falla": "omitido",
+        "independiente": "calculado",
+        "doble": "calculado",
+        "suma": "calculado",
+    }
+    assert "depende_de_falla" not in llamadas
+    assert sorted(resultados) == ["independiente", "suma"]
+    # Lo que ha fallado no se guarda en caché
+    assert not any(fichero.startswith("falla") for fichero in os.listdir(tmp_path))
+
+
+def test_objetivo_inexistente(tmp_path):
+    with pytest.raises(KeyError):
+        _grafo(tmp_path).ejecutar(["no_existe"], _base())
+
+
+def test_entrada_externa_ausente(tmp_path):
+    with pytest.raises(KeyError):
+        _grafo(tmp_path).ejecutar(["suma"], {})
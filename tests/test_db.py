@@ -0,0 +1,27 @@
+# test_db.py
+# Perfiles de rendimiento de la conexión de escritura
+
+# PRAGMA synchronous devuelve 0 (OFF), 1 (NORMAL) o 2 (FULL)
+SYNCHRONOUS = {"bulk-load": 0, "analytics": 1, "safe": 2}
+
+
+def _synchronous(bd):
+    with bd.escritura() as conn:
+        return conn.execute("PRAGMA synchronous").fetchone()[0]
+
+
+def test_perfil_vuelve_al_anterior_al_salir(bd):
+    assert _synchronous(bd) == SYNCHRONOUS["safe"]
+    with bd.perfil("bulk-load"):
+        assert _synchronous(bd) == SYNCHRONOUS["bulk-load"]
+        with bd.perfil("analytics"):
+            assert _synchronous(bd) == SYNCHRONOUS["analytics"]
+        assert _synchronous(bd) == SYNCHRONOUS["bulk-load"]
+    assert _synchronous(bd) == SYNCHRONOUS["safe"]
+
+
+def test_perfil_se_restaura_aunque_se_cierre_la_conexion(bd):
+    # Como la Fase 1: la conexión se cierra dentro del bloque
+    with bd.perfil("bulk-load"):
+        bd.close()
+    assert _synchronous(bd) == SYNCHRONOUS["safe"]
@@ -0,0 +1,130 @@
+# test_inedata.py
+# Decodificación incremental de las respuestas del INE (modo streaming)
+
+import gc
+import json
+
+import pytest
+
+from src.inedata import INE_BASE_URL, INEDataExtractor, _iterar_series, _semaforo_host
+
+SERIES = [
+    {"COD": "IPC251856", "Nombre": "Total Nacional. Índice general. Índice.", "Data": [
+        {"Anyo": 2024, "FK_Periodo": 1, "Valor": 113.4},
+        {"Anyo": 2024, "FK_Periodo": 2, "Valor": None},
+    ]},
+    {"COD": "EPA815", "Nombre": "Tasa de paro. Mujeres. Castilla - La Mancha. 55 y más años.", "Data": []},
+    {"COD": "X", "Nombre": "Comillas \"escapadas\", llaves {} y corchetes []", "Data": [{"Valor": -1e-3}]},
+]
+
+
+def _trocear(texto, tam):
+    cuerpo = texto.encode("utf-8")
+    return [cuerpo[i:i + tam] for i in range(0, len(cuerpo), tam)]
+
+
+@pytest.mark.parametrize("tam", [1, 2, 3, 7, 64, 10**6])
+def test_bloques_de_cualquier_tamano(tam):
+    # Con bloques de 1 a 3 bytes se parten los caracteres UTF-8 de varios bytes
+    assert list(_iterar_series(_trocear(json.dumps(SERIES, ensure_ascii=False), tam))) == SERIES
+
+
+@pytest.mark.parametrize("tam", [1, 5])
+def test_espacios_y_saltos_de_linea(tam):
+    texto = "\n  " + json.dumps(SERIES, ensure_ascii=False, indent=4).replace(",\n", "\n,\n") + "\n"
+    assert list(_iterar_series(_trocear(texto, tam))) == SERIES
+
+
+def test_bloques_vacios_intercalados():
+    bloques = [b""] + [b for bloque in _trocear(json.dumps(SERIES), 4) for b in (bloque, b"")]
+    assert list(_iterar_series(bloques)) == SERIES
+
+
+def test_objeto_unico():
+    # Algunas respuestas son un único objeto en lugar de una lista
+    assert list(_iterar_series(_trocear(json.dumps(SERIES[0]), 5))) == [SERIES[0]]
+
+
+@pytest.mark.parametrize("texto", ["", "   ", "[]", " [ ] "])
+def test_respuesta_vacia(texto):
+    assert list(_iterar_series(_trocear(texto, 1))) == []
+
+
+def test_respuesta_truncada():
+    texto = json.dumps(SERIES)[:-20]
+    with pytest.raises(json.JSONDecodeError):
+        list(_iterar_series(_trocear(texto, 8)))
+
+
+def test_entrega_cada_serie_sin_leer_el_resto():
+    leidos = []
+
+    def bloques():
+        for bloque in _trocear(json.dumps(SERIES), 16):
+            leidos.append(bloque)
+            yield bloque
+
+    series = _iterar_series(bloques())
+    assert next(series) == SERIES[0]
+    assert sum(map(len, leidos)) < len(json.dumps(SERIES))
+
+
+def test_cierra_los_bloques_al_abandonar():
+    cerrado = []
+
+    def bloques():
+        try:
+            yield from _trocear(json.dumps(SERIES), 16)
+        finally:
+            cerrado.append(True)
+
+    series = _iterar_series(bloques())
+    next(series)
+    series.close()
+    assert cerrado == [True]
+
+
+class _Respuesta:
+    """Respuesta de requests mínima con el cuerpo en bloques"""
+
+    status_code = 200
+
+    def __init__(self, cuerpo):
+        self.cuerpo = cuerpo
+        self.cerrada = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.cuerpo), chunk_size):
+            yield self.cuerpo[i:i + chunk_size]
+
+    def close(self):
+        self.cerrada = True
+
+
+class _Sesion:
+    def get(self, url, **kwargs):
+        self.respuesta = _Respuesta(json.dumps(SERIES).encode("utf-8"))
+        return self.respuesta
+
+
+def test_streaming_retiene_el_semaforo_hasta_leer_el_cuerpo():
+    semaforo = _semaforo_host(INE_BASE_URL)
+    libres = semaforo._value
+    sesion = _Sesion()
+    extractor = INEDataExtractor(50913, session=sesion)
+
+    assert extractor.obtener_datos(streaming=True)
+    assert semaforo._value == libres - 1  # El cuerpo aún no se ha leído
+    assert list(extractor.raw_data) == SERIES
+    assert sesion.respuesta.cerrada
+    assert semaforo._value == libres
+
+    # Si el cuerpo nunca se lee, el semáforo se libera al recoger el generador
+    assert extractor.obtener_datos(streaming=True)
+    assert semaforo._value == libres - 1
+    extractor.raw_data = None
+    gc.collect()
+    assert semaforo._value == libres
@@ -0,0 +1,75 @@
+# test_periodos.py
+# Claves deterministas de tbl_periodo y migración desde ids autoincrementales
+
+from src.db import clave_periodo, get_cursor, migrar_claves_periodo
+
+
+def test_clave_periodo_anual():
+    assert clave_periodo(2024) == 2024000
+
+
+def test_clave_periodo_mensual():
+    assert clave_periodo(2024, mes=3) == 2024031
+    assert clave_periodo(2024, mes=12) == 2024121
+
+
+def test_clave_periodo_trimestral():
+    # Un trimestre se guarda con su primer mes
+    assert clave_periodo(2024, mes=4, trimestre=2) == 2024043
+    # El mismo mes como dato mensual tiene otra clave
+    assert clave_periodo(2024, mes=4, trimestre=2) != clave_periodo(2024, mes=4)
+
+
+def test_clave_periodo_ordena_cronologicamente():
+    claves = [
+        clave_periodo(2023, mes=12),
+        clave_periodo(2024),
+        clave_periodo(2024, mes=1, trimestre=1),
+        clave_periodo(2024, mes=2),
+        clave_periodo(2024, mes=10, trimestre=4),
+        clave_periodo(2025, mes=1),
+    ]
+    assert claves == sorted(claves)
+
+
+def test_migrar_claves_periodo(bd):
+    # Base de datos con los ids autoincrementales de la versión anterior
+    with get_cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO tbl_periodo (id_periodo, anio, mes, trimestre, fecha_iso) VALUES (?, ?, ?, ?, ?)",
+            [
+                (1, 2024, None, None, "2024-01-01"),  # anual
+                (2, 2024, 3, None, "2024-03-01"),     # mensual
+                (3, 2024, 4, 2, "2024-04-01"),        # trimestral
+            ],
+        )
+        cursor.execute("INSERT INTO tbl_indicador (id_indicador, nombre) VALUES (1, 'IPC_General')")
+        cursor.execute("INSERT INTO tbl_geografia (id_geografia, nombre) VALUES (1, 'Total Nacional')")
+        cursor.executemany(
+            "INSERT INTO T_precios (id_periodo, id_indicador, id_geografia, categoria_gasto, valor) "
+            "VALUES (?, 1, 1, 'General', ?)",
+            [(1, 10.0), (2, 20.0), (3, 30.0)],
+        )
+
+    migrar_claves_periodo()
+
+    with get_cursor() as cursor:
+        cursor.execute("SELECT id_periodo FROM tbl_periodo ORDER BY id_periodo")
+        assert [fila[0] for fila in cursor.fetchall()] == [2024000, 2024031, 2024043]
+        # Los hechos apuntan a las claves nuevas
+        cursor.execute("SELECT valor, id_periodo FROM T_precios ORDER BY valor")
+        assert cursor.fetchall() == [(10.0, 2024000), (20.0, 2024031), (30.0, 2024043)]
+
+
+def test_migrar_claves_periodo_ya_migrada(bd):
+    with get_cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO tbl_periodo (id_periodo, anio, mes, trimestre, fecha_iso) VALUES (?, 2024, 3, NULL, '2024-03-01')",
+            (clave_periodo(2024, mes=3),),
+        )
+
+    migrar_claves_periodo()
+
+    with get_cursor() as cursor:
+        cursor.execute("SELECT id_periodo FROM tbl_periodo")
+        assert cursor.fetchall() == [(2024031,)]
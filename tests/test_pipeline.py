@@ -0,0 +1,63 @@
+# test_pipeline.py
+# Fase 1 en tubería: orden de carga, streaming y parada si falla la carga
+
+import threading
+
+import pytest
+
+from benchmarks.sinteticos import generar_tabla
+from config.constantes import IPC, IPV, ETCL, TASA_PARO, TEMPORALIDAD
+from src.pipeline import ejecutar_pipeline
+
+TABLAS = [IPV, ETCL, TASA_PARO, TEMPORALIDAD, IPC]
+
+
+class _Extractor:
+    """Extractor sin red: 'descarga' la tabla sintética"""
+
+    def __init__(self, codigo):
+        self.codigo = codigo
+        self.nult = None
+        self.raw_data = None
+        self.streaming = None
+
+    def obtener_datos(self, streaming=False):
+        self.streaming = streaming
+        datos = generar_tabla(self.codigo)
+        self.raw_data = iter(datos) if streaming else datos
+        return True
+
+
+def _extractores():
+    return {codigo: _Extractor(codigo) for codigo in TABLAS}
+
+
+def _etapas_vivas():
+    return [hilo.name for hilo in threading.enumerate() if hilo.name.startswith("etapa-")]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_carga_todas_las_tablas_en_orden(bd, streaming):
+    extractores = _extractores()
+    cargadas = []
+    ejecutar_pipeline(
+        extractores, lambda codigo, series, extractor: cargadas.append((codigo, len(series))),
+        tam_cola=1, streaming=streaming,
+    )
+    assert [codigo for codigo, _ in cargadas] == TABLAS
+    assert all(num_series > 0 for _, num_series in cargadas)
+    assert all(extractor.streaming is streaming for extractor in extractores.values())
+    assert _etapas_vivas() == []
+
+
+def test_un_fallo_en_la_carga_para_las_demas_etapas(bd):
+    extractores = _extractores()
+
+    def cargar(codigo, series, extractor):
+        raise RuntimeError("fallo provocado")
+
+    with pytest.raises(RuntimeError, match="fallo provocado"):
+        ejecutar_pipeline(extractores, cargar, tam_cola=1)
+    # Ningún hilo queda bloqueado en las colas, y no se descargan más tablas
+    assert _etapas_vivas() == []
+    assert any(extractor.raw_data is None and extractor.streaming is None for extractor in extractores.values())
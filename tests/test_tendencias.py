@@ -0,0 +1,73 @@
+# test_tendencias.py
+# Líneas de tendencia de la Fase 3 y su caché
+
+import os
+
+import numpy as np
+import polars as pl
+import pytest
+
+from analysis import tendencias
+from analysis.tendencias import calcular_tendencia
+
+
+@pytest.fixture(autouse=True)
+def cache_temporal(tmp_path, monkeypatch):
+    monkeypatch.setattr(tendencias, "CACHE_TENDENCIAS_DIR", str(tmp_path))
+    monkeypatch.setattr(tendencias, "_memoria", {})
+    return tmp_path
+
+
+def _datos(n=40, desplazamiento=0.0):
+    x = np.linspace(0, 10, n)
+    return pl.DataFrame({
+        "grupo": ["a", "b"] * (n // 2),
+        "x": x,
+        "y": 2 * x + np.sin(x) + desplazamiento,
+    })
+
+
+@pytest.mark.parametrize("metodo", ["lowess", "medias", "spline"])
+def test_sin_filas_devuelve_tendencia_vacia(metodo, cache_temporal):
+    vacio = _datos().clear()
+    for por in (None, "grupo"):
+        resultado = calcular_tendencia(vacio, "x", "y", por=por, metodo=metodo)
+        assert resultado.height == 0
+        assert resultado.columns == ([por] if por else []) + ["x", "y"]
+    # Todo nulo equivale a no tener datos
+    nulos = pl.DataFrame({"x": [None, 1.0], "y": [1.0, None]})
+    assert calcular_tendencia(nulos, "x", "y", metodo=metodo).height == 0
+    assert os.listdir(cache_temporal) == []
+
+
+@pytest.mark.parametrize("metodo", ["lowess", "medias", "spline"])
+def test_una_tendencia_por_grupo(metodo):
+    resultado = calcular_tendencia(_datos(), "x", "y", por="grupo", metodo=metodo)
+    assert set(resultado["grupo"]) == {"a", "b"}
+    assert resultado.columns == ["grupo", "x", "y"]
+
+
+def test_lowess_sigue_una_recta():
+    x = np.arange(30, dtype=float)
+    resultado = calcular_tendencia(pl.DataFrame({"x": x, "y": 3 * x + 1}), "x", "y")
+    np.testing.assert_allclose(resultado["y"].to_numpy(), 3 * x + 1)
+
+
+def test_reutiliza_la_cache_en_disco(cache_temporal, monkeypatch):
+    primera = calcular_tendencia(_datos(), "x", "y", por="grupo")
+    # Otro proceso: sin memoria, la lee del disco sin recalcular
+    monkeypatch.setattr(tendencias, "_memoria", {})
+    monkeypatch.setattr(tendencias, "lowess", None)
+    assert calcular_tendencia(_datos(), "x", "y", por="grupo").equals(primera)
+
+
+def test_solo_guarda_la_ultima_version_de_cada_tendencia(cache_temporal):
+    for desplazamiento in range(4):
+        calcular_tendencia(_datos(desplazamiento=desplazamiento), "x", "y")
+    calcular_tendencia(_datos(), "x", "y", metodo="medias")
+
+    ficheros = os.listdir(cache_temporal)
+    # Una por tendencia (lowess y medias), cada una con los últimos datos
+    assert len(ficheros) == 2
+    assert len({fichero.split("-")[0] for fichero in ficheros}) == 2
+    assert len(tendencias._memoria) == 2
@@ -0,0 +1,72 @@
+# test_transform.py
+# Grafo de análisis de la Fase 2 sobre las medias recalculadas desde cero
+
+import itertools
+import random
+
+import polars as pl
+import pytest
+
+from analysis.agregados import PERCENTILES, calcular_agregados
+from analysis.transform import grafo
+
+# Suficientes grupos para que el orden de salida de group_by varíe entre ejecuciones
+COMUNIDADES = ["Total Nacional", *(f"Comunidad {i:02d}" for i in range(30))]
+OCUPACIONES = [f"{letra} Ocupación" for letra in "ABCDEFGHIJ"]
+ANIOS = list(range(2000, 2024))
+
+
+def _bloques_maestros():
+    """Bloques maestros sintéticos con las columnas que leen los agregados"""
+    rng = random.Random(0)
+    salarios = [
+        (rng.uniform(15000, 40000), comunidad, anio, indicador, sexo, ocupacion)
+        for comunidad, anio, indicador, sexo, ocupacion in itertools.product(
+            COMUNIDADES, ANIOS,
+            ["Salario_Anual_Media", "Salario_Anual_Ocupacion", "Salario_Coste_Trimestral", *PERCENTILES],
+            ["Total", "Hombres", "Mujeres"],
+            OCUPACIONES,
+        )
+    ]
+    precios = [
+        (rng.uniform(80, 120), "Total Nacional", anio, indicador, "IPC General")
+        for anio, indicador, _ in itertools.product(ANIOS, ["IPC_Indice", "IPV_Indice"], range(12))
+    ]
+    empleo = [
+        (rng.uniform(5, 30), comunidad, anio, indicador, "Ambos sexos", "Todas las edades")
+        for comunidad, anio, indicador, _ in itertools.product(
+            COMUNIDADES, ANIOS, ["Tasa_Paro", "Asalariados_Total", "Asalariados_Temporal"], range(4)
+        )
+    ]
+    return (
+        pl.DataFrame(salarios, schema=["salario", "comunidad", "anio", "indicador", "sexo", "ocupacion"], orient="row").lazy(),
+        pl.DataFrame(precios, schema=["precio", "comunidad", "anio", "indicador", "categoria_gasto"], orient="row").lazy(),
+        pl.DataFrame(empleo, schema=["valor_empleo", "comunidad", "anio", "indicador", "sexo", "grupo_edad"], orient="row").lazy(),
+    )
+
+
+@pytest.fixture
+def grafo_temporal(tmp_path, monkeypatch):
+    monkeypatch.setattr(grafo, "cache_dir", str(tmp_path))
+    monkeypatch.setattr(grafo, "_memoria", {})
+    return grafo
+
+
+def test_recalculo_completo_reutiliza_la_cache(grafo_temporal):
+    # Mismos datos, medias recalculadas desde cero (incremental=False) dos veces:
+    # la segunda ejecución del grafo tiene que salir entera de la caché
+    primera, informe = grafo_temporal.ejecutar(externos=calcular_agregados(*_bloques_maestros()))
+    assert all(estado == "calculado" for estado, _ in informe.values())
+
+    segunda, informe = grafo_temporal.ejecutar(externos=calcular_agregados(*_bloques_maestros()))
+    assert {estado for estado, _ in informe.values()} == {"caché"}
+    assert all(segunda[nombre].equals(df) for nombre, df in primera.items())
+
+
+
+def test_medias_ordenadas_por_sus_claves():
+    for nombre, df in calcular_agregados(*_bloques_maestros()).items():
+        df = df.collect()
+        claves = [c for c in df.columns if df[c].dtype != pl.Float64]
+        assert df.height > 0, nombre
+        assert df.equals(df.sort(claves)), nombre